@@ -2,6 +2,7 @@ import types
 import typing
 import traceback
 import contextlib
+import inspect
 import sys
 
 from mitmproxy import exceptions
@@ -44,7 +45,8 @@ def safecall():
         raise
     except Exception as e:
         etype, value, tb = sys.exc_info()
-        tb = cut_traceback(tb, "invoke_addon")
+        tb = cut_traceback(tb, "_invoke_handlers")
+        tb = cut_traceback(tb, "_async_invoke_handlers")
         ctx.log.error(
             "Addon error: %s" % "".join(
                 traceback.format_exception(etype, value, tb)
@@ -99,6 +101,14 @@ class Loader:
         self.master.commands.add(path, func)
 
 
+def _is_handler(func):
+    # we gracefully exclude module imports with the same name as hooks.
+    # For example, a user may have "from mitmproxy import log" in an addon,
+    # which has the same name as the "log" hook. In this particular case,
+    # we end up in an error loop because we "log" this error.
+    return bool(func) and not isinstance(func, types.ModuleType)
+
+
 def traverse(chain):
     """
         Recursively traverse an addon chain.
@@ -114,6 +124,8 @@ class AddonManager:
         self.lookup = {}
         self.chain = []
         self.master = master
+        # Maps event names to the chain addons that subscribe to them.
+        self._handlers_cache: typing.Dict[str, typing.List[typing.Any]] = {}
         master.options.changed.connect(self._configure_all)
 
     def _configure_all(self, options, updated):
@@ -127,6 +139,7 @@ class AddonManager:
             self.invoke_addon(a, "done")
         self.lookup = {}
         self.chain = []
+        self.invalidate_handlers()
 
     def get(self, name):
         """
@@ -159,6 +172,7 @@ class AddonManager:
             self.lookup[name] = a
         for a in traverse([addon]):
             self.master.commands.collect_commands(a)
+        self.invalidate_handlers()
         self.master.options.process_deferred()
         return addon
 
@@ -169,6 +183,7 @@ class AddonManager:
         """
         for i in addons:
             self.chain.append(self.register(i))
+        self.invalidate_handlers()
 
     def remove(self, addon):
         """
@@ -184,6 +199,7 @@ class AddonManager:
                 raise exceptions.AddonManagerError("No such addon: %s" % n)
             self.chain = [i for i in self.chain if i is not a]
             del self.lookup[_get_name(a)]
+        self.invalidate_handlers()
         self.invoke_addon(a, "done")
 
     def __len__(self):
@@ -196,6 +212,52 @@ class AddonManager:
         name = _get_name(item)
         return name in self.lookup
 
+    def invalidate_handlers(self):
+        """
+            Discard the cached event handler lookups. This is done
+            automatically when addons are registered or removed. Addons that
+            manage sub-addons should call this after changing their addons
+            attribute.
+        """
+        self._handlers_cache = {}
+
+    def _subscribers(self, name):
+        """
+            Returns the addons in the chain that have a handler for the event
+            on themselves or any of their children.
+        """
+        cache = self._handlers_cache
+        try:
+            return cache[name]
+        except KeyError:
+            pass
+        if name not in eventsequence.Events:
+            raise exceptions.AddonManagerError("Unknown event: %s" % name)
+        subscribers = [
+            i for i in list(self.chain)
+            if any(_is_handler(getattr(a, name, None)) for a in traverse([i]))
+        ]
+        # If we have been invalidated in the meantime, this only updates the
+        # discarded cache.
+        cache[name] = subscribers
+        return subscribers
+
+    def has_handler(self, name):
+        """
+            Returns True if any addon in the chain has a handler for the event.
+        """
+        return bool(self._subscribers(name))
+
+    def handles_lifecycle(self, name, message):
+        """
+            Returns True if handling the lifecycle event would invoke any
+            addon. If not, the proxy can skip the round-trip through the event
+            loop.
+        """
+        if self.has_handler(name):
+            return True
+        return isinstance(message, flow.Flow) and self.has_handler("update")
+
     async def handle_lifecycle(self, name, message):
         """
             Handle a lifecycle event.
@@ -211,7 +273,7 @@ class AddonManager:
         if isinstance(message.reply, controller.DummyReply):
             message.reply.reset()
 
-        self.trigger(name, message)
+        await self.trigger_event(name, message)
 
         if message.reply.state == "start":
             message.reply.take()
@@ -223,37 +285,85 @@ class AddonManager:
                 message.reply.mark_reset()
 
         if isinstance(message, flow.Flow):
-            self.trigger("update", [message])
+            await self.trigger_event("update", [message])
 
-    def invoke_addon(self, addon, name, *args, **kwargs):
+    def _handlers(self, addons, name):
         """
-            Invoke an event on an addon and all its children.
+            Yield the handlers for an event on the given addons.
         """
-        if name not in eventsequence.Events:
-            raise exceptions.AddonManagerError("Unknown event: %s" % name)
-        for a in traverse([addon]):
+        for a in addons:
             func = getattr(a, name, None)
             if func:
                 if callable(func):
-                    func(*args, **kwargs)
+                    yield func
                 elif isinstance(func, types.ModuleType):
-                    # we gracefully exclude module imports with the same name as hooks.
-                    # For example, a user may have "from mitmproxy import log" in an addon,
-                    # which has the same name as the "log" hook. In this particular case,
-                    # we end up in an error loop because we "log" this error.
+                    # Modules with the same name as a hook are excluded, see _is_handler.
                     pass
                 else:
                     raise exceptions.AddonManagerError(
                         "Addon handler {} ({}) not callable".format(name, a)
                     )
 
+    def _invoke_handlers(self, addons, name, *args, **kwargs):
+        for func in self._handlers(addons, name):
+            ret = func(*args, **kwargs)
+            if inspect.iscoroutine(ret):
+                ret.close()
+                raise exceptions.AddonManagerError(
+                    "Addon handler {} ({}) is async and cannot be invoked synchronously".format(
+                        name, func
+                    )
+                )
+
+    async def _async_invoke_handlers(self, addons, name, *args, **kwargs):
+        for func in self._handlers(addons, name):
+            ret = func(*args, **kwargs)
+            if inspect.iscoroutine(ret):
+                await ret
+
+    def invoke_addon(self, addon, name, *args, **kwargs):
+        """
+            Invoke an event on an addon and all its children.
+        """
+        if name not in eventsequence.Events:
+            raise exceptions.AddonManagerError("Unknown event: %s" % name)
+        self._invoke_handlers(traverse([addon]), name, *args, **kwargs)
+
+    async def async_invoke_addon(self, addon, name, *args, **kwargs):
+        """
+            Invoke an event on an addon and all its children, awaiting
+            handlers declared with async def.
+        """
+        if name not in eventsequence.Events:
+            raise exceptions.AddonManagerError("Unknown event: %s" % name)
+        await self._async_invoke_handlers(traverse([addon]), name, *args, **kwargs)
+
     def trigger(self, name, *args, **kwargs):
         """
             Trigger an event across all addons.
         """
-        for i in self.chain:
+        subscribers = []
+        with safecall():
+            subscribers = self._subscribers(name)
+        for i in subscribers:
+            try:
+                with safecall():
+                    # Children are traversed lazily, as handlers may change them.
+                    self._invoke_handlers(traverse([i]), name, *args, **kwargs)
+            except exceptions.AddonHalt:
+                return
+
+    async def trigger_event(self, name, *args, **kwargs):
+        """
+            Trigger an event across all addons, awaiting async handlers.
+        """
+        subscribers = []
+        with safecall():
+            subscribers = self._subscribers(name)
+        for i in subscribers:
             try:
                 with safecall():
-                    self.invoke_addon(i, name, *args, **kwargs)
+                    # Children are traversed lazily, as handlers may change them.
+                    await self._async_invoke_handlers(traverse([i]), name, *args, **kwargs)
             except exceptions.AddonHalt:
                 return
@@ -58,6 +58,18 @@ class Core:
                     "Invalid body size limit specification: %s" %
                     opts.body_size_limit
                 )
+        if "websocket_max_size" in updated:
+            try:
+                human.parse_size(opts.websocket_max_size)
+            except ValueError as e:
+                raise exceptions.OptionsError(
+                    "Invalid WebSocket size limit specification: %s" %
+                    opts.websocket_max_size
+                )
+        if "websocket_max_messages" in updated and opts.websocket_max_messages < 0:
+            raise exceptions.OptionsError(
+                "Invalid number of WebSocket messages: %s" % opts.websocket_max_messages
+            )
         if "mode" in updated:
             mode = opts.mode
             if mode.startswith("reverse:") or mode.startswith("upstream:"):
@@ -97,6 +109,37 @@ class Core:
         except exceptions.OptionsError as e:
             raise exceptions.CommandError(e) from e
 
+    @command.command("cert.pregenerate")
+    def cert_pregenerate(self, *hosts: str) -> None:
+        """
+            Generate interception certificates for the given hosts ahead of
+            time. Enable cert_disk_cache to keep them across restarts.
+        """
+        server = ctx.master.server
+        if not (server and server.config):
+            raise exceptions.CommandError("Proxy server not configured.")
+        server.config.certstore.pregenerate(h.encode("idna") for h in hosts)
+        ctx.log.alert("Generated certificates for %s hosts." % len(hosts))
+
+    @command.command("tls.sessions")
+    def tls_sessions(self) -> None:
+        """
+            Report how many TLS handshakes with clients and servers resumed
+            a previous session.
+        """
+        server = ctx.master.server
+        if not (server and server.config):
+            raise exceptions.CommandError("Proxy server not configured.")
+        contexts = server.config.tls_contexts
+        sessions = server.config.tls_sessions
+        ctx.log.alert(
+            "Client TLS sessions: %s resumed, %s new. "
+            "Server TLS sessions: %s resumed, %s new." % (
+                contexts.session_hits, contexts.session_misses,
+                sessions.session_hits, sessions.session_misses
+            )
+        )
+
     @command.command("flow.resume")
     def resume(self, flows: typing.Sequence[flow.Flow]) -> None:
         """
@@ -1,19 +1,37 @@
 import asyncio
+import itertools
 import os.path
 import sys
+import time
 import typing
 
 from mitmproxy import ctx
 from mitmproxy import exceptions
+from mitmproxy import flow
 from mitmproxy import flowfilter
 from mitmproxy import io
 from mitmproxy import command
+from mitmproxy.utils import human
+
+
+def _file_size(fo: typing.IO[bytes]) -> typing.Optional[int]:
+    try:
+        return os.fstat(fo.fileno()).st_size or None
+    except (AttributeError, ValueError, OSError):
+        return None
 
 
 class ReadFile:
     """
         An addon that handles reading from file on startup.
     """
+    # Flows are read from the file as they are loaded, so memory use does
+    # not depend on the size of the file. Every batch_size flows, we give
+    # other tasks a chance to run, and report progress at most every
+    # progress_interval seconds.
+    batch_size = 100
+    progress_interval = 1.0
+
     def __init__(self):
         self.filter = None
         self.is_reading = False
@@ -39,15 +57,26 @@ class ReadFile:
                     )
             self.filter = filt
 
-    async def load_flows(self, fo: typing.IO[bytes]) -> int:
+    async def _load(
+        self,
+        flows: typing.Iterable[flow.Flow],
+        progress: typing.Callable[[int, int], None],
+    ) -> int:
         cnt = 0
-        freader = io.FlowReader(fo)
+        seen = 0
+        last_progress = time.monotonic()
         try:
-            for flow in freader.stream():
-                if self.filter and not self.filter(flow):
+            for f in flows:
+                seen += 1
+                if self.filter and not self.filter(f):
                     continue
-                await ctx.master.load_flow(flow)
+                await ctx.master.load_flow(f)
                 cnt += 1
+                if cnt % self.batch_size == 0:
+                    await asyncio.sleep(0)
+                    if time.monotonic() - last_progress > self.progress_interval:
+                        last_progress = time.monotonic()
+                        progress(seen, cnt)
         except (IOError, exceptions.FlowReadException) as e:
             if cnt:
                 ctx.log.warn("Flow file corrupted - loaded %i flows." % cnt)
@@ -57,11 +86,51 @@ class ReadFile:
         else:
             return cnt
 
+    async def load_flows(self, fo: typing.IO[bytes]) -> int:
+        size = _file_size(fo)
+        return await self._load(
+            io.FlowReader(fo).stream(),
+            lambda seen, cnt: self.report_progress(fo, size, cnt)
+        )
+
+    async def load_index(self, index: io.FlowIndex) -> int:
+        """
+            Load the flows of a dump through its index, indexing new flows as
+            they are loaded. A flow that is still being written at the end of
+            the dump, e.g. by a running capture, is skipped.
+        """
+        total = len(index) + index.pending()
+        cnt = await self._load(
+            itertools.chain(index, index.follow()),
+            lambda seen, cnt: ctx.log.info("Loading flows: {} of {} flows.".format(seen, total))
+        )
+        if os.path.getsize(index.path) > index.size:
+            ctx.log.warn("Skipped an incomplete flow at the end of {}.".format(index.path))
+        return cnt
+
+    def report_progress(self, fo: typing.IO[bytes], size: typing.Optional[int], cnt: int) -> None:
+        if size:
+            ctx.log.info("Loading flows: {} of {}, {} flows.".format(
+                human.pretty_size(fo.tell()), human.pretty_size(size), cnt
+            ))
+        else:
+            ctx.log.info("Loading flows: {} flows.".format(cnt))
+
     async def load_flows_from_path(self, path: str) -> int:
         path = os.path.expanduser(path)
         try:
-            with open(path, "rb") as f:
-                return await self.load_flows(f)
+            cnt = 0
+            for segment in io.segment_paths(path):
+                # Plain dump files are read through an index, so that a flow
+                # that is still being written is skipped. The index is only
+                # kept in memory, reading a dump must not write next to it.
+                if io.FlowIndex.can_index(segment):
+                    with io.FlowIndex(segment, sidecar=False, refresh=False) as index:
+                        cnt += await self.load_index(index)
+                else:
+                    with open(segment, "rb") as f:
+                        cnt += await self.load_flows(f)
+            return cnt
         except IOError as e:
             ctx.log.error("Cannot load flows: {}".format(e))
             raise exceptions.FlowReadException(str(e)) from e
@@ -1,4 +1,6 @@
 import os.path
+import queue
+import time
 import typing
 
 from mitmproxy import command
@@ -7,41 +9,179 @@ from mitmproxy import flowfilter
 from mitmproxy import io
 from mitmproxy import ctx
 from mitmproxy import flow
+from mitmproxy.coretypes import basethread
+from mitmproxy.io import tnetstring
+from mitmproxy.utils import human
 import mitmproxy.types
 
 
+class StreamWriterThread(basethread.BaseThread):
+    """
+        Serializes flow states and writes them to a file. Everything that
+        has queued up while the previous write was in progress is written
+        in one go.
+    """
+    daemon = True
+    # Maximum number of flows per write.
+    batch_size = 500
+
+    def __init__(self, fo: typing.BinaryIO, queue_size: int, fsync: bool) -> None:
+        self.fo = fo
+        self.fsync = fsync
+        self.queue: queue.Queue = queue.Queue(queue_size)
+        self.error: typing.Optional[Exception] = None
+        # Backpressure metrics
+        self.written = 0
+        self.batches = 0
+        self.max_queued = 0
+        self.blocked = 0.0
+        super().__init__("StreamWriterThread")
+
+    def put(self, state: typing.Optional[dict]) -> bool:
+        """
+            Queue a flow state for writing, or None to stop the thread.
+            Blocks while the queue is full.
+
+            Returns:
+                True, if the queue was full and we had to wait.
+        """
+        try:
+            self.queue.put_nowait(state)
+        except queue.Full:
+            start = time.monotonic()
+            self.queue.put(state)
+            self.blocked += time.monotonic() - start
+            return True
+        finally:
+            self.max_queued = max(self.max_queued, self.queue.qsize())
+        return False
+
+    def run(self):
+        stop = False
+        while not stop:
+            batch = [self.queue.get()]
+            while len(batch) < self.batch_size:
+                try:
+                    batch.append(self.queue.get_nowait())
+                except queue.Empty:
+                    break
+            if None in batch:
+                batch = batch[:batch.index(None)]
+                stop = True
+            if batch and not self.error:
+                try:
+                    self.write(batch)
+                except (IOError, ValueError) as e:
+                    # Reported on the main thread, we keep draining the queue.
+                    self.error = e
+
+    def write(self, batch: typing.List[dict]) -> None:
+        self.fo.write(b"".join(tnetstring.dumps(state) for state in batch))
+        self.fo.flush()
+        if self.fsync:
+            os.fsync(self.fo.fileno())
+        self.written += len(batch)
+        self.batches += 1
+
+
 class Save:
     def __init__(self):
         self.stream = None
         self.filt = None
+        self.writer: typing.Optional[StreamWriterThread] = None
+        self.writer_warned = False
         self.active_flows: typing.Set[flow.Flow] = set()
 
     def load(self, loader):
         loader.add_option(
             "save_stream_file", typing.Optional[str], None,
-            "Stream flows to file as they arrive. Prefix path with + to append."
+            """
+            Stream flows to file as they arrive. Prefix path with + to append.
+            The file is gzip-compressed if the path ends in .gz.
+            """
         )
         loader.add_option(
             "save_stream_filter", typing.Optional[str], None,
             "Filter which flows are written to file."
         )
+        loader.add_option(
+            "save_stream_async", bool, False,
+            """
+            Serialize and write streamed flows on a background thread, so
+            that disk I/O does not hold up the proxy. Flows are written in
+            batches.
+            """
+        )
+        loader.add_option(
+            "save_stream_queue_size", int, 10000,
+            """
+            Maximum number of flows waiting to be written in async mode.
+            If the queue is full, the proxy waits for the writer.
+            """
+        )
+        loader.add_option(
+            "save_stream_fsync", str, "never",
+            """
+            When to fsync the stream file: never, or after every write
+            (every batch in async mode, every flow otherwise).
+            """,
+            choices=["never", "write"]
+        )
+        loader.add_option(
+            "save_stream_rotate_size", typing.Optional[str], None,
+            """
+            Start a new stream file once the current one has reached this
+            size on disk. Understands k/m/g suffixes, i.e. 100m for 100
+            megabytes. Files are named path, path.seg-1, path.seg-2, ... and
+            are listed in path.segments, so that they are read back as one
+            capture.
+            """
+        )
+        loader.add_option(
+            "save_stream_rotate_interval", int, 0,
+            """
+            Start a new stream file every this many seconds, see
+            save_stream_rotate_size. 0 means never.
+            """
+        )
 
-    def open_file(self, path):
+    def open_file(self, path, rotate=False):
         if path.startswith("+"):
             path = path[1:]
             mode = "ab"
         else:
             mode = "wb"
         path = os.path.expanduser(path)
-        return open(path, mode)
+        if rotate:
+            return io.RotatingFile(
+                path,
+                append=mode == "ab",
+                max_size=human.parse_size(ctx.options.save_stream_rotate_size),
+                max_age=ctx.options.save_stream_rotate_interval,
+            )
+        return io.open_flow_file(path, mode)
 
     def start_stream_to_path(self, path, flt):
         try:
-            f = self.open_file(path)
+            f = self.open_file(
+                path,
+                rotate=bool(
+                    ctx.options.save_stream_rotate_size or
+                    ctx.options.save_stream_rotate_interval
+                )
+            )
         except IOError as v:
             raise exceptions.OptionsError(str(v))
         self.stream = io.FilteredFlowWriter(f, flt)
         self.active_flows = set()
+        if ctx.options.save_stream_async:
+            self.writer = StreamWriterThread(
+                f,
+                ctx.options.save_stream_queue_size,
+                ctx.options.save_stream_fsync == "write",
+            )
+            self.writer_warned = False
+            self.writer.start()
 
     def configure(self, updated):
         # We're already streaming - stop the previous stream and restart
@@ -54,7 +194,28 @@ class Save:
                     )
             else:
                 self.filt = None
-        if "save_stream_file" in updated or "save_stream_filter" in updated:
+        if "save_stream_queue_size" in updated:
+            if ctx.options.save_stream_queue_size < 1:
+                raise exceptions.OptionsError(
+                    "Invalid stream queue size: %s" % ctx.options.save_stream_queue_size
+                )
+        if "save_stream_rotate_size" in updated:
+            try:
+                human.parse_size(ctx.options.save_stream_rotate_size)
+            except ValueError:
+                raise exceptions.OptionsError(
+                    "Invalid stream rotation size: %s" % ctx.options.save_stream_rotate_size
+                )
+        if "save_stream_rotate_interval" in updated:
+            if ctx.options.save_stream_rotate_interval < 0:
+                raise exceptions.OptionsError(
+                    "Invalid stream rotation interval: %s" % ctx.options.save_stream_rotate_interval
+                )
+        if updated & {
+            "save_stream_file", "save_stream_filter", "save_stream_async",
+            "save_stream_queue_size", "save_stream_fsync",
+            "save_stream_rotate_size", "save_stream_rotate_interval",
+        }:
             if self.stream:
                 self.done()
             if ctx.options.save_stream_file:
@@ -76,13 +237,36 @@ class Save:
         f.close()
         ctx.log.alert("Saved %s flows." % len(flows))
 
+    def add(self, f: flow.Flow) -> None:
+        if not self.writer:
+            self.stream.add(f)
+            if ctx.options.save_stream_fsync == "write":
+                self.stream.fo.flush()
+                os.fsync(self.stream.fo.fileno())
+            return
+        if self.writer.error:
+            # The error is reported once the stream is closed.
+            return
+        if self.filt and not flowfilter.match(self.filt, f):
+            return
+        # The flow may still change after this hook, so we take a snapshot
+        # here. The expensive part is serialization, which the writer does.
+        if self.writer.put(f.get_state()) and not self.writer_warned:
+            # Waiting for the writer stalls the event loop, and with it all
+            # connections. Only say so once, this happens on every flow.
+            self.writer_warned = True
+            ctx.log.warn(
+                "Stream file writer can't keep up, traffic is held up until the "
+                "queue drains. Consider raising save_stream_queue_size."
+            )
+
     def tcp_start(self, flow):
         if self.stream:
             self.active_flows.add(flow)
 
     def tcp_end(self, flow):
         if self.stream:
-            self.stream.add(flow)
+            self.add(flow)
             self.active_flows.discard(flow)
 
     def websocket_start(self, flow):
@@ -91,12 +275,12 @@ class Save:
 
     def websocket_end(self, flow):
         if self.stream:
-            self.stream.add(flow)
+            self.add(flow)
             self.active_flows.discard(flow)
 
     def response(self, flow):
         if self.stream:
-            self.stream.add(flow)
+            self.add(flow)
             self.active_flows.discard(flow)
 
     def request(self, flow):
@@ -106,7 +290,20 @@ class Save:
     def done(self):
         if self.stream:
             for f in self.active_flows:
-                self.stream.add(f)
+                self.add(f)
             self.active_flows = set([])
+            if self.writer:
+                self.writer.put(None)
+                self.writer.join()
+                if self.writer.error:
+                    ctx.log.error("Error writing to stream file: {}".format(self.writer.error))
+                ctx.log.info(
+                    "Stream file: {} flows in {} writes, queue peaked at {}, "
+                    "waited {:.1f}s for the writer.".format(
+                        self.writer.written, self.writer.batches,
+                        self.writer.max_queued, self.writer.blocked,
+                    )
+                )
+                self.writer = None
             self.stream.fo.close()
             self.stream = None
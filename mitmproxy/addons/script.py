@@ -101,6 +101,9 @@ class Script:
             ns = load_script(self.fullpath)
             ctx.master.addons.register(ns)
             self.ns = ns
+        # Our addons property changed, so event subscriptions must be
+        # recomputed.
+        ctx.master.addons.invalidate_handlers()
         if self.ns:
             # We're already running, so we have to explicitly register and
             # configure the addon
@@ -201,6 +204,7 @@ class ScriptLoader:
                     newscripts.append(sc)
 
             self.addons = ordered
+            ctx.master.addons.invalidate_handlers()
 
             for s in newscripts:
                 ctx.master.addons.register(s)
@@ -104,6 +104,12 @@ orders = [
 
 
 class View(collections.Sequence):
+    # Batches of more than this many flows are added to the view in one go,
+    # followed by a single refresh signal instead of one signal per flow.
+    batch_threshold = 100
+    # Number of flows read from a file before they are added to the view.
+    load_batch_size = 1000
+
     def __init__(self):
         super().__init__()
         self._store = collections.OrderedDict()
@@ -446,23 +452,32 @@ class View(collections.Sequence):
         """
             Load flows into the view, without processing them with addons.
         """
+        batch: typing.List[mitmproxy.flow.Flow] = []
         try:
-            with open(path, "rb") as f:
-                for i in io.FlowReader(f).stream():
-                    # Do this to get a new ID, so we can load the same file N times and
-                    # get new flows each time. It would be more efficient to just have a
-                    # .newid() method or something.
-                    self.add([i.copy()])
+            for segment in io.segment_paths(path):
+                with open(segment, "rb") as f:
+                    for i in io.FlowReader(f).stream():
+                        # Do this to get a new ID, so we can load the same file N times and
+                        # get new flows each time. It would be more efficient to just have a
+                        # .newid() method or something.
+                        batch.append(i.copy())
+                        if len(batch) >= self.load_batch_size:
+                            self.add(batch)
+                            batch = []
         except IOError as e:
             ctx.log.error(e.strerror)
         except exceptions.FlowReadException as e:
             ctx.log.error(str(e))
+        finally:
+            self.add(batch)
 
     def add(self, flows: typing.Sequence[mitmproxy.flow.Flow]) -> None:
         """
             Adds a flow to the state. If the flow already exists, it is
             ignored.
         """
+        if len(flows) > self.batch_threshold:
+            return self._add_batch(flows)
         for f in flows:
             if f.id not in self._store:
                 self._store[f.id] = f
@@ -472,6 +487,20 @@ class View(collections.Sequence):
                         self.focus.flow = f
                     self.sig_view_add.send(self, flow=f)
 
+    def _add_batch(self, flows: typing.Sequence[mitmproxy.flow.Flow]) -> None:
+        added = []
+        for f in flows:
+            if f.id not in self._store:
+                self._store[f.id] = f
+                if self.filter(f):
+                    self.settings[f][self._order_key_name()] = self.order_key(f)
+                    added.append(f)
+        if added:
+            self._view.update(added)
+            self.sig_view_refresh.send(self)
+            if self.focus_follow:
+                self.focus.flow = added[-1]
+
     def get_by_id(self, flow_id: str) -> typing.Optional[mitmproxy.flow.Flow]:
         """
             Get flow with the given id from the store.
@@ -2,15 +2,22 @@ import os
 import ssl
 import time
 import datetime
+import hashlib
 import ipaddress
 import sys
+import threading
 import typing
+import concurrent.futures
 
 from pyasn1.type import univ, constraint, char, namedtype, tag
 from pyasn1.codec.der.decoder import decode
 from pyasn1.error import PyAsn1Error
 import OpenSSL
+from cryptography.hazmat.backends import default_backend
+from cryptography.hazmat.primitives import serialization
+from cryptography.hazmat.primitives.asymmetric import ec
 
+from mitmproxy.coretypes import lru
 from mitmproxy.coretypes import serializable
 
 # Default expiry must not be too long: https://github.com/mitmproxy/mitmproxy/issues/815
@@ -35,9 +42,43 @@ rD693XKIHUCWOjMh1if6omGXKHH40QuME2gNa50+YPn1iYDl88uDbbMCAQI=
 """
 
 
-def create_ca(o, cn, exp):
-    key = OpenSSL.crypto.PKey()
-    key.generate_key(OpenSSL.crypto.TYPE_RSA, 2048)
+KEY_TYPES = ("rsa", "ecdsa")
+
+
+def create_key(key_type="rsa"):
+    """
+        Generates a private key, either a 2048 bit RSA key or a P-256 ECDSA
+        key.
+    """
+    if key_type == "ecdsa":
+        # PKey.from_cryptography_key only supports RSA and DSA keys.
+        key = ec.generate_private_key(ec.SECP256R1(), default_backend())
+        return OpenSSL.crypto.load_privatekey(
+            OpenSSL.crypto.FILETYPE_PEM,
+            key.private_bytes(
+                serialization.Encoding.PEM,
+                serialization.PrivateFormat.TraditionalOpenSSL,
+                serialization.NoEncryption()
+            )
+        )
+    elif key_type == "rsa":
+        key = OpenSSL.crypto.PKey()
+        key.generate_key(OpenSSL.crypto.TYPE_RSA, 2048)
+        return key
+    raise ValueError("Unknown key type: %s" % key_type)
+
+
+def get_key_type(key):
+    """
+        Returns the type of a private key as one of KEY_TYPES.
+    """
+    if isinstance(key.to_cryptography_key(), ec.EllipticCurvePrivateKey):
+        return "ecdsa"
+    return "rsa"
+
+
+def create_ca(o, cn, exp, key_type="rsa"):
+    key = create_key(key_type)
     cert = OpenSSL.crypto.X509()
     cert.set_serial_number(int(time.time() * 10000))
     cert.set_version(2)
@@ -79,7 +120,7 @@ def create_ca(o, cn, exp):
     return key, cert
 
 
-def dummy_cert(privkey, cacert, commonname, sans):
+def dummy_cert(privkey, cacert, commonname, sans, key=None):
     """
         Generates a dummy certificate.
 
@@ -87,6 +128,7 @@ def dummy_cert(privkey, cacert, commonname, sans):
         cacert: CA certificate
         commonname: Common name for the generated certificate.
         sans: A list of Subject Alternate Names.
+        key: Key for the generated certificate. Defaults to the CA key.
 
         Returns cert if operation succeeded, None if not.
     """
@@ -111,11 +153,22 @@ def dummy_cert(privkey, cacert, commonname, sans):
         cert.set_version(2)
         cert.add_extensions(
             [OpenSSL.crypto.X509Extension(b"subjectAltName", False, ss)])
-    cert.set_pubkey(cacert.get_pubkey())
+    cert.set_pubkey(key if key is not None else cacert.get_pubkey())
     cert.sign(privkey, "sha256")
     return Cert(cert)
 
 
+def _dummy_cert_pem(privkey_pem, cacert_pem, commonname, sans, key_pem):
+    """
+        Like dummy_cert, but takes and returns PEM data so that it can be run
+        in a worker process.
+    """
+    privkey = OpenSSL.crypto.load_privatekey(OpenSSL.crypto.FILETYPE_PEM, privkey_pem)
+    cacert = OpenSSL.crypto.load_certificate(OpenSSL.crypto.FILETYPE_PEM, cacert_pem)
+    key = OpenSSL.crypto.load_publickey(OpenSSL.crypto.FILETYPE_PEM, key_pem)
+    return dummy_cert(privkey, cacert, commonname, sans, key).to_pem()
+
+
 class CertStoreEntry:
 
     def __init__(self, cert, privatekey, chain_file):
@@ -132,7 +185,16 @@ TCertId = typing.Union[TCustomCertId, TGeneratedCertId]
 class CertStore:
 
     """
-        Implements an in-memory certificate store.
+        Implements an in-memory certificate store. Generated certificates are
+        kept in a least-recently-used cache of at most STORE_CAP entries, and
+        are optionally persisted to cache_dir so that they survive restarts.
+
+        Generated certificates use leaf_privatekey, which defaults to the CA
+        key.
+
+        Each certificate is generated only once, even if it is requested by
+        several threads at the same time. If an executor is set, certificates
+        are signed there, e.g. in a process pool.
     """
     STORE_CAP = 100
 
@@ -141,21 +203,32 @@ class CertStore:
             default_privatekey,
             default_ca,
             default_chain_file,
-            dhparams):
+            dhparams,
+            cache_dir: typing.Optional[str] = None,
+            executor: typing.Optional[concurrent.futures.Executor] = None,
+            leaf_privatekey=None) -> None:
         self.default_privatekey = default_privatekey
+        self.leaf_privatekey = leaf_privatekey or default_privatekey
         self.default_ca = default_ca
         self.default_chain_file = default_chain_file
         self.dhparams = dhparams
+        self.cache_dir = cache_dir
+        self.executor = executor
         self.certs: typing.Dict[TCertId, CertStoreEntry] = {}
-        self.expire_queue = []
+        # Generated cert ids, least recently used first.
+        self.expire_queue: lru.LRUCache[TGeneratedCertId, None] = lru.LRUCache()
+        self._lock = threading.Lock()
+        self._inflight: typing.Dict[TGeneratedCertId, concurrent.futures.Future] = {}
+        self._signing_pems: typing.Optional[typing.Tuple[bytes, bytes, bytes]] = None
 
-    def expire(self, entry):
-        self.expire_queue.append(entry)
-        if len(self.expire_queue) > self.STORE_CAP:
-            d = self.expire_queue.pop(0)
-            for k, v in list(self.certs.items()):
-                if v == d:
-                    del self.certs[k]
+    def expire(self, key: TGeneratedCertId) -> None:
+        """
+            Mark a generated certificate as most recently used, and evict the
+            least recently used ones if we are above STORE_CAP.
+        """
+        with self._lock:
+            for d in self.expire_queue.put(key, None, self.STORE_CAP):
+                self.certs.pop(d, None)
 
     @staticmethod
     def load_dhparam(path):
@@ -177,11 +250,31 @@ class CertStore:
             dh = OpenSSL.SSL._ffi.gc(dh, OpenSSL.SSL._lib.DH_free)
             return dh
 
+    @staticmethod
+    def load_leaf_key(path, key_type):
+        """
+            Load the private key for generated certificates, creating it if
+            necessary.
+        """
+        if not os.path.exists(path):
+            key = create_key(key_type)
+            with open(path, "wb") as f:
+                f.write(OpenSSL.crypto.dump_privatekey(OpenSSL.crypto.FILETYPE_PEM, key))
+            return key
+        with open(path, "rb") as f:
+            return OpenSSL.crypto.load_privatekey(OpenSSL.crypto.FILETYPE_PEM, f.read())
+
     @classmethod
-    def from_store(cls, path, basename):
+    def from_store(cls, path, basename, cache_dir=None, executor=None, key_type="rsa"):
+        """
+            Load the certificate store from path, creating a new CA if
+            necessary. Generated certificates use a key of the given type. If
+            the CA key is of a different type, a separate key is created and
+            kept next to the CA.
+        """
         ca_path = os.path.join(path, basename + "-ca.pem")
         if not os.path.exists(ca_path):
-            key, ca = cls.create_store(path, basename)
+            key, ca = cls.create_store(path, basename, key_type=key_type)
         else:
             with open(ca_path, "rb") as f:
                 raw = f.read()
@@ -193,17 +286,23 @@ class CertStore:
                 raw)
         dh_path = os.path.join(path, basename + "-dhparam.pem")
         dh = cls.load_dhparam(dh_path)
-        return cls(key, ca, ca_path, dh)
+        leaf_key = None
+        if get_key_type(key) != key_type:
+            leaf_key = cls.load_leaf_key(
+                os.path.join(path, "%s-leaf-%s.pem" % (basename, key_type)),
+                key_type
+            )
+        return cls(key, ca, ca_path, dh, cache_dir, executor, leaf_key)
 
     @staticmethod
-    def create_store(path, basename, o=None, cn=None, expiry=DEFAULT_EXP):
+    def create_store(path, basename, o=None, cn=None, expiry=DEFAULT_EXP, key_type="rsa"):
         if not os.path.exists(path):
             os.makedirs(path)
 
         o = o or basename
         cn = cn or basename
 
-        key, ca = create_ca(o=o, cn=cn, exp=expiry)
+        key, ca = create_ca(o=o, cn=cn, exp=expiry, key_type=key_type)
         # Dump the CA plus private key
         with open(os.path.join(path, basename + "-ca.pem"), "wb") as f:
             f.write(
@@ -289,6 +388,34 @@ class CertStore:
             ret.append(b"*." + b".".join(parts[i:]))
         return ret
 
+    @staticmethod
+    def cert_names(
+            host: typing.Optional[bytes],
+            server_names: typing.Iterable[bytes] = (),
+            upstream_cert: typing.Optional["Cert"] = None
+    ) -> typing.Tuple[typing.Optional[bytes], typing.List[bytes]]:
+        """
+            Determine the Common Name and Subject Alternative Names of the
+            certificate we present for a connection.
+
+            host: The IDNA-encoded address of the server, if known.
+            server_names: IDNA-encoded names the client asked for (SNI).
+            upstream_cert: The certificate of the server, if names should be
+            copied from it.
+        """
+        sans = set(server_names)
+        if upstream_cert:
+            sans.update(upstream_cert.altnames)
+            if upstream_cert.cn:
+                if host:
+                    sans.add(host)
+                host = upstream_cert.cn.decode("utf8").encode("idna")
+        # RFC 2818: If a subjectAltName extension of type dNSName is present, that MUST be used as the identity.
+        # In other words, the Common Name is irrelevant then.
+        if host:
+            sans.add(host)
+        return host, sorted(sans)
+
     def get_cert(self, commonname: typing.Optional[bytes], sans: typing.List[bytes]):
         """
             Returns an (cert, privkey, cert_chain) tuple.
@@ -296,8 +423,10 @@ class CertStore:
             commonname: Common name for the generated certificate. Must be a
             valid, plain-ASCII, IDNA-encoded domain name.
 
-            sans: A list of Subject Alternate Names.
+            sans: A list of Subject Alternate Names. Their order does not
+            matter, certificates are generated with the sorted names.
         """
+        sans = sorted(set(sans))
 
         potential_keys: typing.List[TCertId] = []
         if commonname:
@@ -307,25 +436,160 @@ class CertStore:
         potential_keys.append(b"*")
         potential_keys.append((commonname, tuple(sans)))
 
-        name = next(
-            filter(lambda key: key in self.certs, potential_keys),
-            None
-        )
-        if name:
-            entry = self.certs[name]
+        for name in potential_keys:
+            entry = self.certs.get(name)
+            if entry:
+                if isinstance(name, tuple):
+                    self.expire(name)
+                break
         else:
+            entry = self._generate((commonname, tuple(sans)))
+
+        return entry.cert, entry.privatekey, entry.chain_file
+
+    def _generate(self, key: TGeneratedCertId) -> CertStoreEntry:
+        """
+            Generate a certificate, or wait for a concurrent generation of
+            the same certificate to finish.
+        """
+        with self._lock:
+            entry = self.certs.get(key)
+            if entry:
+                return entry
+            future = self._inflight.get(key)
+            if future:
+                owner = False
+            else:
+                owner = True
+                future = self._inflight[key] = concurrent.futures.Future()
+        if not owner:
+            return future.result()
+
+        try:
+            cert = self._load_cached(key)
+            if cert is None:
+                cert = self._sign(*key)
+                self._save_cached(key, cert)
             entry = CertStoreEntry(
-                cert=dummy_cert(
-                    self.default_privatekey,
-                    self.default_ca,
+                cert=cert,
+                privatekey=self.leaf_privatekey,
+                chain_file=self.default_chain_file)
+            self.certs[key] = entry
+            self.expire(key)
+        except BaseException as e:
+            future.set_exception(e)
+            raise
+        else:
+            future.set_result(entry)
+        finally:
+            with self._lock:
+                del self._inflight[key]
+        return entry
+
+    def _sign(self, commonname: typing.Optional[bytes], sans: typing.Sequence[bytes]) -> "Cert":
+        executor = self.executor
+        if executor:
+            if self._signing_pems is None:
+                # Serializing the keys is not free, so we only do it once.
+                self._signing_pems = (
+                    OpenSSL.crypto.dump_privatekey(OpenSSL.crypto.FILETYPE_PEM, self.default_privatekey),
+                    OpenSSL.crypto.dump_certificate(OpenSSL.crypto.FILETYPE_PEM, self.default_ca),
+                    OpenSSL.crypto.dump_publickey(OpenSSL.crypto.FILETYPE_PEM, self.leaf_privatekey),
+                )
+            privkey_pem, cacert_pem, key_pem = self._signing_pems
+            try:
+                future = executor.submit(
+                    _dummy_cert_pem,
+                    privkey_pem,
+                    cacert_pem,
                     commonname,
-                    sans),
-                privatekey=self.default_privatekey,
+                    list(sans),
+                    key_pem
+                )
+            except RuntimeError:
+                # The executor has been shut down in the meantime.
+                pass
+            else:
+                return Cert.from_pem(future.result())
+        return dummy_cert(
+            self.default_privatekey,
+            self.default_ca,
+            commonname,
+            sans,
+            self.leaf_privatekey)
+
+    def take_generated(self, other: "CertStore") -> int:
+        """
+            Take over the generated certificates of another store, e.g. after
+            the store has been reloaded. This only happens if both stores
+            sign with the same CA and leaf key, otherwise nothing is copied.
+
+            Returns:
+                The number of certificates taken over.
+        """
+        def leaf_key(store):
+            return OpenSSL.crypto.dump_publickey(OpenSSL.crypto.FILETYPE_PEM, store.leaf_privatekey)
+
+        if (
+            self.default_ca.digest("sha256") != other.default_ca.digest("sha256") or
+            leaf_key(self) != leaf_key(other)
+        ):
+            return 0
+        with other._lock:
+            keys = [k for k in other.expire_queue if k in other.certs]
+            entries = [other.certs[k] for k in keys]
+        for key, entry in zip(keys, entries):
+            self.certs[key] = CertStoreEntry(
+                cert=entry.cert,
+                privatekey=self.leaf_privatekey,
                 chain_file=self.default_chain_file)
-            self.certs[(commonname, tuple(sans))] = entry
-            self.expire(entry)
+            self.expire(key)
+        return len(keys)
 
-        return entry.cert, entry.privatekey, entry.chain_file
+    def pregenerate(self, hosts: typing.Iterable[bytes]) -> None:
+        """
+            Generate certificates for a list of hosts ahead of time, as they
+            would be generated for a client connecting to the host with a
+            matching SNI value and without upstream certificate lookups. This
+            is most useful in combination with a cache_dir, as only the
+            STORE_CAP most recently used certificates are kept in memory.
+        """
+        for h in hosts:
+            self.get_cert(*self.cert_names(h, [h]))
+
+    def _cache_path(self, key: TGeneratedCertId) -> str:
+        commonname, sans = key
+        h = hashlib.sha256(self.default_ca.digest("sha256"))
+        h.update(OpenSSL.crypto.dump_publickey(OpenSSL.crypto.FILETYPE_PEM, self.leaf_privatekey))
+        h.update(b"\0" + (commonname or b""))
+        for s in sans:
+            h.update(b"\0" + s)
+        return os.path.join(self.cache_dir, h.hexdigest() + ".pem")
+
+    def _load_cached(self, key: TGeneratedCertId) -> typing.Optional["Cert"]:
+        if not self.cache_dir:
+            return None
+        try:
+            with open(self._cache_path(key), "rb") as f:
+                cert = Cert.from_pem(f.read())
+        except (OSError, OpenSSL.crypto.Error):
+            return None
+        if cert.has_expired:
+            return None
+        return cert
+
+    def _save_cached(self, key: TGeneratedCertId, cert: "Cert") -> None:
+        if not self.cache_dir:
+            return
+        path = self._cache_path(key)
+        tmp = "%s.%s.tmp" % (path, threading.get_ident())
+        try:
+            os.makedirs(self.cache_dir, exist_ok=True)
+            with open(tmp, "wb") as f:
+                f.write(cert.to_pem())
+            os.replace(tmp, path)
+        except OSError:
+            pass
 
 
 class _GeneralName(univ.Choice):
@@ -418,8 +682,12 @@ class Cert(serializable.Serializable):
             OpenSSL.crypto.TYPE_RSA: "RSA",
             OpenSSL.crypto.TYPE_DSA: "DSA",
         }
+        if isinstance(pk.to_cryptography_key(), ec.EllipticCurvePublicKey):
+            t = "EC"
+        else:
+            t = types.get(pk.type(), "UNKNOWN")
         return (
-            types.get(pk.type(), "UNKNOWN"),
+            t,
             pk.bits()
         )
 
@@ -55,10 +55,25 @@ class ClientConnection(tcp.BaseHandler, stateobject.StateObject):
         self.alpn_proto_negotiated = None
         self.tls_version = None
         self.tls_extensions = None
+        self._client_hello: typing.Optional[typing.Tuple[typing.Any, tls.ClientHello]] = None
 
     def connected(self):
         return bool(self.connection) and not self.finished
 
+    def get_client_hello(self) -> tls.ClientHello:
+        """
+        Peek into the connection and parse the TLS ClientHello message.
+
+        The result is cached until the connection is upgraded to TLS, so
+        that all layers and addons share a single parse.
+
+        Raises:
+            exceptions.TlsProtocolException, if there is no valid ClientHello.
+        """
+        if self._client_hello is None or self._client_hello[0] is not self.rfile.o:
+            self._client_hello = (self.rfile.o, tls.ClientHello.from_file(self.rfile))
+        return self._client_hello[1]
+
     def __repr__(self):
         if self.tls_established:
             tls = "[{}] ".format(self.tls_version)
@@ -136,7 +151,7 @@ class ClientConnection(tcp.BaseHandler, stateobject.StateObject):
         # Unfortunately OpenSSL provides no way to expose all TLS extensions, so we do this dance
         # here and use our Kaitai parser.
         try:
-            client_hello = tls.ClientHello.from_file(self.rfile)
+            client_hello = self.get_client_hello()
         except exceptions.TlsProtocolException:  # pragma: no cover
             pass  # if this fails, we don't want everything to go down.
         else:
@@ -177,6 +192,7 @@ class ServerConnection(tcp.TCPClient, stateobject.StateObject):
         timestamp_tcp_setup: TCP ACK received timestamp
         timestamp_tls_setup: TLS established timestamp
         timestamp_end: Connection end timestamp
+        reusable: True if the connection is idle after a complete HTTP/1 exchange and may be pooled
     """
 
     def __init__(self, address, source_address=None, spoof_source_address=None):
@@ -190,6 +206,7 @@ class ServerConnection(tcp.TCPClient, stateobject.StateObject):
         self.timestamp_end = None
         self.timestamp_tcp_setup = None
         self.timestamp_tls_setup = None
+        self.reusable = False
 
     def connected(self):
         return bool(self.connection) and not self.finished
@@ -23,10 +23,17 @@ class Channel:
         """
         if not self.should_exit.is_set():
             m.reply = Reply(m)
-            asyncio.run_coroutine_threadsafe(
-                self.master.addons.handle_lifecycle(mtype, m),
-                self.loop,
-            )
+            if self.master.addons.handles_lifecycle(mtype, m):
+                asyncio.run_coroutine_threadsafe(
+                    self.master.addons.handle_lifecycle(mtype, m),
+                    self.loop,
+                )
+            else:
+                # No addon is interested in this event, so we can skip the
+                # round-trip through the event loop.
+                m.reply.take()
+                m.reply.ack()
+                m.reply.commit()
             g = m.reply.q.get()
             if g == exceptions.Kill:
                 raise exceptions.Kill()
@@ -39,6 +46,8 @@ class Channel:
         """
         if not self.should_exit.is_set():
             m.reply = DummyReply()
+            if not self.master.addons.handles_lifecycle(mtype, m):
+                return
             asyncio.run_coroutine_threadsafe(
                 self.master.addons.handle_lifecycle(mtype, m),
                 self.loop,
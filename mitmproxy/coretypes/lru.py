@@ -0,0 +1,73 @@
+import collections
+import threading
+import typing
+
+K = typing.TypeVar("K")
+V = typing.TypeVar("V")
+
+
+class LRUCache(typing.Generic[K, V]):
+
+    """
+        A small thread-safe mapping that remembers the order in which its
+        entries were used. The caller passes the maximum size to put(), so
+        that caps which can be changed at runtime are picked up right away.
+
+        cache = LRUCache()
+        cache.put("a", 1, cap=1)
+        assert cache.get("a") == 1
+        assert cache.put("b", 2, cap=1) == ["a"]
+    """
+
+    def __init__(self) -> None:
+        self._entries: "collections.OrderedDict[K, V]" = collections.OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: K, default: typing.Optional[V] = None) -> typing.Optional[V]:
+        """
+            Return the value for key and mark it as most recently used.
+        """
+        with self._lock:
+            if key not in self._entries:
+                return default
+            self._entries.move_to_end(key)
+            return self._entries[key]
+
+    def put(self, key: K, value: V, cap: int) -> typing.List[K]:
+        """
+            Add or replace an entry and mark it as most recently used. Least
+            recently used entries are evicted until at most cap entries are
+            left.
+
+            Returns:
+                The keys of the evicted entries.
+        """
+        evicted = []
+        with self._lock:
+            self._entries[key] = value
+            self._entries.move_to_end(key)
+            while len(self._entries) > cap:
+                k, _ = self._entries.popitem(last=False)
+                evicted.append(k)
+        return evicted
+
+    def pop(self, key: K, default: typing.Optional[V] = None) -> typing.Optional[V]:
+        with self._lock:
+            return self._entries.pop(key, default)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+    def __contains__(self, key) -> bool:
+        return key in self._entries
+
+    def __iter__(self) -> typing.Iterator[K]:
+        """
+            Iterate over a snapshot of the keys, least recently used first.
+        """
+        with self._lock:
+            return iter(list(self._entries))
+
+    def __len__(self) -> int:
+        return len(self._entries)
@@ -1,8 +1,11 @@
 
 from .io import FlowWriter, FlowReader, FilteredFlowWriter, read_flows_from_paths
+from .io import RotatingFile, open_flow_file, segment_paths
 from .db import DBHandler
+from .index import FlowIndex
 
 
 __all__ = [
-    "FlowWriter", "FlowReader", "FilteredFlowWriter", "read_flows_from_paths", "DBHandler"
+    "FlowWriter", "FlowReader", "FilteredFlowWriter", "read_flows_from_paths", "DBHandler",
+    "FlowIndex", "RotatingFile", "open_flow_file", "segment_paths",
 ]
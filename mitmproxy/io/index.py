@@ -0,0 +1,356 @@
+"""
+    Random access to flow dumps.
+
+    A flow dump is a plain sequence of tnetstrings, so finding flow N means
+    walking over all flows before it. FlowIndex memory-maps a dump, records
+    the offset of every flow together with a few fields that are useful for
+    listing and selecting flows, and loads individual flows on demand.
+
+    The index is kept in a sidecar file next to the dump ("<dump>.idx"), so
+    that it only needs to be built once. If the dump has been appended to
+    since, only the new flows are indexed. A flow that is still being written
+    at the end of the dump, e.g. during a live capture, is left for the next
+    refresh.
+
+    Compressed dumps can't be indexed, see FlowIndex.can_index.
+"""
+import mmap
+import os
+import typing
+import zlib
+
+from mitmproxy import exceptions
+from mitmproxy import flow
+from mitmproxy.io import compat
+from mitmproxy.io import io
+from mitmproxy.io import tnetstring
+from mitmproxy.utils import strutils
+
+INDEX_VERSION = 1
+INDEX_SUFFIX = ".idx"
+# Number of bytes before the end of the indexed data that are checksummed
+# to detect whether the dump has been rewritten rather than appended to.
+CHECK_SIZE = 64
+
+IndexEntry = typing.NamedTuple(
+    "IndexEntry", [
+        ("offset", int),
+        ("length", int),
+        ("id", str),
+        ("type", str),
+        ("timestamp", typing.Optional[float]),
+        ("host", typing.Optional[str]),
+        ("method", typing.Optional[str]),
+        ("status_code", typing.Optional[int]),
+        ("request_size", typing.Optional[int]),
+        ("response_size", typing.Optional[int]),
+    ]
+)
+
+
+def _size(message: typing.Optional[dict]) -> typing.Optional[int]:
+    if message and message.get("content") is not None:
+        return len(message["content"])
+    return None
+
+
+def make_entry(offset: int, length: int, state: dict) -> IndexEntry:
+    """
+        Extract the indexed fields from the (migrated) state of a flow.
+    """
+    request = state.get("request")
+    response = state.get("response")
+    if request:
+        timestamp = request.get("timestamp_start")
+        host = strutils.always_str(request.get("host"), "utf8", "replace")
+        method = strutils.always_str(request.get("method"), "utf8", "replace")
+    else:
+        timestamp = (state.get("client_conn") or {}).get("timestamp_start")
+        address = (state.get("server_conn") or {}).get("address")
+        host = address[0] if address else None
+        method = None
+    return IndexEntry(
+        offset,
+        length,
+        state["id"],
+        state["type"],
+        timestamp,
+        host,
+        method,
+        response.get("status_code") if response else None,
+        _size(request),
+        _size(response),
+    )
+
+
+def load_state(data: tnetstring.TBuffer) -> dict:
+    """
+        Parse and migrate a single serialized flow.
+
+        Raises:
+            FlowReadException, if the data is not a valid flow.
+    """
+    try:
+        loaded = tnetstring.loads(data)
+        if not isinstance(loaded, dict):
+            raise ValueError("Invalid data format.")
+        state = compat.migrate_flow(loaded)
+    except ValueError as e:
+        raise exceptions.FlowReadException(str(e))
+    if state["type"] not in io.FLOW_TYPES:
+        raise exceptions.FlowReadException("Unknown flow type: {}".format(state["type"]))
+    return state
+
+
+def scan(buf: mmap.mmap, offset: int = 0) -> typing.Iterator[typing.Tuple[int, int]]:
+    """
+        Yields (offset, length) for every complete tnetstring in buf,
+        starting at offset. Only the length prefixes are looked at. A
+        truncated tnetstring at the end of buf ends the scan.
+
+        Raises:
+            FlowReadException, if the data is corrupt.
+    """
+    end = len(buf)
+    while offset < end:
+        colon = buf.find(b":", offset, offset + 11)
+        if colon == -1:
+            if end - offset < 11 and buf[offset:end].isdigit():
+                # The length prefix hasn't been written completely yet.
+                return
+            raise exceptions.FlowReadException("Invalid data format.")
+        try:
+            size = int(buf[offset:colon])
+        except ValueError:
+            raise exceptions.FlowReadException("Invalid data format.")
+        length = colon - offset + 1 + size + 1
+        if offset + length > end:
+            return
+        yield offset, length
+        offset += length
+
+
+class FlowIndex:
+    """
+        An index of the flows in a dump file.
+
+        Flows are loaded lazily: len(index) and index.entries are cheap,
+        index[i] parses a single flow. With refresh=False, only the sidecar
+        is read on construction, and new flows can be indexed and loaded in
+        one pass with follow().
+    """
+
+    def __init__(self, path: str, sidecar: bool = True, refresh: bool = True) -> None:
+        self.path = os.path.expanduser(path)
+        self.sidecar = sidecar
+        self.entries: typing.List[IndexEntry] = []
+        # End of the last indexed flow.
+        self._size = 0
+        # Checksum of the end of the indexed data, see CHECK_SIZE.
+        self._check_value = 0
+        self._fo: typing.Optional[typing.BinaryIO] = None
+        self._mmap: typing.Optional[mmap.mmap] = None
+        try:
+            self._fo = open(self.path, "rb")
+        except IOError as e:
+            raise exceptions.FlowReadException(e.strerror)
+        try:
+            self._read_sidecar()
+            if refresh:
+                self.refresh()
+        except Exception:
+            self.close()
+            raise
+
+    @staticmethod
+    def can_index(path: str) -> bool:
+        """
+            Whether path is a regular, uncompressed file.
+        """
+        path = os.path.expanduser(path)
+        if not os.path.isfile(path):
+            return False
+        with open(path, "rb") as f:
+            return f.read(len(io.GZIP_MAGIC)) != io.GZIP_MAGIC
+
+    @property
+    def sidecar_path(self) -> str:
+        return self.path + INDEX_SUFFIX
+
+    @property
+    def size(self) -> int:
+        """
+            Number of bytes of the dump that are indexed.
+        """
+        return self._size
+
+    def _file_size(self) -> int:
+        assert self._fo
+        return os.fstat(self._fo.fileno()).st_size
+
+    def _map(self, size: int) -> None:
+        assert self._fo
+        if self._mmap is not None:
+            self._mmap.close()
+            self._mmap = None
+        if size:
+            self._mmap = mmap.mmap(self._fo.fileno(), size, access=mmap.ACCESS_READ)
+
+    def _check(self, size: int) -> int:
+        if not size:
+            return 0
+        assert self._mmap is not None
+        return zlib.crc32(self._mmap[max(0, size - CHECK_SIZE):size])
+
+    def _read_sidecar(self) -> None:
+        if not self.sidecar:
+            return
+        try:
+            with open(self.sidecar_path, "rb") as f:
+                d = typing.cast(typing.Dict[bytes, typing.Any], tnetstring.load(f))
+            if d[b"version"] != INDEX_VERSION:
+                return
+            size, check = d[b"size"], d[b"check"]
+            if size > self._file_size():
+                return
+            self._map(size)
+            if self._check(size) != check:
+                return
+            entries = [IndexEntry(*e) for e in d[b"entries"]]
+        except (IOError, ValueError, KeyError, TypeError):
+            return
+        self.entries = entries
+        self._size = size
+        self._check_value = check
+
+    def _write_sidecar(self) -> None:
+        if not self.sidecar:
+            return
+        d = {
+            b"version": INDEX_VERSION,
+            b"size": self._size,
+            b"check": self._check_value,
+            b"entries": [list(e) for e in self.entries],
+        }
+        tmp = self.sidecar_path + ".tmp"
+        try:
+            with open(tmp, "wb") as f:
+                tnetstring.dump(d, f)
+            os.replace(tmp, self.sidecar_path)
+        except IOError:
+            # The index is an optimization, e.g. the directory may be read-only.
+            pass
+
+    def refresh(self) -> int:
+        """
+            Index flows that have been appended to the dump since it was
+            last indexed. If the dump has been truncated or rewritten, it is
+            indexed from scratch.
+
+            Returns:
+                The number of new flows.
+
+            Raises:
+                FlowReadException, if the new data is not a valid dump.
+        """
+        return sum(1 for _ in self.follow())
+
+    def follow(self) -> typing.Iterator[flow.Flow]:
+        """
+            Like refresh(), but yields the new flows as they are indexed, so
+            that each of them is only parsed once. The sidecar is updated
+            once all new flows have been consumed.
+
+            Raises:
+                FlowReadException, if the new data is not a valid dump.
+        """
+        size = self._file_size()
+        if size < self._size or self._check(self._size) != self._check_value:
+            self.entries, self._size, self._check_value = [], 0, 0
+        if size == self._size:
+            return
+        self._map(size)
+        assert self._mmap is not None
+        new = 0
+        for offset, length in scan(self._mmap, self._size):
+            state = self._load_state(offset, length)
+            self.entries.append(make_entry(offset, length, state))
+            self._size = offset + length
+            new += 1
+            yield io.FLOW_TYPES[state["type"]].from_state(state)
+        if new:
+            self._check_value = self._check(self._size)
+            self._write_sidecar()
+
+    def pending(self) -> int:
+        """
+            The number of complete flows in the dump that are not indexed
+            yet, up to the first corrupt one. Only the length prefixes are
+            looked at, so this is cheap.
+        """
+        size = self._file_size()
+        if size <= self._size:
+            return 0
+        assert self._fo
+        # A separate mapping, so that this can be called while following.
+        n = 0
+        with mmap.mmap(self._fo.fileno(), size, access=mmap.ACCESS_READ) as buf:
+            try:
+                for _ in scan(buf, self._size):
+                    n += 1
+            except exceptions.FlowReadException:
+                # Reported once the flows are indexed.
+                pass
+        return n
+
+    def _load_state(self, offset: int, length: int) -> dict:
+        # Parse straight from the mapping. The view is released explicitly,
+        # as the mmap can't be closed while it's in use. The typeshed stubs
+        # know neither mmaps as buffers nor memoryview.release.
+        data = memoryview(self._mmap)[offset:offset + length]  # type: ignore
+        try:
+            return load_state(data)
+        finally:
+            data.release()  # type: ignore
+
+    def load(self, entry: IndexEntry) -> flow.Flow:
+        """
+            Load the flow described by an index entry.
+        """
+        state = self._load_state(entry.offset, entry.length)
+        return io.FLOW_TYPES[state["type"]].from_state(state)
+
+    def stream(
+        self,
+        predicate: typing.Optional[typing.Callable[[IndexEntry], bool]] = None
+    ) -> typing.Iterator[flow.Flow]:
+        """
+            Yields the flows in the dump, optionally only those whose index
+            entry matches predicate. Flows that are not selected are not parsed.
+        """
+        for entry in self.entries:
+            if predicate is None or predicate(entry):
+                yield self.load(entry)
+
+    def __len__(self) -> int:
+        return len(self.entries)
+
+    def __getitem__(self, index: int) -> flow.Flow:
+        return self.load(self.entries[index])
+
+    def __iter__(self) -> typing.Iterator[flow.Flow]:
+        return self.stream()
+
+    def close(self) -> None:
+        if self._mmap is not None:
+            self._mmap.close()
+            self._mmap = None
+        if self._fo is not None:
+            self._fo.close()
+            self._fo = None
+
+    def __enter__(self) -> "FlowIndex":
+        return self
+
+    def __exit__(self, *args) -> None:
+        self.close()
@@ -1,5 +1,8 @@
+import gzip
 import os
-from typing import Type, Iterable, Dict, Union, Any, cast  # noqa
+import time
+import zlib
+from typing import Type, Iterable, Dict, Union, Any, List, Optional, BinaryIO, cast  # noqa
 
 from mitmproxy import exceptions
 from mitmproxy import flow
@@ -17,6 +20,72 @@ FLOW_TYPES: Dict[str, Type[flow.Flow]] = dict(
     tcp=tcp.TCPFlow,
 )
 
+GZIP_MAGIC = b"\x1f\x8b"
+
+
+def _peek(fo, size: int) -> bytes:
+    if hasattr(fo, "peek"):
+        return fo.peek(size)[:size]
+    try:
+        if fo.seekable():
+            pos = fo.tell()
+            data = fo.read(size)
+            fo.seek(pos)
+            return data
+    except (AttributeError, OSError):
+        pass
+    return b""
+
+
+def open_flow_file(path: str, mode: str) -> BinaryIO:
+    """
+        Open a flow file for writing. Files ending in .gz are gzip-compressed.
+        FlowReader detects compressed files by their content.
+    """
+    if path.endswith(".gz"):
+        return cast(BinaryIO, gzip.open(path, mode))
+    # open() can't tell from a variable mode that this is a binary file.
+    return cast(BinaryIO, open(path, mode))
+
+
+def _segment_path(path: str, index: int) -> str:
+    return path if index == 0 else "%s.seg-%d" % (path, index)
+
+
+def _manifest_path(path: str) -> str:
+    return path + ".segments"
+
+
+def _read_manifest(path: str) -> List[str]:
+    """
+        Returns the additional segments listed in the manifest of a rotated
+        set. Only names RotatingFile would have written are accepted.
+    """
+    try:
+        with open(_manifest_path(path)) as f:
+            names = f.read().split()
+    except OSError:
+        return []
+    base = os.path.basename(path)
+    paths = []
+    for i, name in enumerate(names, 1):
+        if name != os.path.basename(_segment_path(base, i)):
+            break
+        paths.append(_segment_path(path, i))
+    return paths
+
+
+def segment_paths(path: str) -> List[str]:
+    """
+        Returns the files of a set written by RotatingFile, in order:
+        path, path.seg-1, path.seg-2, ...
+
+        Segments are only taken from the set's manifest (path.segments), so
+        unrelated files next to path are never picked up. Segments that have
+        been removed since are skipped.
+    """
+    return [path] + [p for p in _read_manifest(path) if os.path.exists(p)]
+
 
 class FlowWriter:
     def __init__(self, fo):
@@ -29,6 +98,8 @@ class FlowWriter:
 
 class FlowReader:
     def __init__(self, fo):
+        if _peek(fo, len(GZIP_MAGIC)) == GZIP_MAGIC:
+            fo = gzip.GzipFile(fileobj=fo, mode="rb")
         self.fo = fo
 
     def stream(self) -> Iterable[flow.Flow]:
@@ -53,6 +124,9 @@ class FlowReader:
             if str(e) == "not a tnetstring: empty file":
                 return  # Error is due to EOF
             raise exceptions.FlowReadException("Invalid data format.")
+        except (EOFError, zlib.error):
+            # Truncated or corrupt compressed data
+            raise exceptions.FlowReadException("Invalid data format.")
 
 
 class FilteredFlowWriter:
@@ -67,9 +141,104 @@ class FilteredFlowWriter:
         tnetstring.dump(d, self.fo)
 
 
+class RotatingFile:
+    """
+        A file that is written as a set of segments: path, path.seg-1,
+        path.seg-2, ... The additional segments are listed in a manifest,
+        path.segments, which is how readers find them.
+
+        Before a write, a new segment is started if the current one has
+        reached max_size bytes on disk or was started more than max_age
+        seconds ago. Writes are never split, so if each write holds complete
+        flows, every segment is a valid flow file on its own. All segments
+        are compressed if path ends in .gz.
+    """
+
+    def __init__(
+        self,
+        path: str,
+        append: bool = False,
+        max_size: Optional[int] = None,
+        max_age: Optional[float] = None,
+    ) -> None:
+        self.path = path
+        self.max_size = max_size
+        self.max_age = max_age
+        self.segments = _read_manifest(path)
+        if not append:
+            # Don't let segments of an earlier capture become part of this
+            # one. We only remove what is listed in our own manifest.
+            for p in self.segments:
+                try:
+                    os.remove(p)
+                except FileNotFoundError:
+                    pass
+            self.segments = []
+            self._write_manifest()
+        self.index = len(self.segments)
+        self._open("ab" if append else "wb")
+
+    def _write_manifest(self) -> None:
+        manifest = _manifest_path(self.path)
+        if not self.segments:
+            try:
+                os.remove(manifest)
+            except FileNotFoundError:
+                pass
+            return
+        tmp = manifest + ".tmp"
+        with open(tmp, "w") as f:
+            f.write("".join(os.path.basename(p) + "\n" for p in self.segments))
+        os.replace(tmp, manifest)
+
+    def _open(self, mode: str) -> None:
+        path = _segment_path(self.path, self.index)
+        self.raw = cast(BinaryIO, open(path, mode))
+        if self.path.endswith(".gz"):
+            self.fo = cast(BinaryIO, gzip.GzipFile(fileobj=self.raw, mode=mode))
+        else:
+            self.fo = self.raw
+        self.started = time.monotonic()
+        self.segment_written = 0
+
+    def _rotation_due(self) -> bool:
+        if not self.segment_written:
+            return False
+        if self.max_size and self.raw.tell() >= self.max_size:
+            return True
+        if self.max_age and time.monotonic() - self.started >= self.max_age:
+            return True
+        return False
+
+    def rotate(self) -> None:
+        self.close()
+        self.index += 1
+        self._open("wb")
+        self.segments.append(_segment_path(self.path, self.index))
+        self._write_manifest()
+
+    def write(self, data: bytes) -> int:
+        if self._rotation_due():
+            self.rotate()
+        self.segment_written += len(data)
+        return self.fo.write(data)
+
+    def flush(self) -> None:
+        self.fo.flush()
+        self.raw.flush()
+
+    def fileno(self) -> int:
+        return self.raw.fileno()
+
+    def close(self) -> None:
+        self.fo.close()
+        self.raw.close()
+
+
 def read_flows_from_paths(paths):
     """
     Given a list of filepaths, read all flows and return a list of them.
+    Compressed files and rotated sets (see RotatingFile) are read transparently.
     From a performance perspective, streaming would be advisable -
     however, if there's an error with one of the files, we want it to be raised immediately.
 
@@ -80,8 +249,9 @@ def read_flows_from_paths(paths):
         flows = []
         for path in paths:
             path = os.path.expanduser(path)
-            with open(path, "rb") as f:
-                flows.extend(FlowReader(f).stream())
+            for segment in segment_paths(path):
+                with open(segment, "rb") as f:
+                    flows.extend(FlowReader(f).stream())
     except IOError as e:
         raise exceptions.FlowReadException(e.strerror)
     return flows
@@ -40,22 +40,23 @@ all other strings are returned as plain bytes.
 :License: MIT
 """
 
-import collections
 import typing
 
 TSerializable = typing.Union[None, str, bool, int, float, bytes, list, tuple, dict]
+# Anything that can be parsed in place.
+TBuffer = typing.Union[bytes, bytearray, memoryview]
 
 
 def dumps(value: TSerializable) -> bytes:
     """
     This function dumps a python object as a tnetstring.
     """
-    #  This uses a deque to collect output fragments in reverse order,
-    #  then joins them together at the end.  It's measurably faster
-    #  than creating all the intermediate strings.
-    q: collections.deque = collections.deque()
-    _rdumpq(q, 0, value)
-    return b''.join(q)
+    #  This collects output fragments in a list and joins them together
+    #  at the end, so that large strings are only copied once. It's
+    #  measurably faster than creating all the intermediate strings.
+    chunks: typing.List[bytes] = []
+    _dump(value, chunks)
+    return b''.join(chunks)
 
 
 def dump(value: TSerializable, file_handle: typing.BinaryIO) -> None:
@@ -66,94 +67,95 @@ def dump(value: TSerializable, file_handle: typing.BinaryIO) -> None:
     file_handle.write(dumps(value))
 
 
-def _rdumpq(q: collections.deque, size: int, value: TSerializable) -> int:
+def _dump(value: typing.Any, chunks: typing.List[bytes]) -> int:
     """
-    Dump value as a tnetstring, to a deque instance, last chunks first.
+    Dump value as a tnetstring, appending chunks of the output to the given list.
+    Returns the number of bytes added.
 
-    This function generates the tnetstring representation of the given value,
-    pushing chunks of the output onto the given deque instance.  It pushes
-    the last chunk first, then recursively generates more chunks.
-
-    When passed in the current size of the string in the queue, it will return
-    the new size of the string in the queue.
-
-    Operating last-chunk-first makes it easy to calculate the size written
-    for recursive structures without having to build their representation as
-    a string.  This is measurably faster than generating the intermediate
-    strings, especially on deeply nested structures.
+    The length prefix of a list or dict is not known before its items have
+    been dumped, so we reserve a slot for it and fill it in afterwards.
+    The most common types are checked first, by exact type. As type checkers
+    can't narrow on that, value is not annotated as TSerializable.
     """
-    write = q.appendleft
-    if value is None:
-        write(b'0:~')
-        return size + 3
+    append = chunks.append
+    t = type(value)
+    if t is bytes:
+        span = b'%d:' % len(value)
+        append(span)
+        append(value)
+        append(b',')
+        return len(span) + len(value) + 1
+    elif t is str:
+        data = value.encode("utf8")
+        span = b'%d:' % len(data)
+        append(span)
+        append(data)
+        append(b';')
+        return len(span) + len(data) + 1
+    elif t is dict:
+        slot = len(chunks)
+        append(b'')
+        size = 0
+        for k, v in value.items():
+            size += _dump(k, chunks)
+            size += _dump(v, chunks)
+        span = b'%d:' % size
+        chunks[slot] = span
+        append(b'}')
+        return len(span) + size + 1
+    elif t is list or t is tuple:
+        slot = len(chunks)
+        append(b'')
+        size = 0
+        for item in value:
+            size += _dump(item, chunks)
+        span = b'%d:' % size
+        chunks[slot] = span
+        append(b']')
+        return len(span) + size + 1
+    elif value is None:
+        append(b'0:~')
+        return 3
     elif value is True:
-        write(b'4:true!')
-        return size + 7
+        append(b'4:true!')
+        return 7
     elif value is False:
-        write(b'5:false!')
-        return size + 8
+        append(b'5:false!')
+        return 8
     elif isinstance(value, int):
-        data = str(value).encode()
-        ldata = len(data)
-        span = str(ldata).encode()
-        write(b'%s:%s#' % (span, data))
-        return size + 2 + len(span) + ldata
+        data = b'%d' % value
+        data = b'%d:%s#' % (len(data), data)
+        append(data)
+        return len(data)
     elif isinstance(value, float):
         #  Use repr() for float rather than str().
         #  It round-trips more accurately.
         #  Probably unnecessary in later python versions that
         #  use David Gay's ftoa routines.
         data = repr(value).encode()
-        ldata = len(data)
-        span = str(ldata).encode()
-        write(b'%s:%s^' % (span, data))
-        return size + 2 + len(span) + ldata
+        data = b'%d:%s^' % (len(data), data)
+        append(data)
+        return len(data)
+    # Subclasses of the container and string types
     elif isinstance(value, bytes):
-        data = value
-        ldata = len(data)
-        span = str(ldata).encode()
-        write(b',')
-        write(data)
-        write(b':')
-        write(span)
-        return size + 2 + len(span) + ldata
+        return _dump(bytes(value), chunks)
     elif isinstance(value, str):
-        data = value.encode("utf8")
-        ldata = len(data)
-        span = str(ldata).encode()
-        write(b';')
-        write(data)
-        write(b':')
-        write(span)
-        return size + 2 + len(span) + ldata
+        return _dump(str(value), chunks)
     elif isinstance(value, (list, tuple)):
-        write(b']')
-        init_size = size = size + 1
-        for item in reversed(value):
-            size = _rdumpq(q, size, item)
-        span = str(size - init_size).encode()
-        write(b':')
-        write(span)
-        return size + 1 + len(span)
+        return _dump(list(value), chunks)
     elif isinstance(value, dict):
-        write(b'}')
-        init_size = size = size + 1
-        for (k, v) in value.items():
-            size = _rdumpq(q, size, v)
-            size = _rdumpq(q, size, k)
-        span = str(size - init_size).encode()
-        write(b':')
-        write(span)
-        return size + 1 + len(span)
+        return _dump(dict(value), chunks)
     else:
         raise ValueError("unserializable object: {} ({})".format(value, type(value)))
 
 
-def loads(string: bytes) -> TSerializable:
+def loads(string: TBuffer) -> TSerializable:
     """
     This function parses a tnetstring into a python object.
+    Any bytes-like object can be passed, e.g. a memoryview into an mmap.
+    Only the leaf values are copied out of it.
     """
-    return pop(string)[0]
+    return _parse(string, 0, len(string))[0]
 
 
 def load(file_handle: typing.BinaryIO) -> TSerializable:
@@ -210,18 +212,9 @@ def parse(data_type: int, data: bytes) -> TSerializable:
             raise ValueError("not a tnetstring: invalid null literal")
         return None
     if data_type == ord(b']'):
-        l = []
-        while data:
-            item, data = pop(data)
-            l.append(item)  # type: ignore
-        return l
+        return _parse_list(data, 0, len(data))
     if data_type == ord(b'}'):
-        d = {}
-        while data:
-            key, data = pop(data)
-            val, data = pop(data)
-            d[key] = val  # type: ignore
-        return d
+        return _parse_dict(data, 0, len(data))
     raise ValueError("unknown type tag: {}".format(data_type))
 
 
@@ -231,20 +224,66 @@ def pop(data: bytes) -> typing.Tuple[TSerializable, bytes]:
     It returns a tuple giving the parsed object and a string
     containing any unparsed data from the end of the string.
     """
-    #  Parse out data length, type and remaining string.
-    try:
-        blength, data = data.split(b':', 1)
-        length = int(blength)
-    except ValueError:
-        raise ValueError("not a tnetstring: missing or invalid length prefix: {}".format(data))
-    try:
-        data, data_type, remain = data[:length], data[length], data[length + 1:]
-    except IndexError:
-        #  This fires if len(data) < dlen, meaning we don't need
-        #  to further validate that data is the right length.
+    value, end = _parse(data, 0, len(data))
+    return value, data[end:]
+
+
+def _parse(data: TBuffer, offset: int, end: int) -> typing.Tuple[TSerializable, int]:
+    """
+    Parse the tnetstring starting at data[offset], which must end before
+    data[end]. Returns the parsed object and the offset after it.
+
+    This works on offsets rather than slicing off the remaining data, so that
+    the cost of parsing does not grow with the nesting depth of large strings.
+    """
+    #  Parse out the length prefix. Indexing yields ints for bytes,
+    #  memoryviews and mmaps alike.
+    length = 0
+    pos = offset
+    c = data[pos] if pos < end else 0
+    while 48 <= c <= 57:  # 0-9
+        length = length * 10 + c - 48
+        pos += 1
+        c = data[pos] if pos < end else 0
+    if c != 58 or pos == offset or pos - offset > 9:  # :
+        raise ValueError("not a tnetstring: missing or invalid length prefix")
+    start = pos + 1
+    stop = start + length
+    if stop >= end:
+        #  This fires if the data is shorter than the length prefix
+        #  says, meaning we don't need to further validate the length.
         raise ValueError("not a tnetstring: invalid length prefix: {}".format(length))
     # Parse the data based on the type tag.
-    return parse(data_type, data), remain
+    data_type = data[stop]
+    if data_type == 125:  # }
+        return _parse_dict(data, start, stop), stop + 1
+    if data_type == 93:  # ]
+        return _parse_list(data, start, stop), stop + 1
+    # Leaf values are copied out of the buffer. The typeshed stubs don't
+    # know yet that bytes() accepts a memoryview.
+    value: bytes = bytes(data[start:stop])  # type: ignore
+    if data_type == 44:  # ,
+        return value, stop + 1
+    if data_type == 59:  # ;
+        return value.decode("utf8"), stop + 1
+    return parse(data_type, value), stop + 1
+
+
+def _parse_list(data: TBuffer, start: int, stop: int) -> list:
+    l = []
+    while start < stop:
+        item, start = _parse(data, start, stop)
+        l.append(item)
+    return l
+
+
+def _parse_dict(data: TBuffer, start: int, stop: int) -> dict:
+    d = {}
+    while start < stop:
+        key, start = _parse(data, start, stop)
+        val, start = _parse(data, start, stop)
+        d[key] = val  # type: ignore
+    return d
 
 
 __all__ = ["dump", "dumps", "load", "loads", "pop"]
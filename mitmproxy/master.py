@@ -75,7 +75,7 @@ class Master:
             ServerThread(self.server).start()
 
     async def running(self):
-        self.addons.trigger("running")
+        await self.addons.trigger_event("running")
 
     def run_loop(self, loop):
         self.start()
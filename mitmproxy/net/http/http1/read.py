@@ -25,7 +25,9 @@ def get_header_tokens(headers, key):
 def read_request(rfile, body_size_limit=None):
     request = read_request_head(rfile)
     expected_body_size = expected_http_body_size(request)
-    request.data.content = b"".join(read_body(rfile, expected_body_size, limit=body_size_limit))
+    request.data.content = b"".join(
+        read_body(rfile, expected_body_size, limit=body_size_limit, max_chunk_size=None)
+    )
     request.timestamp_end = time.time()
     return request
 
@@ -64,7 +66,9 @@ def read_request_head(rfile):
 def read_response(rfile, request, body_size_limit=None):
     response = read_response_head(rfile)
     expected_body_size = expected_http_body_size(request, response)
-    response.data.content = b"".join(read_body(rfile, expected_body_size, body_size_limit))
+    response.data.content = b"".join(
+        read_body(rfile, expected_body_size, body_size_limit, max_chunk_size=None)
+    )
     response.timestamp_end = time.time()
     return response
 
@@ -107,7 +111,9 @@ def read_body(rfile, expected_size, limit=None, max_chunk_size=4096):
             rfile: The input stream
             expected_size: The expected body size (see :py:meth:`expected_body_size`)
             limit: Maximum body size
-            max_chunk_size: Maximium chunk size that gets yielded
+            max_chunk_size: Maximium chunk size that gets yielded. If None, the
+                body is read in one piece, which is the fastest way to read it
+                completely into memory.
 
         Returns:
             A generator that yields byte chunks of the content.
@@ -0,0 +1,101 @@
+import concurrent.futures
+import socket
+import threading
+import time
+import typing
+
+from mitmproxy.coretypes import lru
+
+TAddrInfo = typing.List[typing.Tuple[int, int, int, str, tuple]]
+# A lookup result, or the error it failed with.
+TResult = typing.Union[TAddrInfo, socket.gaierror]
+
+
+class Resolver:
+    """
+        A caching resolver for upstream connections.
+
+        Lookups run in the calling thread, so they are not queued behind each
+        other. Concurrent lookups for the same host are only done once, the
+        other callers wait for the result. Results are cached for ttl seconds,
+        failed lookups for negative_ttl seconds. Both default to 0, which
+        disables the respective cache. The system resolver does not tell us
+        the TTL of the DNS records, so these are fixed.
+
+        hosts maps host names to addresses that are used instead of looking
+        them up, like /etc/hosts does. Host names are matched
+        case-insensitively. At most CAP results are cached, least recently
+        used ones are evicted first.
+    """
+    CAP = 10000
+
+    def __init__(
+            self,
+            ttl: float = 0,
+            negative_ttl: float = 0,
+            hosts: typing.Optional[typing.Dict[str, str]] = None
+    ) -> None:
+        self.ttl = ttl
+        self.negative_ttl = negative_ttl
+        self.hosts = hosts or {}
+        self._cache: lru.LRUCache[tuple, typing.Tuple[float, TResult]] = lru.LRUCache()
+        self._inflight: typing.Dict[tuple, concurrent.futures.Future] = {}
+        self._lock = threading.Lock()
+
+    @property
+    def hosts(self) -> typing.Dict[str, str]:
+        return self._hosts
+
+    @hosts.setter
+    def hosts(self, hosts: typing.Dict[str, str]) -> None:
+        self._hosts = {k.lower(): v for k, v in hosts.items()}
+
+    def getaddrinfo(self, host, port, family=0, type=0, proto=0, flags=0) -> TAddrInfo:
+        """
+            Like socket.getaddrinfo.
+        """
+        host = self._hosts.get(host.lower(), host)
+        key = (host, port, family, type, proto, flags)
+        now = time.monotonic()
+        with self._lock:
+            cached = self._cache.get(key)
+            if cached and cached[0] > now:
+                return _unwrap(cached[1])
+            future = self._inflight.get(key)
+            owner = not future
+            if owner:
+                future = concurrent.futures.Future()
+                self._inflight[key] = future
+        if not owner:
+            return _unwrap(future.result())
+        try:
+            result: TResult = socket.getaddrinfo(*key)
+            ttl = self.ttl
+        except socket.gaierror as e:
+            result = e
+            ttl = self.negative_ttl
+        except BaseException as e:
+            with self._lock:
+                del self._inflight[key]
+            future.set_exception(e)
+            raise
+        with self._lock:
+            del self._inflight[key]
+            if ttl > 0:
+                self._cache.put(key, (now + ttl, result), self.CAP)
+        future.set_result(result)
+        return _unwrap(result)
+
+    def clear(self) -> None:
+        self._cache.clear()
+
+    def __len__(self):
+        return len(self._cache)
+
+
+def _unwrap(result: TResult) -> TAddrInfo:
+    if isinstance(result, socket.gaierror):
+        # Raise a fresh exception, as raising the same instance in every
+        # thread would pile up tracebacks on it.
+        raise socket.gaierror(*result.args)
+    return result
@@ -102,54 +102,141 @@ class Writer(_FileLike):
 
 
 class Reader(_FileLike):
+    # Number of bytes we peek at once when scanning for a line ending.
+    LINE_PEEKSIZE = 1024
+
+    def _recv(self, length, start, flags=0, block=True):
+        """
+            Receive up to length bytes from the underlying file object.
+            If flags are passed, they are handed to the socket's recv() call,
+            which requires a (pyOpenSSL) socket. If block is False, we do not
+            wait for a TLS record to be completed.
+
+            Returns:
+                The received bytes, or b"" if the connection has been closed.
+                None if the read should be retried.
+        """
+        try:
+            if not flags:
+                return self.o.read(length)
+            elif isinstance(self.o, SSL.Connection):
+                return self.o.recv(length, flags)
+            else:
+                return self.o._sock.recv(length, flags)
+        except SSL.ZeroReturnError:
+            # TLS connection was shut down cleanly
+            return b""
+        except (SSL.WantWriteError, SSL.WantReadError):
+            # From the OpenSSL docs:
+            # If the underlying BIO is non-blocking, SSL_read() will also return when the
+            # underlying BIO could not satisfy the needs of SSL_read() to continue the
+            # operation. In this case a call to SSL_get_error with the return value of
+            # SSL_read() will yield SSL_ERROR_WANT_READ or SSL_ERROR_WANT_WRITE.
+            if not block:
+                return None
+            if (time.time() - start) < self.o.gettimeout():
+                time.sleep(0.1)
+                return None
+            else:
+                raise exceptions.TcpTimeout()
+        except socket.timeout:
+            raise exceptions.TcpTimeout()
+        except socket.error as e:
+            raise exceptions.TcpDisconnect(str(e))
+        except SSL.SysCallError as e:
+            if e.args == (-1, 'Unexpected EOF'):
+                return b""
+            raise exceptions.TlsException(str(e))
+        except SSL.Error as e:
+            raise exceptions.TlsException(str(e))
 
     def read(self, length):
         """
             If length is -1, we read until connection closes.
         """
-        result = b''
+        # Collect the blocks and join them once, concatenating them one by one
+        # is quadratic for large reads.
+        parts = []
         start = time.time()
         while length == -1 or length > 0:
             if length == -1 or length > self.BLOCKSIZE:
                 rlen = self.BLOCKSIZE
             else:
                 rlen = length
-            try:
-                data = self.o.read(rlen)
-            except SSL.ZeroReturnError:
-                # TLS connection was shut down cleanly
-                break
-            except (SSL.WantWriteError, SSL.WantReadError):
-                # From the OpenSSL docs:
-                # If the underlying BIO is non-blocking, SSL_read() will also return when the
-                # underlying BIO could not satisfy the needs of SSL_read() to continue the
-                # operation. In this case a call to SSL_get_error with the return value of
-                # SSL_read() will yield SSL_ERROR_WANT_READ or SSL_ERROR_WANT_WRITE.
-                if (time.time() - start) < self.o.gettimeout():
-                    time.sleep(0.1)
-                    continue
-                else:
-                    raise exceptions.TcpTimeout()
-            except socket.timeout:
-                raise exceptions.TcpTimeout()
-            except socket.error as e:
-                raise exceptions.TcpDisconnect(str(e))
-            except SSL.SysCallError as e:
-                if e.args == (-1, 'Unexpected EOF'):
-                    break
-                raise exceptions.TlsException(str(e))
-            except SSL.Error as e:
-                raise exceptions.TlsException(str(e))
-            self.first_byte_timestamp = self.first_byte_timestamp or time.time()
+            data = self._recv(rlen, start)
+            if data is None:
+                continue
             if not data:
                 break
-            result += data
+            self.first_byte_timestamp = self.first_byte_timestamp or time.time()
+            parts.append(data)
             if length != -1:
                 length -= len(data)
+        result = b"".join(parts)
+        self.add_log(result)
+        return result
+
+    def read_available(self, length):
+        """
+            Read up to length bytes, but only block until some data is
+            available. On (pyOpenSSL) sockets, we keep reading as long as
+            more data is ready, so that everything that has arrived so far is
+            returned in one go.
+
+            Returns:
+                The data read, or b"" if the connection has been closed.
+        """
+        parts = []
+        start = time.time()
+        while length > 0:
+            data = self._recv(length, start, block=not parts)
+            if data is None:
+                if parts:
+                    break
+                continue
+            if not data:
+                break
+            self.first_byte_timestamp = self.first_byte_timestamp or time.time()
+            parts.append(data)
+            length -= len(data)
+            if not isinstance(self.o, (socket_fileobject, SSL.Connection)) or not ssl_read_select([self.o], 0):
+                break
+        result = b"".join(parts)
         self.add_log(result)
         return result
 
     def readline(self, size=None):
+        """
+            Read up to and including the next newline, but not more than size bytes.
+
+            On (pyOpenSSL) sockets, we peek at the pending data and scan it for
+            the line ending, so that a line costs two syscalls instead of one
+            per byte. Nothing beyond the line is consumed, which keeps
+            select()-based consumers of the underlying socket working.
+        """
+        if not isinstance(self.o, (socket_fileobject, SSL.Connection)):
+            return self._readline_bytewise(size)
+        parts = []
+        bytes_read = 0
+        start = time.time()
+        while size is None or bytes_read < size:
+            peeksize = self.LINE_PEEKSIZE
+            if size is not None:
+                peeksize = min(peeksize, size - bytes_read)
+            data = self._recv(peeksize, start, socket.MSG_PEEK)
+            if data is None:
+                continue
+            if not data:
+                break
+            end = data.find(b"\n") + 1 or len(data)
+            chunk = self.read(end)
+            parts.append(chunk)
+            bytes_read += len(chunk)
+            if len(chunk) < end or chunk.endswith(b"\n"):
+                break
+        return b"".join(parts)
+
+    def _readline_bytewise(self, size=None):
         result = b''
         bytes_read = 0
         while True:
@@ -364,6 +451,8 @@ class TCPClient(_Connection):
         self.server_certs = []
         self.sni = None
         self.spoof_source_address = spoof_source_address
+        # A resolver.Resolver for the server address. Defaults to socket.getaddrinfo.
+        self.resolver = None
 
     @property
     def ssl_verification_error(self) -> Optional[exceptions.InvalidCertificateException]:
@@ -379,17 +468,36 @@ class TCPClient(_Connection):
             else:
                 close_socket(self.connection)
 
-    def convert_to_tls(self, sni=None, alpn_protos=None, **sslctx_kwargs):
-        context = tls.create_client_context(
+    def convert_to_tls(self, sni=None, alpn_protos=None, context_cache=None, session_cache=None, **sslctx_kwargs):
+        """
+        Convert connection to SSL.
+        For a list of parameters, see tls.create_client_context(...)
+
+        context_cache: A tls.ContextCache to take the context from.
+        session_cache: A tls.SessionCache to resume previous sessions from.
+        """
+        if context_cache is not None:
+            create_context = context_cache.client_context
+        else:
+            create_context = tls.create_client_context
+        context = create_context(
             alpn_protos=alpn_protos,
             sni=sni,
             **sslctx_kwargs
         )
         self.connection = SSL.Connection(context, self.connection)
+        if context_cache is not None:
+            self.connection.sni = sni
+            self.connection.address = self.address
         if sni:
             self.sni = sni
             self.connection.set_tlsext_host_name(sni.encode("idna"))
         self.connection.set_connect_state()
+        if session_cache is not None:
+            session_key = session_cache.key(self.address, sni, alpn_protos, **sslctx_kwargs)
+            session = session_cache.get(session_key)
+            if session is not None:
+                self.connection.set_session(session)
         try:
             self.connection.do_handshake()
         except SSL.Error as v:
@@ -397,11 +505,15 @@ class TCPClient(_Connection):
                 raise self.ssl_verification_error
             else:
                 raise exceptions.TlsException("SSL handshake error: %s" % repr(v))
+        if session_cache is not None:
+            # If verification was required, the handshake has failed already.
+            session_cache.put(session_key, self.connection.get_session())
+            session_cache.record_session(self.connection)
 
         self.cert = certs.Cert(self.connection.get_peer_certificate())
 
         # Keep all server certificates in a list
-        for i in self.connection.get_peer_cert_chain():
+        for i in self.connection.get_peer_cert_chain() or []:
             self.server_certs.append(certs.Cert(i))
 
         self.tls_established = True
@@ -416,8 +528,12 @@ class TCPClient(_Connection):
         # Based on the official socket.create_connection implementation of Python 3.6.
         # https://github.com/python/cpython/blob/3cc5817cfaf5663645f4ee447eaed603d2ad290a/Lib/socket.py
 
+        if self.resolver:
+            getaddrinfo = self.resolver.getaddrinfo
+        else:
+            getaddrinfo = socket.getaddrinfo
         err = None
-        for res in socket.getaddrinfo(self.address[0], self.address[1], 0, socket.SOCK_STREAM):
+        for res in getaddrinfo(self.address[0], self.address[1], 0, socket.SOCK_STREAM):
             af, socktype, proto, canonname, sa = res
             sock = None
             try:
@@ -489,22 +605,31 @@ class BaseHandler(_Connection):
         self.server = server
         self.clientcert = None
 
-    def convert_to_tls(self, cert, key, **sslctx_kwargs):
+    def convert_to_tls(self, cert, key, context_cache=None, **sslctx_kwargs):
         """
         Convert connection to SSL.
         For a list of parameters, see tls.create_server_context(...)
-        """
 
-        context = tls.create_server_context(
+        context_cache: A tls.ContextCache to take the context from.
+        """
+        if context_cache is not None:
+            create_context = context_cache.server_context
+        else:
+            create_context = tls.create_server_context
+        context = create_context(
             cert=cert,
             key=key,
             **sslctx_kwargs)
         self.connection = SSL.Connection(context, self.connection)
+        if context_cache is not None:
+            self.connection.alpn_select_callback = sslctx_kwargs.get("alpn_select_callback")
         self.connection.set_accept_state()
         try:
             self.connection.do_handshake()
         except SSL.Error as v:
             raise exceptions.TlsException("SSL handshake error: %s" % repr(v))
+        if context_cache is not None:
+            context_cache.record_session(self.connection)
         self.tls_established = True
         cert = self.connection.get_peer_certificate()
         if cert:
@@ -545,6 +670,8 @@ class Counter:
 
 
 class TCPServer:
+    # How long to stop accepting connections if we run out of file descriptors.
+    accept_backoff = 0.1
 
     def __init__(self, address):
         self.address = address
@@ -604,7 +731,16 @@ class TCPServer:
             while not self.__shutdown_request:
                 r, w_, e_ = select.select([self.socket], [], [], poll_interval)
                 if self.socket in r:
-                    connection, client_address = self.socket.accept()
+                    try:
+                        connection, client_address = self.socket.accept()
+                    except OSError as e:
+                        if e.errno not in (errno.EMFILE, errno.ENFILE):
+                            raise
+                        # The connection stays in the backlog, so the socket
+                        # remains readable. Pause instead of retrying in a
+                        # busy loop.
+                        time.sleep(self.accept_backoff)
+                        continue
                     t = basethread.BaseThread(
                         "TCPConnectionHandler (%s: %s:%s -> %s:%s)" % (
                             self.__class__.__name__,
@@ -6,15 +6,17 @@ import io
 import os
 import struct
 import threading
+import time
 import typing
 from ssl import match_hostname, CertificateError
 
 import certifi
-from OpenSSL import SSL
+from OpenSSL import SSL, crypto
 from kaitaistruct import KaitaiStream
 
 import mitmproxy.options  # noqa
 from mitmproxy import exceptions, certs
+from mitmproxy.coretypes import lru
 from mitmproxy.contrib.kaitaistruct import tls_client_hello
 from mitmproxy.net import check
 
@@ -229,6 +231,21 @@ def create_client_context(
 
     if sni is None and verify != SSL.VERIFY_NONE:
         raise exceptions.TlsException("Cannot validate certificate hostname without SNI")
+    return _create_client_context(cert, sni, address, verify, **sslctx_kwargs)
+
+
+def _create_client_context(
+        cert: str = None,
+        default_sni: str = None,
+        default_address: str = None,
+        verify: int = SSL.VERIFY_NONE,
+        **sslctx_kwargs
+) -> SSL.Context:
+    """
+        Like create_client_context, but without the SNI check. Connections
+        that have sni and address attributes are verified against these
+        instead of default_sni and default_address.
+    """
 
     def verify_callback(
             conn: SSL.Connection,
@@ -237,6 +254,10 @@ def create_client_context(
             depth: int,
             is_cert_verified: bool
     ) -> bool:
+        # Connections that share a cached context carry their own sni and
+        # address, see ContextCache.client_context.
+        sni = getattr(conn, "sni", default_sni)
+        address = getattr(conn, "address", default_address)
         if is_cert_verified and depth == 0:
             # Verify hostname of leaf certificate.
             cert = certs.Cert(x509)
@@ -366,6 +387,180 @@ def create_server_context(
     return context
 
 
+def _alpn_select_dispatch(conn, options):
+    return conn.alpn_select_callback(conn, options)
+
+
+# pyOpenSSL has no public API for session timeouts and resumption, so we use
+# its OpenSSL bindings if they are available.
+_lib = getattr(SSL, "_lib", None)
+
+
+def _context_key(kwargs: dict) -> tuple:
+    key = []
+    for k, v in sorted(kwargs.items()):
+        if isinstance(v, certs.Cert):
+            v = v.digest("sha256")
+        elif isinstance(v, crypto.PKey):
+            # Keys loaded repeatedly are distinct objects.
+            v = crypto.dump_publickey(crypto.FILETYPE_ASN1, v)
+        elif isinstance(v, (list, tuple)):
+            v = tuple(
+                x.digest("sha256") if isinstance(x, certs.Cert) else x
+                for x in v
+            )
+        key.append((k, v))
+    return tuple(key)
+
+
+def session_reused(conn: SSL.Connection) -> bool:
+    """
+        True, if the handshake of conn resumed a previous session.
+        Always False if pyOpenSSL doesn't let us check.
+    """
+    reused = getattr(_lib, "SSL_session_reused", None)
+    if reused is None:
+        return False
+    return bool(reused(conn._ssl))
+
+
+class _SessionStats:
+    """
+        Counts in session_hits and session_misses whether handshakes resumed
+        a previous session.
+    """
+
+    def __init__(self) -> None:
+        self.session_hits = 0
+        self.session_misses = 0
+        self._stats_lock = threading.Lock()
+
+    def record_session(self, conn: SSL.Connection) -> None:
+        """
+            Count whether the handshake of conn resumed a previous session.
+        """
+        with self._stats_lock:
+            if session_reused(conn):
+                self.session_hits += 1
+            else:
+                self.session_misses += 1
+
+
+class ContextCache(_SessionStats):
+    """
+        A cache for SSL contexts. Creating a context loads cipher lists,
+        trusted CA certificates and certificate chains, which is too expensive
+        to do for every connection.
+
+        Contexts are keyed by the arguments they were created with, so the
+        cache must be cleared when the files they refer to change. At most
+        CAP contexts are kept, least recently used ones are evicted first.
+
+        Client-facing contexts are created for a single certificate and keep
+        OpenSSL's server-side session cache and session tickets enabled, so
+        that reconnecting clients can resume their session. Contexts are
+        replaced after LIFETIME seconds, which also rotates the session
+        ticket keys. Resumptions are counted in session_hits and
+        session_misses.
+    """
+    CAP = 1000
+    LIFETIME = 3600
+
+    def __init__(self) -> None:
+        super().__init__()
+        self._contexts: lru.LRUCache[tuple, typing.Tuple[SSL.Context, float]] = lru.LRUCache()
+
+    def _get(self, key: tuple, create: typing.Callable[[], SSL.Context]) -> SSL.Context:
+        now = time.monotonic()
+        entry = self._contexts.get(key)
+        if entry is not None and now - entry[1] < self.LIFETIME:
+            return entry[0]
+        context = create()
+        self._contexts.put(key, (context, now), self.CAP)
+        return context
+
+    def client_context(self, **kwargs) -> SSL.Context:
+        """
+            Like create_client_context, but returns a cached context if
+            possible. Contexts are shared between servers, so sni and address
+            are not part of the cache key: callers must set them as sni and
+            address attributes on every connection that uses the context.
+        """
+        sni = kwargs.pop("sni", None)
+        kwargs.pop("address", None)
+        if sni is None and kwargs.get("verify", SSL.VERIFY_NONE) != SSL.VERIFY_NONE:
+            raise exceptions.TlsException("Cannot validate certificate hostname without SNI")
+        return self._get(
+            ("client",) + _context_key(kwargs),
+            lambda: _create_client_context(**kwargs)
+        )
+
+    def server_context(self, **kwargs) -> SSL.Context:
+        """
+            Like create_server_context, but returns a cached context if
+            possible. The alpn_select_callback is not part of the cache key:
+            callers must set it as alpn_select_callback attribute on every
+            connection that uses the context.
+        """
+        alpn_select_callback = kwargs.pop("alpn_select_callback", None)
+        key = ("server", alpn_select_callback is not None) + _context_key(kwargs)
+        if alpn_select_callback is not None:
+            kwargs["alpn_select_callback"] = _alpn_select_dispatch
+
+        def create():
+            context = create_server_context(**kwargs)
+            # Required for resumption if we request client certificates.
+            context.set_session_id(b"mitmproxy")
+            set_timeout = getattr(_lib, "SSL_CTX_set_timeout", None)
+            if set_timeout is not None:
+                set_timeout(context._context, self.LIFETIME)
+            return context
+
+        return self._get(key, create)
+
+    def clear(self) -> None:
+        self._contexts.clear()
+
+    def __len__(self):
+        return len(self._contexts)
+
+
+class SessionCache(_SessionStats):
+    """
+        A cache for client-side TLS sessions, so that reconnects to the same
+        server can resume the previous session instead of doing a full
+        handshake. At most CAP sessions are kept, least recently used ones
+        are evicted first. Resumptions are counted in session_hits and
+        session_misses.
+
+        Resumed sessions skip certificate verification. Sessions are
+        therefore keyed by the context arguments as well, so that a session
+        established without verification is never offered when verification
+        is required.
+    """
+    CAP = 1000
+
+    def __init__(self) -> None:
+        super().__init__()
+        self._sessions: lru.LRUCache[tuple, SSL.Session] = lru.LRUCache()
+
+    @staticmethod
+    def key(address, sni, alpn_protos, **sslctx_kwargs) -> tuple:
+        return (tuple(address), sni, tuple(alpn_protos or ())) + _context_key(sslctx_kwargs)
+
+    def get(self, key: tuple) -> typing.Optional[SSL.Session]:
+        return self._sessions.get(key)
+
+    def put(self, key: tuple, session: SSL.Session) -> None:
+        self._sessions.put(key, session, self.CAP)
+
+    def clear(self) -> None:
+        self._sessions.clear()
+
+    def __len__(self):
+        return len(self._sessions)
+
+
 def is_tls_record_magic(d):
     """
     Returns:
@@ -384,6 +579,10 @@ def is_tls_record_magic(d):
     )
 
 
+# Enough to peek at a ClientHello that fits into a single TLS record at once.
+CLIENT_HELLO_PEEKSIZE = 5 + 2 ** 14
+
+
 def get_client_hello(rfile):
     """
     Peek into the socket and read all records that contain the initial client hello message.
@@ -394,28 +593,40 @@ def get_client_hello(rfile):
     Returns:
         The raw handshake packet bytes, without TLS record header(s).
     """
-    client_hello = b""
-    client_hello_size = 1
+    # Usually, the whole ClientHello is available with the first peek.
+    # We only peek again if a record extends beyond the data we have.
+    data = rfile.peek(CLIENT_HELLO_PEEKSIZE)
+    records = []
+    client_hello_len = 0
+    client_hello_size = None
     offset = 0
-    while len(client_hello) < client_hello_size:
-        record_header = rfile.peek(offset + 5)[offset:]
+    while client_hello_size is None or client_hello_len < client_hello_size:
+        if len(data) < offset + 5:
+            data = rfile.peek(offset + 5)
+        record_header = data[offset:offset + 5]
         if not is_tls_record_magic(record_header) or len(record_header) < 5:
             raise exceptions.TlsProtocolException(
                 'Expected TLS record, got "%s" instead.' % record_header)
         record_size = struct.unpack_from("!H", record_header, 3)[0] + 5
-        record_body = rfile.peek(offset + record_size)[offset + 5:]
+        if len(data) < offset + record_size:
+            data = rfile.peek(offset + record_size)
+        record_body = data[offset + 5:offset + record_size]
         if len(record_body) != record_size - 5:
             raise exceptions.TlsProtocolException(
                 "Unexpected EOF in TLS handshake: %s" % record_body)
-        client_hello += record_body
+        records.append(record_body)
+        client_hello_len += len(record_body)
         offset += record_size
-        client_hello_size = struct.unpack("!I", b'\x00' + client_hello[1:4])[0] + 4
-    return client_hello
+        if client_hello_size is None and client_hello_len >= 4:
+            header = b"".join(records)[:4]
+            client_hello_size = struct.unpack("!I", b'\x00' + header[1:4])[0] + 4
+    return b"".join(records)
 
 
 class ClientHello:
 
     def __init__(self, raw_client_hello):
+        self.raw = raw_client_hello
         self._client_hello = tls_client_hello.TlsClientHello(
             KaitaiStream(io.BytesIO(raw_client_hello))
         )
@@ -1,5 +1,6 @@
 from typing import Optional, Sequence
 
+from mitmproxy import certs
 from mitmproxy import optmanager
 from mitmproxy.net import tls
 
@@ -44,6 +45,34 @@ class Options(optmanager.OptManager):
             certificate as the first entry.
             """
         )
+        self.add_option(
+            "cert_cache_size", int, 100,
+            "Maximum number of generated certificates kept in memory."
+        )
+        self.add_option(
+            "cert_disk_cache", bool, False,
+            """
+            Store generated certificates in the configuration directory, so
+            that they do not have to be generated again after a restart.
+            """
+        )
+        self.add_option(
+            "cert_key_type", str, "rsa",
+            """
+            Key type for generated certificates. ECDSA keys make TLS
+            handshakes with clients considerably cheaper. A new certificate
+            authority is created with this key type as well, an existing one
+            is kept.
+            """,
+            choices=list(certs.KEY_TYPES)
+        )
+        self.add_option(
+            "cert_workers", int, 0,
+            """
+            Number of worker processes used to generate certificates. By
+            default, certificates are generated in the connection thread.
+            """
+        )
         self.add_option(
             "ciphers_client", Optional[str], None,
             "Set supported ciphers for client connections using OpenSSL syntax."
@@ -78,6 +107,41 @@ class Options(optmanager.OptManager):
             "upstream_bind_address", str, "",
             "Address to bind upstream requests to."
         )
+        self.add_option(
+            "dns_cache_ttl", int, 0,
+            """
+            Cache successful DNS lookups for upstream connections for this
+            many seconds. 0 disables the cache. Lookups are done by the thread
+            of the connection that needs them; concurrent lookups for the
+            same host are only done once.
+            """
+        )
+        self.add_option(
+            "dns_negative_ttl", int, 0,
+            """
+            Cache failed DNS lookups for upstream connections for this many
+            seconds. 0 disables the negative cache.
+            """
+        )
+        self.add_option(
+            "dns_hosts", Sequence[str], [],
+            """
+            Resolve host names to fixed addresses for upstream connections,
+            in the form of "host=address". May be passed multiple times.
+            """
+        )
+        self.add_option(
+            "upstream_pool_max_idle", int, 0,
+            """
+            Maximum number of idle upstream HTTP/1 connections kept per server
+            after their client has disconnected, so that later clients can
+            reuse them. 0 disables the connection pool.
+            """
+        )
+        self.add_option(
+            "upstream_pool_ttl", int, 30,
+            "Close pooled upstream connections after they have been idle for this many seconds."
+        )
         self.add_option(
             "mode", str, "regular",
             """
@@ -108,6 +172,22 @@ class Options(optmanager.OptManager):
             "Enable/disable WebSocket support. "
             "WebSocket support is enabled by default.",
         )
+        self.add_option(
+            "websocket_max_messages", int, 0,
+            """
+            Maximum number of messages kept per WebSocket flow. Once
+            exceeded, the oldest messages are discarded. 0 means unlimited.
+            """
+        )
+        self.add_option(
+            "websocket_max_size", Optional[str], None,
+            """
+            Maximum total size of the messages kept per WebSocket flow. Once
+            exceeded, the oldest messages are discarded. In streaming mode,
+            larger messages are forwarded but not captured. Understands k/m/g
+            suffixes, i.e. 3m for 3 megabytes.
+            """
+        )
         self.add_option(
             "rawtcp", bool, False,
             "Enable/disable experimental raw TCP support. TCP connections starting with non-ascii "
@@ -1,3 +1,4 @@
+import concurrent.futures
 import os
 import re
 import typing
@@ -7,25 +8,84 @@ from OpenSSL import crypto
 from mitmproxy import exceptions
 from mitmproxy import options as moptions
 from mitmproxy import certs
+from mitmproxy.coretypes import lru
+from mitmproxy.net import resolver
 from mitmproxy.net import server_spec
+from mitmproxy.net import tls as net_tls
+from mitmproxy.proxy import pool
 
 CONF_BASENAME = "mitmproxy"
 
+# Options that require the certstore to be reloaded.
+CERTSTORE_OPTIONS = {"confdir", "certs", "cert_key_type"}
+# Options that affect how TLS is negotiated with clients and servers.
+TLS_OPTIONS = CERTSTORE_OPTIONS | {
+    "add_upstream_certs_to_client_chain",
+    "ciphers_client",
+    "ciphers_server",
+    "client_certs",
+    "ssl_insecure",
+    "ssl_verify_upstream_trusted_ca",
+    "ssl_verify_upstream_trusted_confdir",
+    "ssl_version_client",
+    "ssl_version_server",
+    "upstream_cert",
+}
+# Options that affect how upstream connections are established.
+CONNECTION_OPTIONS = TLS_OPTIONS | {
+    "dns_hosts",
+    "http2",
+    "mode",
+    "spoof_source_address",
+    "upstream_bind_address",
+    "upstream_pool_max_idle",
+    "upstream_pool_ttl",
+}
+
 
 class HostMatcher:
+    """
+        Matches "host:port" strings against a list of regular expressions.
+
+        The patterns are compiled into a single alternation, so that a lookup
+        takes one regex search regardless of the number of patterns. Patterns
+        that use groups or global inline flags cannot be combined without
+        changing their meaning and are checked separately. The most recent
+        CAP decisions are cached.
+    """
+    CAP = 10000
+    # Global inline flags such as (?x). Outside of the start of a pattern,
+    # Python < 3.11 applies them to the whole regex with only a warning.
+    INLINE_FLAGS = re.compile(r"\(\?[aiLmsux]+\)")
+
+    @classmethod
+    def _combinable(cls, rex) -> bool:
+        return not rex.groups and not cls.INLINE_FLAGS.search(rex.pattern)
 
     def __init__(self, patterns=tuple()):
         self.patterns = list(patterns)
         self.regexes = [re.compile(p, re.IGNORECASE) for p in self.patterns]
+        self._combined = None
+        self._separate = [rex for rex in self.regexes if not self._combinable(rex)]
+        simple = [rex.pattern for rex in self.regexes if self._combinable(rex)]
+        if simple:
+            self._combined = re.compile(
+                "|".join("(?:%s)" % p for p in simple), re.IGNORECASE
+            )
+        self._cache: lru.LRUCache[str, bool] = lru.LRUCache()
 
     def __call__(self, address):
         if not address:
             return False
         host = "%s:%s" % address
-        if any(rex.search(host) for rex in self.regexes):
-            return True
-        else:
-            return False
+        match = self._cache.get(host)
+        if match is None:
+            match = bool(
+                (self._combined and self._combined.search(host)) or
+                any(rex.search(host) for rex in self._separate)
+            )
+            self._cache.put(host, match, self.CAP)
+        return match
 
     def __bool__(self):
         return bool(self.patterns)
@@ -39,43 +99,123 @@ class ProxyConfig:
         self.check_ignore: HostMatcher = None
         self.check_tcp: HostMatcher = None
         self.certstore: certs.CertStore = None
+        self.cert_executor: typing.Optional[concurrent.futures.Executor] = None
         self.upstream_server: typing.Optional[server_spec.ServerSpec] = None
+        self.tls_contexts = net_tls.ContextCache()
+        self.tls_sessions = net_tls.SessionCache()
+        self.connection_pool = pool.ConnectionPool()
+        self.resolver = resolver.Resolver()
         self.configure(options, set(options.keys()))
         options.changed.connect(self.configure)
 
     def configure(self, options: moptions.Options, updated: typing.Any) -> None:
+        if updated & TLS_OPTIONS:
+            # Cached contexts and sessions may refer to an outdated certstore
+            # or option values.
+            self.tls_contexts.clear()
+            self.tls_sessions.clear()
+        if updated & CONNECTION_OPTIONS:
+            # Pooled connections may have been established with outdated
+            # settings.
+            self.connection_pool.clear()
+        if options.upstream_pool_max_idle < 0:
+            raise exceptions.OptionsError(
+                "Invalid number of pooled connections: %s" % options.upstream_pool_max_idle
+            )
+        if options.upstream_pool_ttl < 0:
+            raise exceptions.OptionsError(
+                "Invalid pooled connection lifetime: %s" % options.upstream_pool_ttl
+            )
+        self.connection_pool.max_idle = options.upstream_pool_max_idle
+        self.connection_pool.ttl = options.upstream_pool_ttl
+
+        if "dns_hosts" in updated:
+            hosts = {}
+            for h in options.dns_hosts:
+                parts = h.split("=", 1)
+                if len(parts) != 2 or not parts[0] or not parts[1]:
+                    raise exceptions.OptionsError(
+                        "Invalid DNS host specification: %s" % h
+                    )
+                hosts[parts[0]] = parts[1]
+            self.resolver.hosts = hosts
+            self.resolver.clear()
+        if options.dns_cache_ttl < 0 or options.dns_negative_ttl < 0:
+            raise exceptions.OptionsError(
+                "Invalid DNS cache lifetime: %s, %s" % (
+                    options.dns_cache_ttl, options.dns_negative_ttl
+                )
+            )
+        self.resolver.ttl = options.dns_cache_ttl
+        self.resolver.negative_ttl = options.dns_negative_ttl
+
         if "ignore_hosts" in updated:
             self.check_ignore = HostMatcher(options.ignore_hosts)
         if "tcp_hosts" in updated:
             self.check_tcp = HostMatcher(options.tcp_hosts)
 
-        certstore_path = os.path.expanduser(options.confdir)
-        if not os.path.exists(os.path.dirname(certstore_path)):
+        if options.cert_cache_size < 0:
             raise exceptions.OptionsError(
-                "Certificate Authority parent directory does not exist: %s" %
-                os.path.dirname(certstore_path)
+                "Invalid certificate cache size: %s" % options.cert_cache_size
             )
-        self.certstore = certs.CertStore.from_store(
-            certstore_path,
-            CONF_BASENAME
-        )
-
-        for c in options.certs:
-            parts = c.split("=", 1)
-            if len(parts) == 1:
-                parts = ["*", parts[0]]
-
-            cert = os.path.expanduser(parts[1])
-            if not os.path.exists(cert):
+
+        if "cert_workers" in updated:
+            if options.cert_workers < 0:
                 raise exceptions.OptionsError(
-                    "Certificate file does not exist: %s" % cert
+                    "Invalid number of certificate workers: %s" % options.cert_workers
                 )
-            try:
-                self.certstore.add_cert_file(parts[0], cert)
-            except crypto.Error:
+            old_executor = self.cert_executor
+            self.cert_executor = None
+            if options.cert_workers:
+                self.cert_executor = concurrent.futures.ProcessPoolExecutor(options.cert_workers)
+            if self.certstore:
+                self.certstore.executor = self.cert_executor
+            if old_executor:
+                # Certificates that are being signed right now still finish,
+                # but we don't wait for them.
+                old_executor.shutdown(wait=False)
+
+        certstore_path = os.path.expanduser(options.confdir)
+        if updated & CERTSTORE_OPTIONS:
+            if not os.path.exists(os.path.dirname(certstore_path)):
                 raise exceptions.OptionsError(
-                    "Invalid certificate format: %s" % cert
+                    "Certificate Authority parent directory does not exist: %s" %
+                    os.path.dirname(certstore_path)
                 )
+            certstore = certs.CertStore.from_store(
+                certstore_path,
+                CONF_BASENAME,
+                key_type=options.cert_key_type
+            )
+            for c in options.certs:
+                parts = c.split("=", 1)
+                if len(parts) == 1:
+                    parts = ["*", parts[0]]
+
+                cert = os.path.expanduser(parts[1])
+                if not os.path.exists(cert):
+                    raise exceptions.OptionsError(
+                        "Certificate file does not exist: %s" % cert
+                    )
+                try:
+                    certstore.add_cert_file(parts[0], cert)
+                except crypto.Error:
+                    raise exceptions.OptionsError(
+                        "Invalid certificate format: %s" % cert
+                    )
+            certstore.STORE_CAP = options.cert_cache_size
+            # Generated certificates stay valid as long as the CA and
+            # leaf key do not change.
+            if self.certstore:
+                certstore.take_generated(self.certstore)
+            self.certstore = certstore
+
+        self.certstore.cache_dir = None
+        if options.cert_disk_cache:
+            self.certstore.cache_dir = os.path.join(certstore_path, CONF_BASENAME + "-certs")
+        self.certstore.executor = self.cert_executor
+        self.certstore.STORE_CAP = options.cert_cache_size
+
         m = options.mode
         if m.startswith("upstream:") or m.startswith("reverse:"):
             _, spec = server_spec.parse_with_mode(options.mode)
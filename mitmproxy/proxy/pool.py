@@ -0,0 +1,161 @@
+import collections
+import threading
+import time
+import typing
+
+from mitmproxy import connections
+from mitmproxy import exceptions
+from mitmproxy.coretypes import basethread
+from mitmproxy.net import tcp
+
+TPoolKey = typing.Tuple[tuple, bool, typing.Optional[str], bytes]
+
+
+class ReaperThread(basethread.BaseThread):
+    daemon = True
+
+    def __init__(self, pool: "ConnectionPool") -> None:
+        self.pool = pool
+        super().__init__("ConnectionPool reaper")
+
+    def run(self):
+        self.pool._reap()
+
+
+class ConnectionPool:
+    """
+        A pool of idle upstream HTTP/1 connections, which can be picked up
+        again by later client connections to the same server.
+
+        Connections are keyed by (address, tls, sni, alpn). For upstream
+        proxies, the address is the address of the proxy. At most max_idle
+        connections are kept per key, and connections that have been idle
+        for more than ttl seconds are closed. A max_idle of 0 disables the
+        pool.
+
+        While the pool holds connections, a reaper thread closes them as they
+        expire, so that they don't stay open until the pool is used again.
+    """
+
+    def __init__(self, max_idle: int = 0, ttl: float = 30) -> None:
+        self.max_idle = max_idle
+        self.ttl = ttl
+        self._idle: typing.Dict[
+            TPoolKey,
+            typing.Deque[typing.Tuple[connections.ServerConnection, float]]
+        ] = collections.defaultdict(collections.deque)
+        self._lock = threading.Lock()
+        self._reaper: typing.Optional[ReaperThread] = None
+
+    @staticmethod
+    def key(address, tls: bool, sni: typing.Optional[str], alpn: typing.Optional[bytes]) -> TPoolKey:
+        return (tuple(address), tls, sni if tls else None, alpn or b"")
+
+    def put(self, conn: connections.ServerConnection) -> bool:
+        """
+            Add an idle connection to the pool.
+
+            Returns:
+                False, if the connection cannot be reused. The caller is
+                responsible for closing it then.
+        """
+        if not self.max_idle or not conn.reusable or conn.spoof_source_address:
+            return False
+        alpn = conn.get_alpn_proto_negotiated()
+        if alpn == b"h2":
+            return False
+        conn.reusable = False
+        key = self.key(conn.address, conn.tls_established, conn.sni, alpn)
+        with self._lock:
+            self._idle[key].append((conn, time.monotonic()))
+            closed = self._expire()
+            if self._idle and not self._reaper:
+                self._reaper = ReaperThread(self)
+                self._reaper.start()
+        for c in closed:
+            self._close(c)
+        return True
+
+    def get(self, key: TPoolKey) -> typing.Optional[connections.ServerConnection]:
+        """
+            Take an idle connection for key out of the pool, most recently
+            used first. Connections that have been closed by the server in
+            the meantime are discarded.
+        """
+        while True:
+            with self._lock:
+                closed = self._expire()
+                idle = self._idle.get(key)
+                conn = None
+                if idle:
+                    conn, _ = idle.pop()
+                    if not idle:
+                        del self._idle[key]
+            for c in closed:
+                self._close(c)
+            if conn is None:
+                return None
+            if self._alive(conn):
+                return conn
+            self._close(conn)
+
+    def _expire(self) -> typing.List[connections.ServerConnection]:
+        """
+            Remove expired and surplus connections. Must be called with the
+            lock held, the returned connections must be closed afterwards.
+        """
+        now = time.monotonic()
+        closed = []
+        for key, idle in list(self._idle.items()):
+            while idle and (len(idle) > self.max_idle or now - idle[0][1] > self.ttl):
+                closed.append(idle.popleft()[0])
+            if not idle:
+                del self._idle[key]
+        return closed
+
+    def _reap(self) -> None:
+        """
+            Close connections as they expire, until the pool is empty.
+        """
+        while True:
+            with self._lock:
+                closed = self._expire()
+                done = not self._idle
+                if done:
+                    self._reaper = None
+                else:
+                    oldest = min(idle[0][1] for idle in self._idle.values())
+                    wait = oldest + self.ttl - time.monotonic()
+            for c in closed:
+                self._close(c)
+            if done:
+                return
+            # Connections expire once they are idle for *more* than ttl.
+            time.sleep(max(wait, 0) + 0.01)
+
+    @staticmethod
+    def _alive(conn: connections.ServerConnection) -> bool:
+        # An idle HTTP/1 connection becomes readable if the server closes it
+        # (or sends garbage), in both cases we cannot use it anymore.
+        try:
+            return not tcp.ssl_read_select([conn.connection], 0)
+        except (OSError, ValueError):
+            return False
+
+    @staticmethod
+    def _close(conn: connections.ServerConnection) -> None:
+        try:
+            conn.finish()
+        except exceptions.TcpException:
+            pass
+        conn.close()
+
+    def clear(self) -> None:
+        with self._lock:
+            idle = [c for conns in self._idle.values() for c, _ in conns]
+            self._idle.clear()
+        for c in idle:
+            self._close(c)
+
+    def __len__(self):
+        return sum(len(conns) for conns in self._idle.values())
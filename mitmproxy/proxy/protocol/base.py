@@ -2,6 +2,7 @@ from mitmproxy import exceptions
 from mitmproxy import connections
 from mitmproxy import controller  # noqa
 from mitmproxy.proxy import config  # noqa
+from mitmproxy.proxy import pool
 
 
 class _LayerCodeCompletion:
@@ -119,13 +120,15 @@ class ServerConnectionMixin:
 
     def __make_server_conn(self, server_address):
         if self.config.options.spoof_source_address and self.config.options.upstream_bind_address == '':
-            return connections.ServerConnection(
+            conn = connections.ServerConnection(
                 server_address, (self.ctx.client_conn.address[0], 0), True)
         else:
-            return connections.ServerConnection(
+            conn = connections.ServerConnection(
                 server_address, (self.config.options.upstream_bind_address, 0),
                 self.config.options.spoof_source_address
             )
+        conn.resolver = self.config.resolver
+        return conn
 
     def set_server(self, address):
         """
@@ -141,15 +144,35 @@ class ServerConnectionMixin:
         """
         Deletes (and closes) an existing server connection.
         Must not be called if there is no existing connection.
+        Reusable connections are handed to the connection pool instead.
         """
-        self.log("serverdisconnect", "debug", [repr(self.server_conn.address)])
         address = self.server_conn.address
-        self.server_conn.finish()
-        self.server_conn.close()
-        self.channel.tell("serverdisconnect", self.server_conn)
+        if self.config.connection_pool.put(self.server_conn):
+            self.log("Keeping server connection for reuse", "debug", [repr(address)])
+        else:
+            self.log("serverdisconnect", "debug", [repr(address)])
+            self.server_conn.finish()
+            self.server_conn.close()
+            self.channel.tell("serverdisconnect", self.server_conn)
 
         self.server_conn = self.__make_server_conn(address)
 
+    def reuse_server_conn(self, tls, sni, alpn):
+        """
+        Takes an idle connection to the current server address out of the connection pool.
+        Must not be called if there is an existing connection.
+
+        Returns:
+            True, if a pooled connection is used now.
+        """
+        key = pool.ConnectionPool.key(self.server_conn.address, tls, sni, alpn)
+        conn = self.config.connection_pool.get(key)
+        if conn is None:
+            return False
+        self.log("Reusing server connection", "debug", [repr(conn.address)])
+        self.server_conn = conn
+        return True
+
     def connect(self):
         """
         Establishes a server connection.
@@ -326,12 +326,14 @@ class HttpLayer(base.Layer):
                 # allow inline scripts to manipulate the client handshake
                 self.channel.ask("websocket_handshake", f)
 
+            server_exchange = False
             if not f.response:
                 self.establish_server_connection(
                     f.request.host,
                     f.request.port,
                     f.request.scheme
                 )
+                self.server_conn.reusable = False
 
                 def get_response():
                     self.send_request_headers(f.request)
@@ -396,6 +398,7 @@ class HttpLayer(base.Layer):
                 # no further manipulation of self.server_conn beyond this point
                 # we can safely set it as the final attribute value here.
                 f.server_conn = self.server_conn
+                server_exchange = True
             else:
                 # response was set by an inline script.
                 # we now need to emulate the responseheaders hook.
@@ -447,6 +450,11 @@ class HttpLayer(base.Layer):
                 layer()
                 return False  # should never be reached
 
+            if server_exchange:
+                # The exchange with the server is complete and the connection
+                # is kept alive, so it can be pooled once the client is gone.
+                self.server_conn.reusable = True
+
         except (exceptions.ProtocolException, exceptions.NetlibException) as e:
             self.send_error_response(502, repr(e))
             if not f.response:
@@ -489,10 +497,20 @@ class HttpLayer(base.Layer):
                 self.set_server(address)
                 self.set_server_tls(tls, address[0])
             # Establish connection is necessary.
-            if not self.server_conn.connected():
+            if not self.server_conn.connected() and not self._reuse_server_conn():
                 self.connect()
         else:
-            if not self.server_conn.connected():
+            if not self.server_conn.connected() and not self._reuse_server_conn():
                 self.connect()
             if tls:
                 raise exceptions.HttpProtocolException("Cannot change scheme in upstream proxy mode.")
+
+    def _reuse_server_conn(self) -> bool:
+        if not isinstance(self.server_conn, connections.ServerConnection):
+            # CONNECTed through an upstream proxy, the pool only knows the proxy.
+            return False
+        if self.server_tls:
+            alpn = self.client_conn.get_alpn_proto_negotiated()
+        else:
+            alpn = b""
+        return self.reuse_server_conn(self.server_tls, self.server_sni, alpn)
@@ -10,6 +10,14 @@ class Http1Layer(httpbase._HttpTransmissionLayer):
         super().__init__(ctx)
         self.mode = mode
 
+    @staticmethod
+    def _max_chunk_size(message):
+        # Streamed bodies are forwarded in small chunks, all others are read
+        # into memory in one piece.
+        if message.stream:
+            return 4096
+        return None
+
     def read_request_headers(self, flow):
         return http.HTTPRequest.wrap(
             http1.read_request_head(self.client_conn.rfile)
@@ -20,7 +28,8 @@ class Http1Layer(httpbase._HttpTransmissionLayer):
         return http1.read_body(
             self.client_conn.rfile,
             expected_size,
-            human.parse_size(self.config.options.body_size_limit)
+            human.parse_size(self.config.options.body_size_limit),
+            max_chunk_size=self._max_chunk_size(request)
         )
 
     def send_request_headers(self, request):
@@ -46,7 +55,8 @@ class Http1Layer(httpbase._HttpTransmissionLayer):
         return http1.read_body(
             self.server_conn.rfile,
             expected_size,
-            human.parse_size(self.config.options.body_size_limit)
+            human.parse_size(self.config.options.body_size_limit),
+            max_chunk_size=self._max_chunk_size(response)
         )
 
     def send_response_headers(self, response):
@@ -1,7 +1,8 @@
+import contextlib
 import threading
 import time
 import functools
-from typing import Dict, Callable, Any, List  # noqa
+from typing import Dict, Callable, Any, List, Optional, Tuple  # noqa
 
 import h2.exceptions
 from h2 import connection
@@ -21,19 +22,82 @@ from mitmproxy.utils import human
 
 
 class SafeH2Connection(connection.H2Connection):
+    # The default connection flow control window is 65535 bytes.
+    WINDOW_UPDATE_THRESHOLD = 65535 // 2
 
     def __init__(self, conn, *args, **kwargs):
         super().__init__(*args, **kwargs)
         self.conn = conn
         self.lock = threading.RLock()
+        # Notified whenever the connection state may have changed, e.g. the
+        # peer opened a flow control window or a stream was closed.
+        self.changed = threading.Condition(self.lock)
+        self._batch_depth = 0
+        self._unacknowledged_connection_data = 0
+
+    @contextlib.contextmanager
+    def batch(self):
+        """
+            Hold the lock and defer sending until the end of the block, so
+            that all frames produced in the meantime go out in one write.
+        """
+        with self.lock:
+            self._batch_depth += 1
+            try:
+                yield
+            finally:
+                self._batch_depth -= 1
+            self.send_pending()
+
+    def send_pending(self):
+        if not self._batch_depth:
+            data = self.data_to_send()
+            if data:
+                self.conn.send(data)
+
+    def notify_changed(self):
+        with self.lock:
+            self.changed.notify_all()
+
+    def safe_acknowledge_connection_data(self, acknowledged_size: int):
+        """
+            Hand back space in the connection flow control window. Data is
+            acknowledged on the connection as soon as it is received, so that
+            a slow stream does not block all others. Like h2's own window
+            manager, we wait until half of the window has been used up.
+        """
+        if acknowledged_size == 0:
+            return
 
-    def safe_acknowledge_received_data(self, acknowledged_size: int, stream_id: int):
+        with self.lock:
+            self._unacknowledged_connection_data += acknowledged_size
+            if self._unacknowledged_connection_data < self.WINDOW_UPDATE_THRESHOLD:
+                return
+            increment = self._unacknowledged_connection_data
+            self._unacknowledged_connection_data = 0
+            try:
+                self.increment_flow_control_window(increment)
+            except h2.exceptions.ProtocolError:  # pragma: no cover
+                # connection is already closed
+                return
+            self.send_pending()
+
+    def safe_acknowledge_stream_data(self, acknowledged_size: int, stream_id: int):
+        """
+            Hand back space in the stream flow control window. Data is
+            acknowledged on the stream once it has been consumed, which bounds
+            the amount of data we buffer per stream to the stream window.
+        """
         if acknowledged_size == 0:
             return
 
         with self.lock:
-            self.acknowledge_received_data(acknowledged_size, stream_id)
-            self.conn.send(self.data_to_send())
+            try:
+                self.increment_flow_control_window(acknowledged_size, stream_id)
+            except (KeyError, h2.exceptions.ProtocolError):
+                # h2 raises a KeyError for streams it has already forgotten.
+                return
+            self.send_pending()
 
     def safe_reset_stream(self, stream_id: int, error_code: int):
         with self.lock:
@@ -42,46 +106,46 @@ class SafeH2Connection(connection.H2Connection):
             except h2.exceptions.StreamClosedError:  # pragma: no cover
                 # stream is already closed - good
                 pass
-            self.conn.send(self.data_to_send())
+            self.send_pending()
 
     def safe_update_settings(self, new_settings: Dict[int, Any]):
         with self.lock:
             self.update_settings(new_settings)
-            self.conn.send(self.data_to_send())
+            self.send_pending()
 
     def safe_send_headers(self, raise_zombie: Callable, stream_id: int, headers: headers.Headers, **kwargs):
         with self.lock:
             raise_zombie()
             self.send_headers(stream_id, headers.fields, **kwargs)
-            self.conn.send(self.data_to_send())
+            self.send_pending()
 
     def safe_send_body(self, raise_zombie: Callable, stream_id: int, chunks: List[bytes]):
         for chunk in chunks:
             position = 0
             while position < len(chunk):
-                self.lock.acquire()
-                raise_zombie(self.lock.release)
-                max_outbound_frame_size = self.max_outbound_frame_size
-                frame_chunk = chunk[position:position + max_outbound_frame_size]
-                if self.local_flow_control_window(stream_id) < len(frame_chunk):  # pragma: no cover
-                    self.lock.release()
-                    time.sleep(0.1)
-                    continue
-                self.send_data(stream_id, frame_chunk)
-                try:
-                    self.conn.send(self.data_to_send())
-                except Exception as e:  # pragma: no cover
-                    raise e
-                finally:
-                    self.lock.release()
-                position += max_outbound_frame_size
+                with self.lock:
+                    raise_zombie()
+                    frame_size = min(
+                        self.max_outbound_frame_size,
+                        self.local_flow_control_window(stream_id),
+                        len(chunk) - position
+                    )
+                    if frame_size <= 0:  # pragma: no cover
+                        # Wait for the peer to open the flow control window.
+                        self.changed.wait(1)
+                        continue
+                    self.send_data(stream_id, chunk[position:position + frame_size])
+                    self.send_pending()
+                position += frame_size
         with self.lock:
             raise_zombie()
             self.end_stream(stream_id)
-            self.conn.send(self.data_to_send())
+            self.send_pending()
 
 
 class Http2Layer(base.Layer):
+    # Maximum number of bytes we read from a connection at once.
+    READ_SIZE = 256 * 1024
 
     if False:
         # mypy type hints
@@ -184,26 +248,32 @@ class Http2Layer(base.Layer):
         return True
 
     def _handle_data_received(self, eid, event, source_conn):
+        h2_conn = self.connections[source_conn]
+        h2_conn.safe_acknowledge_connection_data(event.flow_controlled_length)
         bsl = human.parse_size(self.config.options.body_size_limit)
         if bsl and self.streams[eid].queued_data_length > bsl:
             self.streams[eid].kill()
-            self.connections[source_conn].safe_reset_stream(
+            h2_conn.safe_reset_stream(
                 event.stream_id,
                 h2.errors.ErrorCodes.REFUSED_STREAM
             )
             self.log("HTTP body too large. Limit is {}.".format(bsl), "info")
         else:
-            self.streams[eid].data_queue.put(event.data)
+            self.streams[eid].data_queue.put((
+                event.data,
+                functools.partial(
+                    h2_conn.safe_acknowledge_stream_data,
+                    event.flow_controlled_length,
+                    event.stream_id
+                )
+            ))
             self.streams[eid].queued_data_length += len(event.data)
-            self.connections[source_conn].safe_acknowledge_received_data(
-                event.flow_controlled_length,
-                event.stream_id
-            )
         return True
 
     def _handle_stream_ended(self, eid):
         self.streams[eid].timestamp_end = time.time()
         self.streams[eid].data_finished.set()
+        self.streams[eid].data_queue.put(None)
         return True
 
     def _handle_stream_reset(self, eid, event, is_server, other_conn):
@@ -264,6 +334,7 @@ class Http2Layer(base.Layer):
         self.streams[event.pushed_stream_id].timestamp_end = time.time()
         self.streams[event.pushed_stream_id].request_arrived.set()
         self.streams[event.pushed_stream_id].request_data_finished.set()
+        self.streams[event.pushed_stream_id].request_data_queue.put(None)
         self.streams[event.pushed_stream_id].start()
         return True
 
@@ -337,11 +408,15 @@ class Http2Layer(base.Layer):
                     other_conn = self.server_conn if conn == self.client_conn.connection else self.client_conn
                     is_server = (source_conn == self.server_conn)
 
-                    with self.connections[source_conn].lock:
+                    # Hand everything that has arrived to h2 at once, and
+                    # send all frames we produce in response in one write.
+                    with self.connections[source_conn].batch():
                         try:
-                            raw_frame = b''.join(http2.read_raw_frame(source_conn.rfile))
+                            data = source_conn.rfile.read_available(self.READ_SIZE)
                         except:
-                            # read frame failed: connection closed
+                            data = b""
+                        if not data:
+                            # read failed: connection closed
                             self._kill_all_streams()
                             return
 
@@ -349,8 +424,7 @@ class Http2Layer(base.Layer):
                             self.log("HTTP/2 connection entered closed state already", "debug")
                             return
 
-                        incoming_events = self.connections[source_conn].receive_data(raw_frame)
-                        source_conn.send(self.connections[source_conn].data_to_send())
+                        incoming_events = self.connections[source_conn].receive_data(data)
 
                         for event in incoming_events:
                             if not self._handle_event(event, source_conn, other_conn, is_server):
@@ -358,6 +432,10 @@ class Http2Layer(base.Layer):
                                 self._kill_all_streams()
                                 return
 
+                        # Wake up streams waiting for flow control windows
+                        # or free stream slots.
+                        self.connections[source_conn].changed.notify_all()
+
                     self._cleanup_streams()
         except Exception as e:  # pragma: no cover
             self.log(repr(e), "info")
@@ -376,6 +454,12 @@ def detect_zombie_stream(func):  # pragma: no cover
 
 
 class Http2SingleStreamLayer(httpbase._HttpTransmissionLayer, basethread.BaseThread):
+    """
+        Every stream runs in its own thread, as HttpLayer and the addon hooks
+        block. Http2Layer only feeds it events, and the number of threads per
+        connection is bounded by the SETTINGS_MAX_CONCURRENT_STREAMS value h2
+        advertises to the client (100).
+    """
 
     def __init__(self, ctx, h2_connection, stream_id: int, request_headers: mitmproxy.net.http.Headers) -> None:
         super().__init__(
@@ -392,13 +476,16 @@ class Http2SingleStreamLayer(httpbase._HttpTransmissionLayer, basethread.BaseThr
         self.timestamp_start: float = None
         self.timestamp_end: float = None
 
+        # Data queues hold (data, acknowledge) tuples, and None once the
+        # stream has ended. Data is acknowledged to the peer when it is taken
+        # out of the queue, so flow control bounds the queue size.
         self.request_arrived = threading.Event()
-        self.request_data_queue: queue.Queue[bytes] = queue.Queue()
+        self.request_data_queue: queue.Queue[Optional[Tuple[bytes, Callable]]] = queue.Queue()
         self.request_queued_data_length = 0
         self.request_data_finished = threading.Event()
 
         self.response_arrived = threading.Event()
-        self.response_data_queue: queue.Queue[bytes] = queue.Queue()
+        self.response_data_queue: queue.Queue[Optional[Tuple[bytes, Callable]]] = queue.Queue()
         self.response_queued_data_length = 0
         self.response_data_finished = threading.Event()
 
@@ -413,9 +500,13 @@ class Http2SingleStreamLayer(httpbase._HttpTransmissionLayer, basethread.BaseThr
         if not self.zombie:
             self.zombie = time.time()
             self.request_data_finished.set()
+            self.request_data_queue.put(None)
             self.request_arrived.set()
             self.response_arrived.set()
             self.response_data_finished.set()
+            self.response_data_queue.put(None)
+            for h2_conn in self.connections.values():
+                h2_conn.notify_changed()
 
     def connect(self):  # pragma: no cover
         raise exceptions.Http2ProtocolException("HTTP2 layer should already have a connection.")
@@ -486,22 +577,19 @@ class Http2SingleStreamLayer(httpbase._HttpTransmissionLayer, basethread.BaseThr
             timestamp_end=self.timestamp_end,
         )
 
-    @detect_zombie_stream
-    def read_request_body(self, request):
-        if not request.stream:
-            self.request_data_finished.wait()
-
+    def _read_data(self, data_queue):
         while True:
-            try:
-                yield self.request_data_queue.get(timeout=0.1)
-            except queue.Empty:  # pragma: no cover
-                pass
-            if self.request_data_finished.is_set():
-                self.raise_zombie()
-                while self.request_data_queue.qsize() > 0:
-                    yield self.request_data_queue.get()
+            item = data_queue.get()
+            if item is None:
                 break
-            self.raise_zombie()
+            data, acknowledge = item
+            acknowledge()
+            yield data
+        self.raise_zombie()
+
+    @detect_zombie_stream
+    def read_request_body(self, request):
+        yield from self._read_data(self.request_data_queue)
 
     @detect_zombie_stream
     def send_request_headers(self, request):
@@ -509,15 +597,14 @@ class Http2SingleStreamLayer(httpbase._HttpTransmissionLayer, basethread.BaseThr
             # nothing to do here
             return
 
+        self.connections[self.server_conn].lock.acquire()
         while True:
-            self.raise_zombie()
-            self.connections[self.server_conn].lock.acquire()
+            self.raise_zombie(self.connections[self.server_conn].lock.release)
 
             max_streams = self.connections[self.server_conn].remote_settings.max_concurrent_streams
             if self.connections[self.server_conn].open_outbound_streams + 1 >= max_streams:
                 # wait until we get a free slot for a new outgoing stream
-                self.connections[self.server_conn].lock.release()
-                time.sleep(0.1)
+                self.connections[self.server_conn].changed.wait(1)
                 continue
 
             # keep the lock
@@ -603,17 +690,7 @@ class Http2SingleStreamLayer(httpbase._HttpTransmissionLayer, basethread.BaseThr
 
     @detect_zombie_stream
     def read_response_body(self, request, response):
-        while True:
-            try:
-                yield self.response_data_queue.get(timeout=0.1)
-            except queue.Empty:  # pragma: no cover
-                pass
-            if self.response_data_finished.is_set():
-                self.raise_zombie()
-                while self.response_data_queue.qsize() > 0:
-                    yield self.response_data_queue.get()
-                break
-            self.raise_zombie()
+        yield from self._read_data(self.response_data_queue)
 
     @detect_zombie_stream
     def send_response_headers(self, response):
@@ -11,6 +11,9 @@ from mitmproxy.proxy.protocol import base
 
 class RawTCPLayer(base.Layer):
     chunk_size = 4096
+    # Ignored connections are relayed without looking at the data, using a
+    # buffer that grows up to passthrough_chunk_size for bulk transfers.
+    passthrough_chunk_size = 256 * 1024
 
     def __init__(self, ctx, ignore=False):
         self.ignore = ignore
@@ -19,9 +22,15 @@ class RawTCPLayer(base.Layer):
     def __call__(self):
         self.connect()
 
-        if not self.ignore:
-            f = tcp.TCPFlow(self.client_conn, self.server_conn, self)
-            self.channel.ask("tcp_start", f)
+        if self.ignore:
+            try:
+                self._passthrough()
+            except (socket.error, exceptions.TcpException, SSL.Error):
+                pass
+            return
+
+        f = tcp.TCPFlow(self.client_conn, self.server_conn, self)
+        self.channel.ask("tcp_start", f)
 
         buf = memoryview(bytearray(self.chunk_size))
 
@@ -37,29 +46,55 @@ class RawTCPLayer(base.Layer):
 
                     size = conn.recv_into(buf, self.chunk_size)
                     if not size:
-                        conns.remove(conn)
-                        # Shutdown connection to the other peer
-                        if isinstance(conn, SSL.Connection):
-                            # We can't half-close a connection, so we just close everything here.
-                            # Sockets will be cleaned up on a higher level.
-                            return
-                        else:
-                            dst.shutdown(socket.SHUT_WR)
-
-                        if len(conns) == 0:
+                        if self._half_close(conns, conn, dst):
                             return
                         continue
 
                     tcp_message = tcp.TCPMessage(dst == server, buf[:size].tobytes())
-                    if not self.ignore:
-                        f.messages.append(tcp_message)
-                        self.channel.ask("tcp_message", f)
+                    f.messages.append(tcp_message)
+                    self.channel.ask("tcp_message", f)
                     dst.sendall(tcp_message.content)
 
         except (socket.error, exceptions.TcpException, SSL.Error) as e:
-            if not self.ignore:
-                f.error = flow.Error("TCP connection closed unexpectedly: {}".format(repr(e)))
-                self.channel.tell("tcp_error", f)
+            f.error = flow.Error("TCP connection closed unexpectedly: {}".format(repr(e)))
+            self.channel.tell("tcp_error", f)
         finally:
-            if not self.ignore:
-                self.channel.tell("tcp_end", f)
+            self.channel.tell("tcp_end", f)
+
+    def _passthrough(self):
+        client = self.client_conn.connection
+        server = self.server_conn.connection
+        conns = [client, server]
+        buf = memoryview(bytearray(self.chunk_size))
+
+        while not self.channel.should_exit.is_set():
+            r = mitmproxy.net.tcp.ssl_read_select(conns, 10)
+            for conn in r:
+                dst = server if conn == client else client
+
+                size = conn.recv_into(buf)
+                if not size:
+                    if self._half_close(conns, conn, dst):
+                        return
+                    continue
+                dst.sendall(buf[:size])
+                if size == len(buf) and len(buf) < self.passthrough_chunk_size:
+                    buf = memoryview(bytearray(len(buf) * 2))
+
+    @staticmethod
+    def _half_close(conns, conn, dst):
+        """
+            Handle the end of data from conn.
+
+            Returns:
+                True, if we are done relaying.
+        """
+        conns.remove(conn)
+        # Shutdown connection to the other peer
+        if isinstance(conn, SSL.Connection):
+            # We can't half-close a connection, so we just close everything here.
+            # Sockets will be cleaned up on a higher level.
+            return True
+        else:
+            dst.shutdown(socket.SHUT_WR)
+        return len(conns) == 0
@@ -1,6 +1,7 @@
 from typing import Optional  # noqa
 from typing import Union
 
+from mitmproxy import connections
 from mitmproxy import exceptions
 from mitmproxy.net import tls as net_tls
 from mitmproxy.proxy.protocol import base
@@ -242,7 +243,7 @@ class TlsLayer(base.Layer):
         if self._client_tls:
             # Peek into the connection, read the initial client hello and parse it to obtain SNI and ALPN values.
             try:
-                self._client_hello = net_tls.ClientHello.from_file(self.client_conn.rfile)
+                self._client_hello = self.client_conn.get_client_hello()
             except exceptions.TlsProtocolException as e:
                 self.log("Cannot parse Client Hello: %s" % repr(e), "error")
 
@@ -351,8 +352,9 @@ class TlsLayer(base.Layer):
 
     def _establish_tls_with_client_and_server(self):
         try:
-            self.ctx.connect()
-            self._establish_tls_with_server()
+            if not self._reuse_server_conn():
+                self.ctx.connect()
+                self._establish_tls_with_server()
         except Exception:
             # If establishing TLS with the server fails, we try to establish TLS with the client nonetheless
             # to send an error message over TLS.
@@ -364,6 +366,22 @@ class TlsLayer(base.Layer):
 
         self._establish_tls_with_client()
 
+    def _reuse_server_conn(self) -> bool:
+        """
+        Picks up a pooled server connection, on which TLS is established already.
+        It must have negotiated one of the protocols the client offers, or none if the client offers none.
+        """
+        if not isinstance(self.server_conn, connections.ServerConnection) or self.server_conn.connected():
+            # CONNECTed through an upstream proxy, the pool only knows the proxy.
+            return False
+        offered = self._client_hello.alpn_protocols if self._client_hello else None
+        if offered:
+            # HTTP/2 connections are never pooled.
+            candidates = [p for p in offered if p != b"h2"]
+        else:
+            candidates = [b""]
+        return any(self.reuse_server_conn(True, self.server_sni, alpn) for alpn in candidates)
+
     def _establish_tls_with_client(self):
         self.log("Establish TLS with client", "debug")
         cert, key, chain_file = self._find_cert()
@@ -384,7 +402,10 @@ class TlsLayer(base.Layer):
                 chain_file=chain_file,
                 alpn_select_callback=self.__alpn_select_callback,
                 extra_chain_certs=extra_certs,
+                context_cache=self.config.tls_contexts,
             )
+            if net_tls.session_reused(self.client_conn.connection):
+                self.log("Resumed TLS session with client", "debug")
             # Some TLS clients will not fail the handshake,
             # but will immediately throw an "unexpected eof" error on the first read.
             # The reason for this might be difficult to find, so we try to peek here to see if it
@@ -441,8 +462,12 @@ class TlsLayer(base.Layer):
             self.server_conn.establish_tls(
                 sni=self.server_sni,
                 alpn_protos=alpn,
+                context_cache=self.config.tls_contexts,
+                session_cache=self.config.tls_sessions,
                 **args
             )
+            if net_tls.session_reused(self.server_conn.connection):
+                self.log("Resumed TLS session with server", "debug")
             tls_cert_err = self.server_conn.ssl_verification_error
             if tls_cert_err is not None:
                 self.log(str(tls_cert_err), "warn")
@@ -468,7 +493,6 @@ class TlsLayer(base.Layer):
         our certificate should have and then fetches a matching cert from the certstore.
         """
         host = None
-        sans = set()
 
         # In normal operation, the server address should always be known at this point.
         # However, we may just want to establish TLS so that we can send an error message to the client,
@@ -482,20 +506,12 @@ class TlsLayer(base.Layer):
             self.server_conn.tls_established and
             self.config.options.upstream_cert
         )
-        if use_upstream_cert:
-            upstream_cert = self.server_conn.cert
-            sans.update(upstream_cert.altnames)
-            if upstream_cert.cn:
-                sans.add(host)
-                host = upstream_cert.cn.decode("utf8").encode("idna")
+        upstream_cert = self.server_conn.cert if use_upstream_cert else None
         # Also add SNI values.
-        if self._client_hello.sni:
-            sans.add(self._client_hello.sni.encode("idna"))
-        if self._custom_server_sni:
-            sans.add(self._custom_server_sni.encode("idna"))
-
-        # RFC 2818: If a subjectAltName extension of type dNSName is present, that MUST be used as the identity.
-        # In other words, the Common Name is irrelevant then.
-        if host:
-            sans.add(host)
-        return self.config.certstore.get_cert(host, list(sans))
+        server_names = [
+            sni.encode("idna")
+            for sni in (self._client_hello.sni, self._custom_server_sni)
+            if sni
+        ]
+        certstore = self.config.certstore
+        return certstore.get_cert(*certstore.cert_names(host, server_names, upstream_cert))
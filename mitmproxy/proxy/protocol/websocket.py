@@ -14,7 +14,7 @@ from mitmproxy.proxy.protocol import base
 from mitmproxy.net import tcp
 from mitmproxy.net import websockets
 from mitmproxy.websocket import WebSocketFlow, WebSocketMessage
-from mitmproxy.utils import strutils
+from mitmproxy.utils import human, strutils
 
 
 class WebSocketLayer(base.Layer):
@@ -39,7 +39,10 @@ class WebSocketLayer(base.Layer):
         This layer is transparent to any negotiated subprotocols.
         Only raw frames are forwarded to the other endpoint.
 
-        WebSocket messages are stored in a WebSocketFlow.
+        WebSocket messages are stored in a WebSocketFlow. If
+        websocket_max_messages or websocket_max_size are set, only the most
+        recent messages are kept. In streaming mode, messages that exceed
+        websocket_max_size on their own are forwarded, but not captured.
     """
 
     def __init__(self, ctx, handshake_flow):
@@ -49,6 +52,12 @@ class WebSocketLayer(base.Layer):
 
         self.client_frame_buffer = []
         self.server_frame_buffer = []
+        # Size of the buffered fragments, or None if we are not capturing the
+        # current message, by is_server.
+        self.frame_buffer_size = {False: 0, True: 0}
+
+        self.max_messages = self.config.options.websocket_max_messages
+        self.max_size = human.parse_size(self.config.options.websocket_max_size)
 
         self.connections: dict[object, WSConnection] = {}
 
@@ -91,9 +100,18 @@ class WebSocketLayer(base.Layer):
 
     def _handle_data_received(self, event, source_conn, other_conn, is_server):
         fb = self.server_frame_buffer if is_server else self.client_frame_buffer
-        fb.append(event.data)
-
-        if event.message_finished:
+        if self._capture_fragment(fb, event.data, is_server):
+            fb.append(event.data)
+        elif event.message_finished:
+            self.frame_buffer_size[is_server] = 0
+            self.log(
+                "WebSocket message from {} exceeds websocket_max_size, not captured".format(
+                    "server" if is_server else "client"
+                ),
+                "info"
+            )
+
+        if event.message_finished and fb:
             original_chunk_sizes = [len(f) for f in fb]
 
             if isinstance(event, events.TextReceived):
@@ -104,11 +122,13 @@ class WebSocketLayer(base.Layer):
                 payload = b''.join(fb)
 
             fb.clear()
+            self.frame_buffer_size[is_server] = 0
 
             websocket_message = WebSocketMessage(message_type, not is_server, payload)
             length = len(websocket_message.content)
             self.flow.messages.append(websocket_message)
             self.channel.ask("websocket_message", self.flow)
+            self._retain_messages()
 
             if not self.flow.stream and not websocket_message.killed:
                 def get_chunk(payload):
@@ -135,6 +155,46 @@ class WebSocketLayer(base.Layer):
             other_conn.send(self.connections[other_conn].bytes_to_send())
         return True
 
+    def _capture_fragment(self, fb, data, is_server):
+        """
+            Returns:
+                True, if the fragment should be buffered to capture the
+                message. In streaming mode, we give up on messages that
+                exceed max_size, so that their memory usage is bounded.
+        """
+        size = self.frame_buffer_size[is_server]
+        if size is None:
+            return False
+        size += _content_size(data)
+        if self.flow.stream and self.max_size and size > self.max_size:
+            fb.clear()
+            self.frame_buffer_size[is_server] = None
+            return False
+        self.frame_buffer_size[is_server] = size
+        return True
+
+    def _retain_messages(self):
+        """
+            Discard the oldest messages of the flow if there are more than
+            max_messages, or if they are larger than max_size bytes in total.
+            The most recent message is always kept.
+        """
+        messages = self.flow.messages
+        drop = 0
+        if self.max_messages:
+            drop = max(len(messages) - self.max_messages, 0)
+        if self.max_size:
+            # Addons may modify flow.messages, so we don't keep a running total.
+            sizes = [_content_size(m.content) for m in messages]
+            total = sum(sizes[drop:])
+            while total > self.max_size and drop < len(messages) - 1:
+                total -= sizes[drop]
+                drop += 1
+        if drop:
+            del messages[:drop]
+            dropped = self.flow.metadata.get("websocket_messages_dropped", 0)
+            self.flow.metadata["websocket_messages_dropped"] = dropped + drop
+
     def _handle_ping_received(self, event, source_conn, other_conn, is_server):
         # PING is automatically answered with a PONG by wsproto
         self.connections[other_conn].ping()
@@ -214,3 +274,12 @@ class WebSocketLayer(base.Layer):
         finally:
             self.flow.ended = True
             self.channel.tell("websocket_end", self.flow)
+
+
+def _content_size(content) -> int:
+    """
+        The size of a message or fragment in bytes. Text is measured in UTF-8.
+    """
+    if isinstance(content, str):
+        return len(content.encode())
+    return len(content)
@@ -53,7 +53,7 @@ class RootContext:
             ignore = self.config.check_ignore(top_layer.server_conn.address)
             if not ignore and client_tls:
                 try:
-                    client_hello = tls.ClientHello.from_file(self.client_conn.rfile)
+                    client_hello = self.client_conn.get_client_hello()
                 except exceptions.TlsProtocolException as e:
                     self.log("Cannot parse Client Hello: %s" % repr(e), "error")
                 else:
@@ -58,6 +58,10 @@ class ProxyServer(tcp.TCPServer):
     def set_channel(self, channel):
         self.channel = channel
 
+    def handle_shutdown(self):
+        # Idle upstream connections would otherwise outlive the proxy.
+        self.config.connection_pool.clear()
+
     def handle_client_connection(self, conn, client_address):
         h = ConnectionHandler(
             conn,
@@ -19,6 +19,15 @@ class TestAddons(addonmanager.AddonManager):
             self.master.logs.append(args[0])
         super().trigger(event, *args, **kwargs)
 
+    async def trigger_event(self, event, *args, **kwargs):
+        if event == "log":
+            self.master.logs.append(args[0])
+        await super().trigger_event(event, *args, **kwargs)
+
+    def has_handler(self, name):
+        # Log events are always recorded.
+        return name == "log" or super().has_handler(name)
+
 
 class RecordingMaster(mitmproxy.master.Master):
     def __init__(self, *args, **kwargs):
@@ -1,6 +1,7 @@
 from unittest import mock
 
 from mitmproxy.addons import core
+from mitmproxy.net import tls
 from mitmproxy.test import taddons
 from mitmproxy.test import tflow
 from mitmproxy import exceptions
@@ -18,6 +19,35 @@ def test_set():
             tctx.command(sa.set, "nonexistent")
 
 
+def test_cert_pregenerate():
+    sa = core.Core()
+    with taddons.context(loadcore=False) as tctx:
+        with pytest.raises(exceptions.CommandError):
+            tctx.command(sa.cert_pregenerate, "example.com")
+        tctx.master.server = mock.MagicMock()
+        tctx.command(sa.cert_pregenerate, "example.com", "example.org")
+        hosts = tctx.master.server.config.certstore.pregenerate.call_args[0][0]
+        assert list(hosts) == [b"example.com", b"example.org"]
+
+
+@pytest.mark.asyncio
+async def test_tls_sessions():
+    sa = core.Core()
+    with taddons.context(loadcore=False) as tctx:
+        with pytest.raises(exceptions.CommandError):
+            tctx.command(sa.tls_sessions)
+        tctx.master.server = mock.MagicMock()
+        config = tctx.master.server.config
+        config.tls_contexts = tls.ContextCache()
+        config.tls_contexts.session_hits = 3
+        config.tls_sessions = tls.SessionCache()
+        config.tls_sessions.session_hits = 2
+        config.tls_sessions.session_misses = 1
+        tctx.command(sa.tls_sessions)
+        assert await tctx.master.await_log("Client TLS sessions: 3 resumed, 0 new")
+        assert await tctx.master.await_log("Server TLS sessions: 2 resumed, 1 new")
+
+
 def test_resume():
     sa = core.Core()
     with taddons.context(loadcore=False):
@@ -161,6 +191,12 @@ def test_validation_simple():
             tctx.configure(sa, body_size_limit = "invalid")
         tctx.configure(sa, body_size_limit = "1m")
 
+        with pytest.raises(exceptions.OptionsError, match="Invalid WebSocket size limit"):
+            tctx.configure(sa, websocket_max_size = "invalid")
+        tctx.configure(sa, websocket_max_size = "1m")
+        with pytest.raises(exceptions.OptionsError, match="Invalid number of WebSocket messages"):
+            tctx.configure(sa, websocket_max_messages = -1)
+
         with pytest.raises(exceptions.OptionsError, match="mutually exclusive"):
             tctx.configure(
                 sa,
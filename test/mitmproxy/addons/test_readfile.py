@@ -71,6 +71,34 @@ class TestReadFile:
             rf.running()
             assert await tctx.master.await_log("corrupted")
 
+    @pytest.mark.asyncio
+    async def test_progress(self, tmpdir, data):
+        rf = readfile.ReadFile()
+        rf.batch_size = 1
+        rf.progress_interval = -1
+        with taddons.context(rf) as tctx:
+            tf = tmpdir.join("tfile")
+            tf.write(data.getvalue())
+            with asynctest.patch('mitmproxy.master.Master.load_flow'):
+                assert await rf.load_flows_from_path(str(tf)) == 4
+                assert await tctx.master.await_log("Loading flows: 2 of 4 flows.")
+                tctx.master.clear()
+                # Reading a dump leaves no index file behind.
+                assert tmpdir.listdir() == [tf]
+                assert await rf.load_flows(data) == 4
+                assert await tctx.master.await_log("Loading flows: 2 flows.")
+
+    @pytest.mark.asyncio
+    async def test_incomplete(self, tmpdir, data):
+        rf = readfile.ReadFile()
+        with taddons.context(rf) as tctx:
+            tf = tmpdir.join("tfile")
+            # e.g. a dump that is still being written
+            tf.write(data.getvalue() + b"1234:")
+            with asynctest.patch('mitmproxy.master.Master.load_flow'):
+                assert await rf.load_flows_from_path(str(tf)) == 4
+            assert await tctx.master.await_log("Skipped an incomplete flow")
+
     @pytest.mark.asyncio
     async def test_corrupt(self, corrupt_data):
         rf = readfile.ReadFile()
@@ -1,3 +1,6 @@
+import threading
+import time
+
 import pytest
 
 from mitmproxy.test import taddons
@@ -94,3 +97,104 @@ def test_simple(tmpdir):
         sa.request(f)
         tctx.configure(sa, save_stream_file=None)
         assert not rd(p)[1].response
+
+
+@pytest.mark.asyncio
+async def test_async(tmpdir):
+    sa = save.Save()
+    with taddons.context(sa) as tctx:
+        p = str(tmpdir.join("foo"))
+        with pytest.raises(exceptions.OptionsError, match="queue size"):
+            tctx.configure(sa, save_stream_queue_size=0)
+
+        tctx.configure(
+            sa,
+            save_stream_file=p,
+            save_stream_async=True,
+            save_stream_queue_size=1,
+            save_stream_fsync="write",
+        )
+        assert sa.writer
+        flows = [tflow.tflow(resp=True) for _ in range(10)]
+        for f in flows:
+            sa.request(f)
+            sa.response(f)
+        f = tflow.tflow()
+        sa.request(f)
+        tctx.configure(sa, save_stream_file=None)
+        assert not sa.writer
+        assert [f.id for f in rd(p)] == [f.id for f in flows] + [f.id]
+        assert await tctx.master.await_log("11 flows")
+
+        tctx.configure(sa, save_stream_file="+" + p, save_stream_filter="~b nomatch")
+        sa.request(f)
+        sa.response(f)
+        tctx.configure(sa, save_stream_file=None)
+        assert len(rd(p)) == 11
+
+
+@pytest.mark.asyncio
+async def test_async_full(tmpdir):
+    sa = save.Save()
+    with taddons.context(sa) as tctx:
+        p = str(tmpdir.join("foo"))
+        tctx.configure(sa, save_stream_file=p, save_stream_async=True, save_stream_queue_size=1)
+        stalled = threading.Event()
+        write = sa.writer.write
+
+        def slow_write(batch):
+            stalled.wait()
+            write(batch)
+
+        sa.writer.write = slow_write
+        # One flow is picked up by the stalled writer, one fills the queue.
+        sa.response(tflow.tflow(resp=True))
+        while not sa.writer.queue.empty():
+            time.sleep(0.01)
+        sa.response(tflow.tflow(resp=True))
+        assert not sa.writer_warned
+        threading.Timer(0.1, stalled.set).start()
+        sa.response(tflow.tflow(resp=True))
+        assert sa.writer_warned
+        assert await tctx.master.await_log("can't keep up")
+        tctx.configure(sa, save_stream_file=None)
+        assert len(rd(p)) == 3
+
+
+@pytest.mark.asyncio
+async def test_async_error(tmpdir):
+    sa = save.Save()
+    with taddons.context(sa) as tctx:
+        p = str(tmpdir.join("foo"))
+        tctx.configure(sa, save_stream_file=p, save_stream_async=True)
+        sa.writer.fo.close()
+        sa.response(tflow.tflow(resp=True))
+        tctx.configure(sa, save_stream_file=None)
+        assert await tctx.master.await_log("Error writing to stream file")
+
+
+def test_rotate(tmpdir):
+    sa = save.Save()
+    with taddons.context(sa) as tctx:
+        p = str(tmpdir.join("foo.gz"))
+        with pytest.raises(exceptions.OptionsError, match="rotation size"):
+            tctx.configure(sa, save_stream_rotate_size="foo")
+        with pytest.raises(exceptions.OptionsError, match="rotation interval"):
+            tctx.configure(sa, save_stream_rotate_interval=-1)
+
+        tctx.configure(sa, save_stream_file=p, save_stream_rotate_size="1")
+        for _ in range(3):
+            f = tflow.tflow(resp=True)
+            sa.request(f)
+            sa.response(f)
+        tctx.configure(sa, save_stream_file=None)
+        assert len(io.segment_paths(p)) == 3
+        assert len(io.read_flows_from_paths([p])) == 3
+
+        tctx.configure(sa, save_stream_file="+" + p, save_stream_async=True)
+        f = tflow.tflow(resp=True)
+        sa.request(f)
+        sa.response(f)
+        tctx.configure(sa, save_stream_file=None)
+        assert len(io.segment_paths(p)) == 3
+        assert len(io.read_flows_from_paths([p])) == 4
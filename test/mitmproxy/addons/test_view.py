@@ -36,6 +36,34 @@ def test_order_refresh():
         assert sargs
 
 
+def test_add_batch():
+    v = view.View()
+    v.batch_threshold = 2
+    sargs = []
+
+    def save(*args, **kwargs):
+        sargs.extend([args, kwargs])
+
+    v.sig_view_add.connect(save)
+    v.sig_view_refresh.connect(save)
+
+    with taddons.context(v) as tctx:
+        console_addon = consoleaddons.ConsoleAddon(tctx.master)
+        tctx.configure(console_addon)
+        tctx.configure(v, view_filter="~m get", console_focus_follow=True)
+        sargs.clear()
+        flows = [tft(start=3), tft(start=1), tft(method="put", start=2), tft(start=0)]
+        v.add(flows + flows[:1])
+        assert v.store_count() == 4
+        assert [f.request.timestamp_start for f in v] == [0, 1, 3]
+        assert len(sargs) == 2
+        assert v.focus.flow is flows[3]
+
+        v.add(flows)
+        assert v.store_count() == 4
+        assert len(sargs) == 2
+
+
 def test_order_generators():
     v = view.View()
     tf = tflow.tflow(resp=True)
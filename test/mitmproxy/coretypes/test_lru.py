@@ -0,0 +1,25 @@
+from mitmproxy.coretypes import lru
+
+
+def test_lru():
+    cache = lru.LRUCache()
+    assert cache.put("a", 1, cap=2) == []
+    assert cache.put("b", 2, cap=2) == []
+    assert cache.get("a") == 1
+    assert cache.get("c") is None
+    assert cache.get("c", 3) == 3
+    assert cache.put("c", 3, cap=2) == ["b"]
+    assert list(cache) == ["a", "c"]
+    assert "a" in cache
+    assert "b" not in cache
+
+    assert cache.put("a", 4, cap=2) == []
+    assert list(cache) == ["c", "a"]
+    assert cache.put("d", 5, cap=1) == ["c", "a"]
+    assert len(cache) == 1
+
+    assert cache.pop("d") == 5
+    assert cache.pop("d") is None
+    cache.put("e", 6, cap=1)
+    cache.clear()
+    assert not len(cache)
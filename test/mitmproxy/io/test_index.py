@@ -0,0 +1,131 @@
+import os
+
+import pytest
+
+from mitmproxy import exceptions
+from mitmproxy import io
+from mitmproxy.io import index
+from mitmproxy.test import tflow
+
+
+def write_flows(path, flows, mode="wb"):
+    with open(path, mode) as f:
+        w = io.FlowWriter(f)
+        for flow in flows:
+            w.add(flow)
+
+
+class TestFlowIndex:
+    def test_index(self, tmpdir):
+        path = str(tmpdir.join("dump"))
+        flows = [tflow.tflow(resp=True), tflow.ttcpflow(), tflow.twebsocketflow()]
+        write_flows(path, flows)
+
+        with index.FlowIndex(path) as idx:
+            assert len(idx) == 3
+            e = idx.entries[0]
+            assert e.id == flows[0].id
+            assert e.type == "http"
+            assert e.host == "address"
+            assert e.method == "GET"
+            assert e.status_code == 200
+            assert e.request_size == len(flows[0].request.content)
+            assert idx.entries[1].type == "tcp"
+            assert idx.entries[1].method is None
+            assert [f.id for f in idx] == [f.id for f in flows]
+            assert idx[2].id == flows[2].id
+            assert [f.id for f in idx.stream(lambda e: e.type == "tcp")] == [flows[1].id]
+        assert os.path.exists(path + index.INDEX_SUFFIX)
+
+    def test_sidecar(self, tmpdir):
+        path = str(tmpdir.join("dump"))
+        write_flows(path, [tflow.tflow()])
+        with index.FlowIndex(path) as idx:
+            entries = idx.entries
+
+        # The sidecar is used instead of scanning the dump.
+        with index.FlowIndex(path) as idx:
+            assert idx.entries == entries
+
+        # Appended flows are indexed incrementally.
+        f = tflow.tflow(resp=True)
+        write_flows(path, [f], "ab")
+        with index.FlowIndex(path) as idx:
+            assert idx.entries[0] == entries[0]
+            assert idx[1].id == f.id
+
+            write_flows(path, [tflow.ttcpflow()], "ab")
+            assert idx.refresh() == 1
+            assert len(idx) == 3
+            assert idx.refresh() == 0
+
+        # A rewritten dump is indexed from scratch.
+        f = tflow.ttcpflow()
+        write_flows(path, [f])
+        with index.FlowIndex(path) as idx:
+            assert [e.id for e in idx.entries] == [f.id]
+
+    def test_no_sidecar(self, tmpdir):
+        path = str(tmpdir.join("dump"))
+        write_flows(path, [tflow.tflow()])
+        with index.FlowIndex(path, sidecar=False) as idx:
+            assert len(idx) == 1
+        assert not os.path.exists(path + index.INDEX_SUFFIX)
+
+    def test_empty(self, tmpdir):
+        path = str(tmpdir.join("dump"))
+        write_flows(path, [])
+        with index.FlowIndex(path) as idx:
+            assert len(idx) == 0
+            assert list(idx) == []
+
+    def test_invalid(self, tmpdir):
+        path = str(tmpdir.join("dump"))
+        with pytest.raises(exceptions.FlowReadException):
+            index.FlowIndex(path)
+        with open(path, "wb") as f:
+            f.write(b"foo")
+        with pytest.raises(exceptions.FlowReadException):
+            index.FlowIndex(path)
+        with open(path, "wb") as f:
+            f.write(b"3:foo,")
+        with pytest.raises(exceptions.FlowReadException):
+            index.FlowIndex(path)
+
+    def test_truncated(self, tmpdir):
+        path = str(tmpdir.join("dump"))
+        flows = [tflow.tflow(resp=True), tflow.ttcpflow()]
+        write_flows(path, flows[:1])
+        with open(path, "rb") as f:
+            complete = f.read()
+        with open(path, "wb") as f:
+            f.write(complete + b"12")
+
+        # A flow that is still being written is indexed once it's complete.
+        with index.FlowIndex(path) as idx:
+            assert len(idx) == 1
+            assert idx.size == len(complete)
+            write_flows(path, flows, "wb")
+            assert idx.pending() == 1
+            assert [f.id for f in idx.follow()] == [flows[1].id]
+            assert idx.pending() == 0
+            assert len(idx) == 2
+
+    def test_can_index(self, tmpdir):
+        path = str(tmpdir.join("dump"))
+        assert not index.FlowIndex.can_index(path)
+        assert not index.FlowIndex.can_index(str(tmpdir))
+        write_flows(path, [tflow.tflow()])
+        assert index.FlowIndex.can_index(path)
+        with io.open_flow_file(path + ".gz", "wb") as f:
+            io.FlowWriter(f).add(tflow.tflow())
+        assert not index.FlowIndex.can_index(path + ".gz")
+
+    def test_no_refresh(self, tmpdir):
+        path = str(tmpdir.join("dump"))
+        write_flows(path, [tflow.tflow(), tflow.tflow()])
+        with index.FlowIndex(path, sidecar=False, refresh=False) as idx:
+            assert len(idx) == 0
+            assert idx.pending() == 2
+            assert len(list(idx.follow())) == 2
+            assert len(idx) == 2
@@ -1 +1,129 @@
-# TODO: write tests
+import io as pyio
+import os
+
+import pytest
+
+from mitmproxy import exceptions
+from mitmproxy import io
+from mitmproxy.test import tflow
+
+
+def write(fo, flows):
+    w = io.FlowWriter(fo)
+    for f in flows:
+        w.add(f)
+
+
+class TestCompressed:
+    def test_roundtrip(self, tmpdir):
+        p = str(tmpdir.join("flows.gz"))
+        flows = [tflow.tflow(resp=True), tflow.ttcpflow()]
+        with io.open_flow_file(p, "wb") as f:
+            write(f, flows)
+        with open(p, "rb") as f:
+            assert f.read(2) == io.io.GZIP_MAGIC
+        assert [f.id for f in io.read_flows_from_paths([p])] == [f.id for f in flows]
+
+        # Appending adds another gzip member.
+        with io.open_flow_file(p, "ab") as f:
+            write(f, flows[:1])
+        assert len(io.read_flows_from_paths([p])) == 3
+
+    def test_pipe(self, tmpdir):
+        p = str(tmpdir.join("flows.gz"))
+        with io.open_flow_file(p, "wb") as f:
+            write(f, [tflow.tflow()])
+        with open(p, "rb") as f:
+            data = f.read()
+        r, w = os.pipe()
+        os.write(w, data)
+        os.close(w)
+        # Like stdin, a pipe can't seek, so we need to peek at the data.
+        with open(r, "rb") as fo:
+            assert len(list(io.FlowReader(fo).stream())) == 1
+
+    def test_truncated(self, tmpdir):
+        p = str(tmpdir.join("flows.gz"))
+        with io.open_flow_file(p, "wb") as f:
+            write(f, [tflow.tflow(resp=True)])
+        with open(p, "rb") as f:
+            data = f.read()
+        with pytest.raises(exceptions.FlowReadException):
+            list(io.FlowReader(pyio.BytesIO(data[:-20])).stream())
+
+
+class TestRotatingFile:
+    def test_size(self, tmpdir):
+        p = str(tmpdir.join("flows"))
+        flows = [tflow.tflow(resp=True) for _ in range(5)]
+        f = io.RotatingFile(p, max_size=1)
+        write(f, flows)
+        f.close()
+        assert io.segment_paths(p) == [p] + ["%s.seg-%d" % (p, i) for i in range(1, 5)]
+        assert [f.id for f in io.read_flows_from_paths([p])] == [f.id for f in flows]
+
+        # Appending continues the last segment.
+        f = io.RotatingFile(p, append=True, max_size=10 ** 6)
+        write(f, flows[:1])
+        f.close()
+        assert len(io.segment_paths(p)) == 5
+        assert len(io.read_flows_from_paths([p])) == 6
+
+        # A new capture replaces the whole set.
+        f = io.RotatingFile(p)
+        write(f, flows[:1])
+        f.close()
+        assert io.segment_paths(p) == [p]
+
+    def test_age(self, tmpdir):
+        p = str(tmpdir.join("flows.gz"))
+        f = io.RotatingFile(p, max_age=-1)
+        write(f, [tflow.tflow(), tflow.tflow()])
+        f.flush()
+        assert f.fileno() == f.raw.fileno()
+        f.close()
+        paths = io.segment_paths(p)
+        assert len(paths) == 2
+        for path in paths:
+            with open(path, "rb") as f:
+                assert f.read(2) == io.io.GZIP_MAGIC
+        assert len(io.read_flows_from_paths([p])) == 2
+
+    def test_foreign_files(self, tmpdir):
+        p = str(tmpdir.join("flows"))
+        with io.open_flow_file(p, "wb") as f:
+            write(f, [tflow.tflow()])
+        # Files that look like segments but weren't written by RotatingFile
+        # are neither read nor removed.
+        for name in ("flows.1", "flows.seg-1"):
+            with open(str(tmpdir.join(name)), "wb") as f:
+                write(f, [tflow.tflow()])
+        assert io.segment_paths(p) == [p]
+        assert len(io.read_flows_from_paths([p])) == 1
+
+        f = io.RotatingFile(p, max_age=-1)
+        write(f, [tflow.tflow(), tflow.tflow()])
+        f.close()
+        assert io.segment_paths(p) == [p, p + ".seg-1"]
+        f = io.RotatingFile(p)
+        f.close()
+        assert io.segment_paths(p) == [p]
+        assert not os.path.exists(p + ".seg-1")
+        assert os.path.exists(p + ".1")
+        assert not os.path.exists(p + ".segments")
+
+    def test_manifest(self, tmpdir):
+        p = str(tmpdir.join("flows"))
+        with open(p + ".segments", "w") as f:
+            f.write("flows.seg-1\n../etc/passwd\n")
+        assert io.segment_paths(p) == [p]
+        with open(p + ".seg-1", "wb"):
+            pass
+        assert io.segment_paths(p) == [p, p + ".seg-1"]
+
+    def test_empty_segment(self, tmpdir):
+        p = str(tmpdir.join("flows"))
+        f = io.RotatingFile(p, max_age=-1)
+        f.close()
+        assert io.segment_paths(p) == [p]
+        assert not os.path.getsize(p)
@@ -86,6 +86,33 @@ class Test_Format(unittest.TestCase):
             self.assertEqual(v, tnetstring.loads(tnetstring.dumps(v)))
             self.assertEqual((v, b''), tnetstring.pop(tnetstring.dumps(v)))
 
+    def test_loads_buffer(self):
+        for data, expect in FORMAT_EXAMPLES.items():
+            self.assertEqual(expect, tnetstring.loads(memoryview(data)))
+            self.assertEqual(expect, tnetstring.loads(bytearray(data)))
+        self.assertEqual(b'foo', tnetstring.loads(memoryview(b'xx3:foo,')[2:]))
+        self.assertIs(type(tnetstring.loads(memoryview(b'3:foo,'))), bytes)
+
+    def test_loads_invalid(self):
+        for data in [b'', b'x:', b':', b'3:ab,', b'1:a', b'3:1:a}', b'2:1:a,]', b'10000000000:a,']:
+            with self.assertRaises(ValueError):
+                tnetstring.loads(data)
+
+    def test_dumps_subclasses(self):
+        class S(str):
+            pass
+
+        class B(bytes):
+            pass
+
+        class D(dict):
+            pass
+
+        v = D(a=(B(b'b'), S('c'), 1.5, 2))
+        self.assertEqual({'a': [b'b', 'c', 1.5, 2]}, tnetstring.loads(tnetstring.dumps(v)))
+        with self.assertRaises(ValueError):
+            tnetstring.dumps(object())
+
     def test_roundtrip_big_integer(self):
         i1 = math.factorial(30000)
         s = tnetstring.dumps(i1)
@@ -140,6 +140,8 @@ class TestReadBody:
         assert list(read_body(rfile, -1, max_chunk_size=None)) == [b"123456"]
         rfile = BytesIO(b"123456")
         assert list(read_body(rfile, -1, max_chunk_size=1)) == [b"1", b"2", b"3", b"4", b"5", b"6"]
+        rfile = BytesIO(b"x" * 10000)
+        assert list(read_body(rfile, 9000, max_chunk_size=None)) == [b"x" * 9000]
 
 
 def test_connection_close():
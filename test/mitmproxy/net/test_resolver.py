@@ -0,0 +1,112 @@
+import socket
+import threading
+from unittest import mock
+
+import pytest
+
+from mitmproxy.net import resolver
+
+
+class TestResolver:
+    def test_cache(self):
+        r = resolver.Resolver(ttl=60)
+        with mock.patch("socket.getaddrinfo", return_value=[42]) as m:
+            assert r.getaddrinfo("example.com", 80) == [42]
+            assert r.getaddrinfo("example.com", 80) == [42]
+            assert m.call_count == 1
+            assert r.getaddrinfo("example.com", 443) == [42]
+            assert m.call_count == 2
+            r.clear()
+            assert r.getaddrinfo("example.com", 80) == [42]
+            assert m.call_count == 3
+
+    def test_no_cache(self):
+        r = resolver.Resolver()
+        with mock.patch("socket.getaddrinfo", return_value=[42]) as m:
+            r.getaddrinfo("example.com", 80)
+            r.getaddrinfo("example.com", 80)
+            assert m.call_count == 2
+        assert not len(r)
+
+    def test_negative_cache(self):
+        r = resolver.Resolver(negative_ttl=5)
+        with mock.patch("socket.getaddrinfo", side_effect=socket.gaierror("nope")) as m:
+            errors = []
+            for _ in range(2):
+                with pytest.raises(socket.gaierror) as e:
+                    r.getaddrinfo("example.invalid", 80)
+                errors.append(e.value)
+            assert m.call_count == 1
+            assert errors[0] is not errors[1]
+            assert errors[0].args == errors[1].args
+
+        r = resolver.Resolver(negative_ttl=5)
+        with mock.patch("socket.getaddrinfo", side_effect=OSError("nope")) as m:
+            for _ in range(2):
+                with pytest.raises(OSError):
+                    r.getaddrinfo("example.invalid", 80)
+            assert m.call_count == 2
+
+    def test_hosts(self):
+        r = resolver.Resolver(hosts={"example.com": "127.0.0.1"})
+        with mock.patch("socket.getaddrinfo", return_value=[42]) as m:
+            r.getaddrinfo("example.com", 80)
+            assert m.call_args[0][0] == "127.0.0.1"
+        assert r.getaddrinfo("example.com", 80, 0, socket.SOCK_STREAM)[0][4] == ("127.0.0.1", 80)
+
+    def test_hosts_case_insensitive(self):
+        r = resolver.Resolver(hosts={"Example.COM": "127.0.0.1"})
+        assert r.hosts == {"example.com": "127.0.0.1"}
+        with mock.patch("socket.getaddrinfo", return_value=[42]) as m:
+            r.getaddrinfo("EXAMPLE.com", 80)
+            assert m.call_args[0][0] == "127.0.0.1"
+
+    def test_inflight(self):
+        r = resolver.Resolver()
+        event = threading.Event()
+
+        def getaddrinfo(*args):
+            event.wait()
+            return [42]
+
+        results = []
+        with mock.patch("socket.getaddrinfo", side_effect=getaddrinfo) as m:
+            threads = [
+                threading.Thread(target=lambda: results.append(r.getaddrinfo("example.com", 80)))
+                for _ in range(3)
+            ]
+            for t in threads:
+                t.start()
+            event.set()
+            for t in threads:
+                t.join()
+            assert results == [[42]] * 3
+            assert m.call_count == 1
+
+    def test_calling_thread(self):
+        r = resolver.Resolver()
+        threads = []
+
+        def getaddrinfo(*args):
+            threads.append(threading.current_thread())
+            return [42]
+
+        with mock.patch("socket.getaddrinfo", side_effect=getaddrinfo):
+            r.getaddrinfo("example.com", 80)
+        assert threads == [threading.current_thread()]
+
+    def test_interrupted(self):
+        r = resolver.Resolver()
+        with mock.patch("socket.getaddrinfo", side_effect=KeyboardInterrupt):
+            with pytest.raises(KeyboardInterrupt):
+                r.getaddrinfo("example.com", 80)
+        with mock.patch("socket.getaddrinfo", return_value=[42]):
+            assert r.getaddrinfo("example.com", 80) == [42]
+
+    def test_cap(self):
+        r = resolver.Resolver(ttl=60)
+        r.CAP = 2
+        with mock.patch("socket.getaddrinfo", return_value=[42]):
+            for port in range(3):
+                r.getaddrinfo("example.com", port)
+        assert len(r) <= 2
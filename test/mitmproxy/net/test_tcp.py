@@ -1,4 +1,5 @@
 from io import BytesIO
+import errno
 import re
 import queue
 import time
@@ -11,6 +12,7 @@ from OpenSSL import SSL
 
 from mitmproxy import certs
 from mitmproxy.net import tcp
+from mitmproxy.net import tls
 from mitmproxy import exceptions
 from mitmproxy.utils import data
 from ...conftest import skip_no_ipv6
@@ -93,6 +95,18 @@ class TestServer(tservers.ServerTestBase):
                 assert "nonewthread" in self.q.get_nowait()
         self.test_echo()
 
+    def test_out_of_fds(self):
+        server = self.server.server
+        sock = mock.Mock(wraps=server.socket)
+        sock.accept.side_effect = OSError(errno.EMFILE, "Too many open files")
+        with mock.patch.object(server, "socket", sock):
+            c = tcp.TCPClient(("127.0.0.1", self.port))
+            with c.connect():
+                time.sleep(0.3)
+                # We back off instead of spinning on the listening socket.
+                assert 1 <= sock.accept.call_count < 10
+        self.test_echo()
+
 
 class TestServerBind(tservers.ServerTestBase):
 
@@ -313,6 +327,23 @@ class TestSSLUpstreamCertVerificationWBadHostname(tservers.ServerTestBase):
                 )
             assert c.ssl_verification_error
 
+    def test_shared_context(self, tdata):
+        cache = tls.ContextCache()
+        for sni, valid in (("example.mitmproxy.org", True), ("mitmproxy.org", False)):
+            c = tcp.TCPClient(("127.0.0.1", self.port))
+            with c.connect():
+                try:
+                    c.convert_to_tls(
+                        sni=sni,
+                        verify=SSL.VERIFY_PEER,
+                        ca_pemfile=tdata.path("mitmproxy/net/data/verificationcerts/trusted-root.crt"),
+                        context_cache=cache
+                    )
+                except exceptions.InvalidCertificateException:
+                    pass
+                assert (c.ssl_verification_error is None) == valid
+        assert len(cache) == 1
+
 
 class TestSSLUpstreamCertVerificationWValidCertChain(tservers.ServerTestBase):
     handler = EchoHandler
@@ -672,6 +703,15 @@ class TestFileLike:
         s = tcp.Reader(s)
         assert s.readline(3) == b"foo"
 
+    def test_read_multiple_blocks(self):
+        s = BytesIO(b"1234567890")
+        s = tcp.Reader(s)
+        s.BLOCKSIZE = 3
+        s.start_log()
+        assert s.read(8) == b"12345678"
+        assert s.get_log() == b"12345678"
+        assert s.read(-1) == b"90"
+
     def test_limitless(self):
         s = BytesIO(b"f" * (50 * 1024))
         s = tcp.Reader(s)
@@ -724,6 +764,15 @@ class TestFileLike:
         with pytest.raises(exceptions.TcpDisconnect):
             s.read(10)
 
+    def test_read_available(self):
+        s = tcp.Reader(BytesIO(b"foobar"))
+        s.start_log()
+        assert s.read_available(4) == b"foob"
+        assert s.first_byte_timestamp
+        assert s.read_available(4) == b"ar"
+        assert s.read_available(4) == b""
+        assert s.get_log() == b"foobar"
+
     def test_reset_timestamps(self):
         s = BytesIO(b"foobar\nfoobar")
         s = tcp.Reader(s)
@@ -806,3 +855,73 @@ class TestPeekSSL(TestPeek):
         with c.connect() as conn:
             c.convert_to_tls()
             return conn.pop()
+
+
+class MultiLineHandler(tcp.BaseHandler):
+
+    def handle(self):
+        self.wfile.write(b"foo\r\nbarbaz\r\n\r\n" + b"x" * 3000 + b"\nrest")
+        self.wfile.flush()
+
+
+class TestReadline(tservers.ServerTestBase):
+    handler = MultiLineHandler
+
+    def _connect(self, c):
+        return c.connect()
+
+    def test_readline(self):
+        c = tcp.TCPClient(("127.0.0.1", self.port))
+        with self._connect(c):
+            c.rfile.start_log()
+            assert c.rfile.readline() == b"foo\r\n"
+            assert c.rfile.first_byte_timestamp
+            assert c.rfile.readline(3) == b"bar"
+            assert c.rfile.readline() == b"baz\r\n"
+            assert c.rfile.readline() == b"\r\n"
+            assert c.rfile.get_log() == b"foo\r\nbarbaz\r\n\r\n"
+            assert c.rfile.readline() == b"x" * 3000 + b"\n"
+            assert c.rfile.readline() == b"rest"
+            assert c.rfile.readline() == b""
+
+
+class ReadAvailableHandler(tcp.BaseHandler):
+
+    def handle(self):
+        self.wfile.write(b"x" * 50000)
+        self.wfile.flush()
+
+
+class TestReadAvailable(tservers.ServerTestBase):
+    handler = ReadAvailableHandler
+
+    def _connect(self, c):
+        return c.connect()
+
+    def test_read_available(self):
+        c = tcp.TCPClient(("127.0.0.1", self.port))
+        with self._connect(c):
+            data = c.rfile.read_available(30000)
+            assert 0 < len(data) <= 30000
+            while len(data) < 50000:
+                data += c.rfile.read_available(30000)
+            assert data == b"x" * 50000
+            assert c.rfile.read_available(10) == b""
+
+
+class TestReadAvailableSSL(TestReadAvailable):
+    ssl = True
+
+    def _connect(self, c):
+        with c.connect() as conn:
+            c.convert_to_tls()
+            return conn.pop()
+
+
+class TestReadlineSSL(TestReadline):
+    ssl = True
+
+    def _connect(self, c):
+        with c.connect() as conn:
+            c.convert_to_tls()
+            return conn.pop()
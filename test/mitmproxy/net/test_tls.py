@@ -1,6 +1,8 @@
 import io
+from unittest import mock
 
 import pytest
+from OpenSSL import SSL, crypto
 
 from mitmproxy import exceptions
 from mitmproxy.net import tls
@@ -68,6 +70,129 @@ class TestTLSInvalid:
             tls.create_client_context(alpn_select="foo", alpn_select_callback="bar")
 
 
+class TestContextCache(tservers.ServerTestBase):
+    handler = EchoHandler
+    ssl = dict()
+
+    def test_client_context(self):
+        cache = tls.ContextCache()
+        a = cache.client_context(sni="example.com", alpn_protos=[b"h2"])
+        assert cache.client_context(sni="example.com", alpn_protos=[b"h2"]) is a
+        assert cache.client_context(sni="example.com", alpn_protos=[b"http/1.1"]) is not a
+        # Servers share a context, SNI is set per connection.
+        assert cache.client_context(sni="example.org", alpn_protos=[b"h2"]) is a
+        assert len(cache) == 2
+        with pytest.raises(exceptions.TlsException, match="without SNI"):
+            cache.client_context(verify=SSL.VERIFY_PEER)
+        cache.clear()
+        assert not len(cache)
+
+    def test_cap(self):
+        cache = tls.ContextCache()
+        cache.CAP = 2
+        a = cache.client_context(alpn_protos=[b"a"])
+        cache.client_context(alpn_protos=[b"b"])
+        assert cache.client_context(alpn_protos=[b"a"]) is a
+        cache.client_context(alpn_protos=[b"c"])
+        assert len(cache) == 2
+        assert cache.client_context(alpn_protos=[b"a"]) is a
+
+    def test_connection(self):
+        cache = tls.ContextCache()
+        for _ in range(2):
+            c = TCPClient(("127.0.0.1", self.port))
+            with c.connect():
+                c.convert_to_tls(sni="example.com", context_cache=cache)
+                c.wfile.write(b"echo!\n")
+                c.wfile.flush()
+                assert c.rfile.readline() == b"echo!\n"
+        assert len(cache) == 1
+
+
+class TestSessionCache(tservers.ServerTestBase):
+    handler = EchoHandler
+    ssl = dict()
+
+    def test_cache(self):
+        cache = tls.SessionCache()
+        cache.CAP = 2
+        cache.put(cache.key(("a.com", 443), None, None), 1)
+        cache.put(cache.key(("b.com", 443), "b.com", [b"h2"]), 2)
+        assert cache.get(cache.key(("a.com", 443), None, [])) == 1
+        cache.put(cache.key(("c.com", 443), None, None), 3)
+        assert len(cache) == 2
+        assert cache.get(cache.key(("b.com", 443), "b.com", [b"h2"])) is None
+        assert cache.get(cache.key(("a.com", 443), None, None)) == 1
+        # Sessions established without verification are kept apart.
+        assert cache.get(cache.key(("a.com", 443), None, None, verify=SSL.VERIFY_PEER)) is None
+        cache.clear()
+        assert not len(cache)
+
+    def test_connection(self):
+        cache = tls.SessionCache()
+        for _ in range(2):
+            c = TCPClient(("127.0.0.1", self.port))
+            with c.connect():
+                c.convert_to_tls(sni="example.com", session_cache=cache)
+                c.wfile.write(b"echo!\n")
+                c.wfile.flush()
+                assert c.rfile.readline() == b"echo!\n"
+        assert cache.get(cache.key(("127.0.0.1", self.port), "example.com", None))
+        # Without a context cache, the server can't resume the session.
+        assert cache.session_misses == 2
+        assert not cache.session_hits
+
+
+class ResumeHandler(EchoHandler):
+    # A per-connection SNI callback would prevent context reuse.
+    handle_sni = None
+
+
+class TestServerSessionCache(tservers.ServerTestBase):
+    handler = ResumeHandler
+    ssl = dict(
+        context_cache=tls.ContextCache()
+    )
+
+    def test_resume(self):
+        sessions = tls.SessionCache()
+        for _ in range(3):
+            c = TCPClient(("127.0.0.1", self.port))
+            with c.connect():
+                c.convert_to_tls(sni="example.com", session_cache=sessions)
+                c.wfile.write(b"echo!\n")
+                c.wfile.flush()
+                assert c.rfile.readline() == b"echo!\n"
+                # OpenSSL drops sessions that are not shut down cleanly.
+                c.finish()
+        server_contexts = self.ssl["context_cache"]
+        assert len(server_contexts) == 1
+        assert server_contexts.session_misses == 1
+        assert server_contexts.session_hits == 2
+        assert sessions.session_hits == 2
+        assert tls.session_reused(c.connection)
+
+    def test_key(self):
+        key = crypto.PKey()
+        key.generate_key(crypto.TYPE_RSA, 1024)
+        pem = crypto.dump_privatekey(crypto.FILETYPE_PEM, key)
+        # A key loaded twice is the same key.
+        assert tls._context_key(dict(key=key)) == tls._context_key(
+            dict(key=crypto.load_privatekey(crypto.FILETYPE_PEM, pem))
+        )
+
+    def test_no_lib(self):
+        with mock.patch("mitmproxy.net.tls._lib", None):
+            assert not tls.session_reused(mock.Mock())
+
+    def test_lifetime(self):
+        cache = tls.ContextCache()
+        a = cache.client_context(sni="example.com")
+        cache.LIFETIME = 0
+        assert cache.client_context(sni="example.com") is not a
+        assert len(cache) == 1
+
+
 def test_is_record_magic():
     assert not tls.is_tls_record_magic(b"POST /")
     assert not tls.is_tls_record_magic(b"\x16\x03")
@@ -96,6 +221,16 @@ def test_get_client_hello():
     with pytest.raises(exceptions.TlsProtocolException, message="Expected TLS record"):
         tls.get_client_hello(rfile)
 
+    # A ClientHello split across records is read with a single peek if possible.
+    split_client_hello = (
+        b"\x16\x03\x03\x00\x02" + FULL_CLIENT_HELLO_NO_EXTENSIONS[5:7] +
+        b"\x16\x03\x03\x00\x63" + FULL_CLIENT_HELLO_NO_EXTENSIONS[7:]
+    )
+    rfile = mock.Mock()
+    rfile.peek.return_value = split_client_hello
+    assert tls.get_client_hello(rfile) == FULL_CLIENT_HELLO_NO_EXTENSIONS[5:]
+    assert rfile.peek.call_count == 1
+
 
 class TestClientHello:
     def test_no_extensions(self):
@@ -72,7 +72,8 @@ class _TServer(tcp.TCPServer):
                 cipher_list=self.ssl.get("cipher_list", None),
                 dhparams=self.ssl.get("dhparams", None),
                 chain_file=self.ssl.get("chain_file", None),
-                alpn_select=self.ssl.get("alpn_select", None)
+                alpn_select=self.ssl.get("alpn_select", None),
+                context_cache=self.ssl.get("context_cache", None)
             )
         h.handle()
         h.finish()
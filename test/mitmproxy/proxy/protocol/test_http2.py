@@ -13,6 +13,7 @@ import mitmproxy.net
 from ...net import tservers as net_tservers
 from mitmproxy import exceptions
 from mitmproxy.net.http import http1, http2
+from mitmproxy.proxy.protocol.http2 import SafeH2Connection
 from pathod.language import generators
 
 from ... import tservers
@@ -966,3 +967,53 @@ class TestResponseStreaming(_Http2Test):
             assert data
         else:
             assert data is None
+
+
+class TestSafeH2Connection:
+
+    class _Conn:
+        def __init__(self):
+            self.sent = b""
+
+        def send(self, data):
+            self.sent += data
+
+    def _window_updates(self, client, conn):
+        events = client.receive_data(conn.sent)
+        conn.sent = b""
+        return [(e.stream_id, e.delta) for e in events if isinstance(e, h2.events.WindowUpdated)]
+
+    def test_acknowledge_data(self):
+        conn = self._Conn()
+        server = SafeH2Connection(conn, config=h2.config.H2Configuration(client_side=False))
+        client = h2.connection.H2Connection()
+        client.initiate_connection()
+        server.initiate_connection()
+        client.receive_data(server.data_to_send())
+        server.receive_data(client.data_to_send())
+
+        client.send_headers(1, [(':method', 'POST'), (':path', '/'), (':scheme', 'https'), (':authority', 'x')])
+        for _ in range(4):
+            client.send_data(1, b"a" * 15000)
+        server.receive_data(client.data_to_send())
+
+        # The connection window is handed back right away, once half of it
+        # has been used up. The stream window only once the data has been
+        # consumed.
+        server.safe_acknowledge_connection_data(15000)
+        assert not conn.sent
+        server.safe_acknowledge_connection_data(45000)
+        assert self._window_updates(client, conn) == [(0, 60000)]
+        assert client.local_flow_control_window(1) == 65535 - 60000
+
+        server.safe_acknowledge_stream_data(60000, 1)
+        assert self._window_updates(client, conn) == [(1, 60000)]
+        assert client.local_flow_control_window(1) == 65535
+
+        server.safe_acknowledge_stream_data(42, 3)
+        assert not conn.sent
+
+        client.reset_stream(1)
+        server.receive_data(client.data_to_send())
+        server.safe_acknowledge_stream_data(42, 1)
+        assert not conn.sent
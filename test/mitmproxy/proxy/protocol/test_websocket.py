@@ -131,12 +131,13 @@ class _WebSocketTest(_WebSocketTestBase, _WebSocketServerBase):
 
     @classmethod
     def setup_class(cls):
-        _WebSocketTestBase.setup_class()
+        # Bind to cls, so that test classes can override get_options.
+        super().setup_class()
         _WebSocketServerBase.setup_class(ssl=cls.ssl)
 
     @classmethod
     def teardown_class(cls):
-        _WebSocketTestBase.teardown_class()
+        super().teardown_class()
         _WebSocketServerBase.teardown_class()
 
 
@@ -240,6 +241,128 @@ class TestKillFlow(_WebSocketTest):
             websockets.Frame.from_file(self.client.rfile)
 
 
+class TestRetention(_WebSocketTest):
+
+    @classmethod
+    def get_options(cls):
+        opts = super().get_options()
+        opts.websocket_max_messages = 2
+        return opts
+
+    @classmethod
+    def handle_websockets(cls, rfile, wfile):
+        for payload in (b'first', b'second', b'third'):
+            wfile.write(bytes(websockets.Frame(fin=1, opcode=websockets.OPCODE.TEXT, payload=payload)))
+            wfile.flush()
+
+    def test_retention(self):
+        self.setup_connection()
+
+        for payload in (b'first', b'second', b'third'):
+            frame = websockets.Frame.from_file(self.client.rfile)
+            assert frame.payload == payload
+
+        f = self.master.state.flows[1]
+        assert [m.content for m in f.messages] == ['second', 'third']
+        assert f.metadata["websocket_messages_dropped"] == 1
+
+
+class TestRetentionSize(TestRetention):
+
+    @classmethod
+    def get_options(cls):
+        opts = _WebSocketTest.get_options()
+        # 'first' is dropped once 'third' brings the total to 16 bytes.
+        opts.websocket_max_size = "12"
+        return opts
+
+
+class TestRetentionSizeText(_WebSocketTest):
+
+    @classmethod
+    def get_options(cls):
+        opts = super().get_options()
+        # Text is measured in bytes: each message has 4 characters, but 6 bytes.
+        opts.websocket_max_size = "12"
+        return opts
+
+    @classmethod
+    def handle_websockets(cls, rfile, wfile):
+        for payload in ('üü-1', 'üü-2', 'üü-3'):
+            wfile.write(bytes(websockets.Frame(fin=1, opcode=websockets.OPCODE.TEXT, payload=payload.encode())))
+            wfile.flush()
+
+    def test_retention(self):
+        self.setup_connection()
+
+        for _ in range(3):
+            websockets.Frame.from_file(self.client.rfile)
+
+        f = self.master.state.flows[1]
+        assert [m.content for m in f.messages] == ['üü-2', 'üü-3']
+        assert f.metadata["websocket_messages_dropped"] == 1
+
+
+class TestRetentionModified(TestRetention):
+
+    @classmethod
+    def get_options(cls):
+        opts = _WebSocketTest.get_options()
+        opts.websocket_max_size = "12"
+        return opts
+
+    def test_retention(self):
+        class Truncate:
+            def websocket_message(self, f):
+                for m in f.messages[:-1]:
+                    m.content = ""
+
+        self.proxy.set_addons(Truncate())
+        self.setup_connection()
+
+        for _ in range(3):
+            websockets.Frame.from_file(self.client.rfile)
+
+        # Only the current size of the messages counts.
+        f = self.master.state.flows[1]
+        assert [m.content for m in f.messages] == ['', '', 'third']
+        assert "websocket_messages_dropped" not in f.metadata
+
+
+class TestRetentionStreaming(_WebSocketTest):
+
+    @classmethod
+    def get_options(cls):
+        opts = super().get_options()
+        opts.websocket_max_size = "10"
+        return opts
+
+    @classmethod
+    def handle_websockets(cls, rfile, wfile):
+        for payload in (b'first', b'second-too-long', b'third'):
+            wfile.write(bytes(websockets.Frame(fin=1, opcode=websockets.OPCODE.TEXT, payload=payload)))
+            wfile.flush()
+
+    @pytest.mark.asyncio
+    async def test_retention(self):
+        class Stream:
+            def websocket_start(self, f):
+                f.stream = True
+
+        self.proxy.set_addons(Stream())
+        self.setup_connection()
+
+        # Messages that aren't captured are still forwarded.
+        for payload in (b'first', b'second-too-long', b'third'):
+            frame = websockets.Frame.from_file(self.client.rfile)
+            assert frame.payload == payload
+
+        f = self.master.state.flows[1]
+        assert [m.content for m in f.messages] == ['first', 'third']
+        assert "websocket_messages_dropped" not in f.metadata
+        assert await self.master.await_log("from server exceeds websocket_max_size, not captured")
+
+
 class TestSimpleTLS(_WebSocketTest):
     ssl = True
 
@@ -2,7 +2,49 @@ import pytest
 
 from mitmproxy import options
 from mitmproxy import exceptions
-from mitmproxy.proxy.config import ProxyConfig
+from mitmproxy.proxy.config import HostMatcher, ProxyConfig
+
+
+class TestHostMatcher:
+    def test_simple(self):
+        h = HostMatcher([r"example\.com", r"^10\.0\.0\.1:"])
+        assert h
+        assert h._combined
+        assert not h._separate
+        assert h(("www.EXAMPLE.com", 443))
+        assert h(("10.0.0.1", 80))
+        assert not h(("10.0.0.10", 80))
+        assert not h(("example.org", 443))
+        assert not h(None)
+        assert not HostMatcher()
+        assert not HostMatcher()(("example.com", 443))
+
+    def test_groups(self):
+        h = HostMatcher([r"(a)\1\.org", r"example\.com"])
+        assert h._separate
+        assert h(("aa.org", 443))
+        assert not h(("ab.org", 443))
+        assert h(("example.com", 443))
+
+    def test_inline_flags(self):
+        h = HostMatcher([r"example\.com", r"(?x) foo \. org", r"ex ample\.org"])
+        assert h._combined.pattern == r"(?:example\.com)|(?:ex ample\.org)"
+        assert [rex.pattern for rex in h._separate] == [r"(?x) foo \. org"]
+        assert h(("foo.org", 443))
+        assert h(("example.com", 443))
+        # (?x) must not leak into the other patterns.
+        assert not h(("example.org", 443))
+        assert h(("ex ample.org", 443))
+
+    def test_cache(self):
+        h = HostMatcher([r"example\.com"])
+        h.CAP = 2
+        assert h(("example.com", 443))
+        assert not h(("example.org", 443))
+        assert list(h._cache) == ["example.com:443", "example.org:443"]
+        assert h(("example.com", 443))
+        assert not h(("example.net", 443))
+        assert list(h._cache) == ["example.com:443", "example.net:443"]
 
 
 class TestProxyConfig:
@@ -17,3 +59,98 @@ class TestProxyConfig:
         opts.certs = [tdata.path("mitmproxy/data/dumpfile-011")]
         with pytest.raises(exceptions.OptionsError, match="Invalid certificate format"):
             ProxyConfig(opts)
+
+    def test_cert_cache(self, tmpdir):
+        opts = options.Options()
+        opts.confdir = str(tmpdir)
+        opts.cert_cache_size = 7
+        config = ProxyConfig(opts)
+        assert config.certstore.STORE_CAP == 7
+        assert not config.certstore.cache_dir
+
+        opts.cert_disk_cache = True
+        assert config.certstore.cache_dir == str(tmpdir.join("mitmproxy-certs"))
+
+        with pytest.raises(exceptions.OptionsError, match="Invalid certificate cache size"):
+            opts.cert_cache_size = -1
+        assert config.certstore.STORE_CAP == 7
+
+    def test_cert_workers(self, tmpdir):
+        opts = options.Options()
+        opts.confdir = str(tmpdir)
+        config = ProxyConfig(opts)
+        assert not config.certstore.executor
+
+        opts.cert_workers = 1
+        assert config.certstore.executor is config.cert_executor
+        assert config.certstore.get_cert(b"example.com", [])[0].cn == b"example.com"
+        executor = config.cert_executor
+        opts.cert_workers = 2
+        assert config.certstore.executor is config.cert_executor is not executor
+        with pytest.raises(RuntimeError):
+            executor.submit(int)
+        opts.cert_workers = 0
+        assert not config.certstore.executor
+
+        with pytest.raises(exceptions.OptionsError, match="Invalid number"):
+            opts.cert_workers = -1
+
+    def test_certstore_reuse(self, tmpdir):
+        opts = options.Options()
+        opts.confdir = str(tmpdir)
+        config = ProxyConfig(opts)
+        certstore = config.certstore
+        cert = certstore.get_cert(b"example.com", [])[0]
+
+        opts.showhost = True
+        opts.cert_cache_size = 7
+        assert config.certstore is certstore
+        assert certstore.STORE_CAP == 7
+
+        opts.certs = ["custom.com=" + str(tmpdir.join("mitmproxy-ca.pem"))]
+        assert config.certstore is not certstore
+        assert config.certstore.get_cert(b"example.com", [])[0] == cert
+        assert config.certstore.certs[b"custom.com"]
+
+    def test_tls_contexts(self, tmpdir):
+        opts = options.Options()
+        opts.confdir = str(tmpdir)
+        config = ProxyConfig(opts)
+        config.tls_contexts.client_context(sni="example.com")
+        config.tls_sessions.put(("example.com", 443), object())
+        assert len(config.tls_contexts) == 1
+        assert len(config.tls_sessions) == 1
+        opts.showhost = True
+        assert len(config.tls_contexts) == 1
+        assert len(config.tls_sessions) == 1
+        opts.ciphers_server = "AES256-SHA"
+        assert not len(config.tls_contexts)
+        assert not len(config.tls_sessions)
+
+    def test_connection_pool(self, tmpdir):
+        opts = options.Options()
+        opts.confdir = str(tmpdir)
+        config = ProxyConfig(opts)
+        opts.update(upstream_pool_max_idle=3, upstream_pool_ttl=5)
+        assert config.connection_pool.max_idle == 3
+        assert config.connection_pool.ttl == 5
+        with pytest.raises(exceptions.OptionsError, match="Invalid number of pooled"):
+            opts.upstream_pool_max_idle = -1
+        with pytest.raises(exceptions.OptionsError, match="Invalid pooled connection lifetime"):
+            opts.upstream_pool_ttl = -1
+
+    def test_dns(self, tmpdir):
+        opts = options.Options()
+        opts.confdir = str(tmpdir)
+        config = ProxyConfig(opts)
+        assert config.resolver.ttl == 0
+        assert config.resolver.negative_ttl == 0
+        opts.update(dns_hosts=["Example.com=127.0.0.1"], dns_cache_ttl=60)
+        assert config.resolver.hosts == {"example.com": "127.0.0.1"}
+        assert config.resolver.ttl == 60
+        with pytest.raises(exceptions.OptionsError, match="Invalid DNS host"):
+            opts.dns_hosts = ["example.com"]
+        with pytest.raises(exceptions.OptionsError, match="Invalid DNS cache lifetime"):
+            opts.dns_cache_ttl = -1
+        with pytest.raises(exceptions.OptionsError, match="Invalid DNS cache lifetime"):
+            opts.dns_negative_ttl = -1
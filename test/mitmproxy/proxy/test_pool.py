@@ -0,0 +1,95 @@
+import socket
+from unittest import mock
+
+from mitmproxy.proxy import pool
+
+
+def make_conn(address=("example.com", 80), tls=False, sni=None, alpn=b""):
+    conn = mock.Mock()
+    conn.address = address
+    conn.tls_established = tls
+    conn.sni = sni
+    conn.reusable = True
+    conn.spoof_source_address = False
+    conn.get_alpn_proto_negotiated.return_value = alpn
+    conn.connection, conn.peer = socket.socketpair()
+    return conn
+
+
+class TestConnectionPool:
+    def test_disabled(self):
+        p = pool.ConnectionPool()
+        assert not p.put(make_conn())
+
+    def test_put_get(self):
+        p = pool.ConnectionPool(max_idle=2)
+        key = p.key(("example.com", 80), False, None, None)
+        assert p.get(key) is None
+
+        plain = make_conn()
+        tls = make_conn(address=("example.com", 443), tls=True, sni="example.com", alpn=b"http/1.1")
+        assert p.put(plain)
+        assert not plain.reusable
+        assert p.put(tls)
+        assert len(p) == 2
+
+        assert p.get(p.key(("example.com", 443), True, "example.org", b"http/1.1")) is None
+        assert p.get(p.key(("example.com", 443), True, "example.com", b"http/1.1")) is tls
+        assert p.get(key) is plain
+        assert p.get(key) is None
+        assert not len(p)
+
+    def test_not_reusable(self):
+        p = pool.ConnectionPool(max_idle=2)
+        c = make_conn()
+        c.reusable = False
+        assert not p.put(c)
+        c = make_conn()
+        c.spoof_source_address = True
+        assert not p.put(c)
+        assert not p.put(make_conn(tls=True, alpn=b"h2"))
+
+    def test_limits(self):
+        p = pool.ConnectionPool(max_idle=1)
+        a, b = make_conn(), make_conn()
+        p.put(a)
+        p.put(b)
+        assert len(p) == 1
+        assert a.close.called
+        assert p.get(p.key(("example.com", 80), False, None, None)) is b
+
+        p.ttl = -1
+        a.reusable = True
+        assert p.put(a)
+        assert not len(p)
+
+    def test_closed_by_server(self):
+        p = pool.ConnectionPool(max_idle=1)
+        c = make_conn()
+        p.put(c)
+        c.peer.close()
+        assert p.get(p.key(("example.com", 80), False, None, None)) is None
+        assert c.close.called
+
+    def test_reaper(self):
+        p = pool.ConnectionPool(max_idle=2, ttl=0.05)
+        a, b = make_conn(), make_conn()
+        p.put(a)
+        reaper = p._reaper
+        assert reaper.is_alive()
+        p.put(b)
+        assert p._reaper is reaper
+        reaper.join(5)
+        assert not reaper.is_alive()
+        assert not len(p)
+        assert a.close.called
+        assert b.close.called
+        assert p._reaper is None
+
+    def test_clear(self):
+        p = pool.ConnectionPool(max_idle=1)
+        c = make_conn()
+        p.put(c)
+        p.clear()
+        assert not len(p)
+        assert c.finish.called
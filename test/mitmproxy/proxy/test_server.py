@@ -135,14 +135,15 @@ class TcpMixin:
         assert not any(f.response.status_code == 305 for f in self.master.state.flows if isinstance(f, http.HTTPFlow))
         assert not any(f.response.status_code == 306 for f in self.master.state.flows if isinstance(f, http.HTTPFlow))
 
-        # Test that we get the original SSL cert
+        # TCP flows are still intercepted at the TLS level. Changing tcp_hosts
+        # doesn't reload the certstore, so we get the same generated cert.
         if self.ssl:
             i_cert = certs.Cert(i.sslinfo.certchain[0])
             i2_cert = certs.Cert(i2.sslinfo.certchain[0])
             n_cert = certs.Cert(n.sslinfo.certchain[0])
 
             assert i_cert == i2_cert
-            assert i_cert != n_cert
+            assert i_cert == n_cert
 
         # Make sure that TCP messages are in the event log.
         # Re-enable and fix this when we start keeping TCPFlows in the state.
@@ -274,6 +275,21 @@ class TestHTTPS(tservers.HTTPProxyTest, CommonMixin, TcpMixin):
             assert p.request("get:/:i0,'invalid\r\n\r\n'").status_code == 400
 
 
+class TestHTTPSECDSA(tservers.HTTPProxyTest, CommonMixin):
+    ssl = True
+
+    @classmethod
+    def get_options(cls):
+        opts = super().get_options()
+        opts.cert_key_type = "ecdsa"
+        return opts
+
+    def test_keyinfo(self):
+        f = self.pathod("304")
+        assert f.status_code == 304
+        assert certs.Cert(f.sslinfo.certchain[0]).keyinfo == ("EC", 256)
+
+
 class TestHTTPSCertfile(tservers.HTTPProxyTest, CommonMixin):
     ssl = True
     certfile = True
@@ -420,6 +436,42 @@ class TestReverse(tservers.ReverseProxyTest, CommonMixin, TcpMixin):
         assert await self.master.await_log("The proxy shall not connect to itself.")
 
 
+class TestReversePool(tservers.ReverseProxyTest):
+    ssl = True
+
+    @classmethod
+    def get_options(cls):
+        opts = super().get_options()
+        opts.upstream_pool_max_idle = 2
+        return opts
+
+    def teardown(self):
+        # Pooled connections keep their pathod handlers busy.
+        self.master.server.config.connection_pool.clear()
+        super().teardown()
+
+    def test_reuse(self):
+        connection_pool = self.master.server.config.connection_pool
+        assert self.pathod("200").status_code == 200
+        for _ in range(50):
+            if len(connection_pool):
+                break
+            time.sleep(0.01)
+        assert len(connection_pool) == 1
+        assert self.pathod("201").status_code == 201
+        flows = self.master.state.flows
+        assert flows[0].server_conn is flows[1].server_conn
+
+    def test_connection_close(self):
+        connection_pool = self.master.server.config.connection_pool
+        connection_pool.clear()
+        p = self.pathoc()
+        with p.connect():
+            assert p.request("get:'/p/200':h'Connection'='close'").status_code == 200
+        time.sleep(0.1)
+        assert not len(connection_pool)
+
+
 class TestReverseSSL(tservers.ReverseProxyTest, CommonMixin, TcpMixin):
     reverse = True
     ssl = True
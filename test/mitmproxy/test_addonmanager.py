@@ -1,3 +1,4 @@
+import asyncio
 import pytest
 from unittest import mock
 
@@ -86,6 +87,71 @@ async def test_lifecycle():
     a._configure_all(o, o.keys())
 
 
+class AsyncAddon:
+    def __init__(self):
+        self.seen = []
+
+    async def request(self, f):
+        await asyncio.sleep(0)
+        self.seen.append(f)
+
+
+@pytest.mark.asyncio
+async def test_async_handler():
+    with taddons.context(loadcore=False) as tctx:
+        a = AsyncAddon()
+        tctx.master.addons.add(a)
+
+        f = tflow.tflow()
+        await tctx.master.addons.handle_lifecycle("request", f)
+        assert a.seen == [f]
+
+        tctx.master.addons.trigger("request", f)
+        assert await tctx.master.await_log("cannot be invoked synchronously")
+        assert a.seen == [f]
+
+
+def test_has_handler():
+    o = options.Options()
+    m = master.Master(o)
+    a = addonmanager.AddonManager(m)
+    a.add(TAddon("one", addons=[D()]))
+    assert a.has_handler("running")
+    assert a.has_handler("log")
+    assert not a.has_handler("request")
+
+    f = tflow.tflow()
+    assert not a.handles_lifecycle("request", f)
+    assert a.handles_lifecycle("log", f)
+
+    with pytest.raises(exceptions.AddonManagerError, match="Unknown event"):
+        a.has_handler("nonexistent")
+
+
+def test_handler_cache():
+    o = options.Options()
+    m = master.Master(o)
+    a = addonmanager.AddonManager(m)
+    t = TAddon("one")
+    a.add(t)
+    assert not a.has_handler("request")
+
+    class R:
+        def request(self, f):
+            pass
+
+    a.add(R())
+    assert a.has_handler("request")
+    a.remove(a.get("r"))
+    assert not a.has_handler("request")
+
+    # Sub-addons changed behind our back are only seen after invalidation.
+    t.addons = [R()]
+    assert not a.has_handler("request")
+    a.invalidate_handlers()
+    assert a.has_handler("request")
+
+
 def test_defaults():
     assert addons.default_addons()
 
@@ -1,4 +1,11 @@
+import concurrent.futures
 import os
+import threading
+from unittest import mock
+
+import OpenSSL
+import pytest
+
 from mitmproxy import certs
 
 # class TestDNTree:
@@ -88,10 +95,160 @@ class TestCertStore:
 
         ca.get_cert(b"four.com", [])
 
-        assert (b"one.com", ()) not in ca.certs
-        assert (b"two.com", ()) in ca.certs
+        # one.com was used more recently than two.com
+        assert (b"one.com", ()) in ca.certs
+        assert (b"two.com", ()) not in ca.certs
         assert (b"three.com", ()) in ca.certs
         assert (b"four.com", ()) in ca.certs
+        assert list(ca.expire_queue) == [
+            (b"three.com", ()), (b"one.com", ()), (b"four.com", ())
+        ]
+
+    def test_disk_cache(self, tmpdir):
+        cache_dir = str(tmpdir.join("certs"))
+        ca = certs.CertStore.from_store(str(tmpdir), "test", cache_dir)
+        c1, _, _ = ca.get_cert(b"foo.com", [b"foo.com", b"bar.com"])
+        assert len(os.listdir(cache_dir)) == 1
+
+        ca2 = certs.CertStore.from_store(str(tmpdir), "test", cache_dir)
+        with mock.patch("mitmproxy.certs.dummy_cert") as m:
+            c2, _, _ = ca2.get_cert(b"foo.com", [b"bar.com", b"foo.com"])
+            assert not m.called
+        assert c1 == c2
+
+        # Certificates signed by a different CA are not reused.
+        ca3 = certs.CertStore.from_store(str(tmpdir.join("other")), "test", cache_dir)
+        c3, _, _ = ca3.get_cert(b"foo.com", [b"foo.com", b"bar.com"])
+        assert c1 != c3
+        assert len(os.listdir(cache_dir)) == 2
+
+        # Corrupted cache files are regenerated.
+        for f in os.listdir(cache_dir):
+            tmpdir.join("certs", f).write(b"invalid")
+        ca4 = certs.CertStore.from_store(str(tmpdir), "test", cache_dir)
+        c4, _, _ = ca4.get_cert(b"foo.com", [b"foo.com", b"bar.com"])
+        assert c4.cn == b"foo.com"
+
+    def test_single_flight(self, tmpdir):
+        ca = certs.CertStore.from_store(str(tmpdir), "test")
+        started = threading.Event()
+        release = threading.Event()
+        dummy_cert = certs.dummy_cert
+
+        def slow_dummy_cert(*args):
+            started.set()
+            release.wait(5)
+            return dummy_cert(*args)
+
+        results = []
+        with mock.patch("mitmproxy.certs.dummy_cert", side_effect=slow_dummy_cert) as m:
+            threads = [
+                threading.Thread(target=lambda: results.append(ca.get_cert(b"foo.com", [])))
+                for _ in range(5)
+            ]
+            for t in threads:
+                t.start()
+            assert started.wait(5)
+            release.set()
+            for t in threads:
+                t.join(5)
+            assert m.call_count == 1
+        assert len(results) == 5
+        assert all(r[0] is results[0][0] for r in results)
+        assert not ca._inflight
+
+    def test_single_flight_error(self, tmpdir):
+        ca = certs.CertStore.from_store(str(tmpdir), "test")
+        with mock.patch("mitmproxy.certs.dummy_cert", side_effect=ValueError):
+            with pytest.raises(ValueError):
+                ca.get_cert(b"foo.com", [])
+        assert not ca._inflight
+        assert ca.get_cert(b"foo.com", [])[0].cn == b"foo.com"
+
+    @pytest.mark.parametrize("key_type", ["rsa", "ecdsa"])
+    def test_executor(self, tmpdir, key_type):
+        certs.CertStore.from_store(str(tmpdir), "test")
+        with concurrent.futures.ProcessPoolExecutor(1) as executor:
+            ca = certs.CertStore.from_store(str(tmpdir), "test", executor=executor, key_type=key_type)
+            cert, _, _ = ca.get_cert(b"foo.com", [b"bar.com"])
+            pems = ca._signing_pems
+            assert ca.get_cert(b"baz.com", [])[0].cn == b"baz.com"
+            assert ca._signing_pems is pems
+        # Once the executor has been shut down, we sign in-process.
+        assert ca.get_cert(b"qux.com", [])[0].cn == b"qux.com"
+        assert cert.cn == b"foo.com"
+        assert cert.keyinfo[0] == {"rsa": "RSA", "ecdsa": "EC"}[key_type]
+        assert cert.altnames == [b"bar.com"]
+        assert cert.issuer == certs.Cert(ca.default_ca).subject
+
+    def test_key_type(self, tmpdir):
+        ca = certs.CertStore.from_store(str(tmpdir.join("ec")), "test", key_type="ecdsa")
+        assert certs.get_key_type(ca.default_privatekey) == "ecdsa"
+        assert ca.leaf_privatekey is ca.default_privatekey
+        assert ca.get_cert(b"foo.com", [])[0].keyinfo == ("EC", 256)
+
+        ca = certs.CertStore.from_store(str(tmpdir), "test")
+        assert certs.get_key_type(ca.default_privatekey) == "rsa"
+        assert ca.get_cert(b"foo.com", [])[0].keyinfo == ("RSA", 2048)
+
+        # An existing RSA CA signs certificates with a separate ECDSA key.
+        ca = certs.CertStore.from_store(str(tmpdir), "test", key_type="ecdsa")
+        assert certs.get_key_type(ca.default_privatekey) == "rsa"
+        assert certs.get_key_type(ca.leaf_privatekey) == "ecdsa"
+        cert, key, _ = ca.get_cert(b"foo.com", [])
+        assert key is ca.leaf_privatekey
+        assert cert.keyinfo == ("EC", 256)
+        store = OpenSSL.crypto.X509Store()
+        store.add_cert(ca.default_ca)
+        OpenSSL.crypto.X509StoreContext(store, cert.x509).verify_certificate()
+
+        ca2 = certs.CertStore.from_store(str(tmpdir), "test", key_type="ecdsa")
+        assert OpenSSL.crypto.dump_privatekey(OpenSSL.crypto.FILETYPE_PEM, ca2.leaf_privatekey) == \
+            OpenSSL.crypto.dump_privatekey(OpenSSL.crypto.FILETYPE_PEM, ca.leaf_privatekey)
+
+        with pytest.raises(ValueError):
+            certs.create_key("dsa")
+
+    def test_pregenerate(self, tmpdir):
+        ca = certs.CertStore.from_store(str(tmpdir), "test")
+        ca.pregenerate([b"one.com", b"two.com"])
+        assert (b"one.com", (b"one.com",)) in ca.certs
+        assert (b"two.com", (b"two.com",)) in ca.certs
+        # A client connecting with a matching SNI value gets the pregenerated certificate.
+        with mock.patch("mitmproxy.certs.dummy_cert") as m:
+            ca.get_cert(*ca.cert_names(b"one.com", [b"one.com"]))
+            assert not m.called
+
+    def test_cert_names(self, tmpdir):
+        ca = certs.CertStore.from_store(str(tmpdir), "test")
+        assert ca.cert_names(None) == (None, [])
+        assert ca.cert_names(b"foo.com", [b"sni.com"]) == (b"foo.com", [b"foo.com", b"sni.com"])
+        upstream, _, _ = ca.get_cert(b"upstream.com", [b"b.com", b"a.com"])
+        assert ca.cert_names(b"foo.com", [], upstream) == (
+            b"upstream.com", [b"a.com", b"b.com", b"foo.com", b"upstream.com"]
+        )
+
+    def test_sans_order(self, tmpdir):
+        ca = certs.CertStore.from_store(str(tmpdir), "test")
+        c1, _, _ = ca.get_cert(b"foo.com", [b"foo.com", b"bar.com"])
+        c2, _, _ = ca.get_cert(b"foo.com", [b"bar.com", b"foo.com", b"bar.com"])
+        assert c1 is c2
+        assert list(ca.certs) == [(b"foo.com", (b"bar.com", b"foo.com"))]
+
+    def test_take_generated(self, tmpdir):
+        ca = certs.CertStore.from_store(str(tmpdir.join("ca")), "test")
+        c1 = ca.get_cert(None, [b"one.com"])[0]
+        ca.add_cert(certs.CertStoreEntry(c1, ca.default_privatekey, None), b"custom.com")
+
+        reloaded = certs.CertStore.from_store(str(tmpdir.join("ca")), "test")
+        assert reloaded.take_generated(ca) == 1
+        assert b"custom.com" not in reloaded.certs
+        assert reloaded.get_cert(None, [b"one.com"])[0] == c1
+        assert list(reloaded.expire_queue) == [(None, (b"one.com",))]
+
+        other = certs.CertStore.from_store(str(tmpdir.join("other")), "test")
+        assert other.take_generated(ca) == 0
+        assert not other.certs
 
     def test_overrides(self, tmpdir):
         ca1 = certs.CertStore.from_store(str(tmpdir.join("ca1")), "test")
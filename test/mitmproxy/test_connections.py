@@ -11,6 +11,7 @@ from mitmproxy.net import tcp
 from mitmproxy.net.http import http1
 from mitmproxy.test import tflow
 from .net import tservers
+from .net.test_tls import FULL_CLIENT_HELLO_NO_EXTENSIONS
 from pathod import test
 
 
@@ -53,6 +54,24 @@ class TestClientConnection:
         c = connections.ClientConnection.make_dummy(('foobar', 1234))
         assert c.address == ('foobar', 1234)
 
+    def test_get_client_hello(self):
+        c = tflow.tclient_conn()
+        c.rfile = mock.Mock()
+        c.rfile.peek.return_value = FULL_CLIENT_HELLO_NO_EXTENSIONS
+        client_hello = c.get_client_hello()
+        assert client_hello.raw == FULL_CLIENT_HELLO_NO_EXTENSIONS[9:]
+        assert c.get_client_hello() is client_hello
+        assert c.rfile.peek.call_count == 1
+
+        # After a TLS handshake, the next ClientHello is read from the new descriptor.
+        c.rfile.o = mock.Mock()
+        assert c.get_client_hello() is not client_hello
+
+        c.rfile.o = mock.Mock()
+        c.rfile.peek.return_value = b"GET /"
+        with pytest.raises(exceptions.TlsProtocolException):
+            c.get_client_hello()
+
     def test_state(self):
         c = tflow.tclient_conn()
         assert connections.ClientConnection.from_state(c.get_state()).get_state() == \
@@ -5,6 +5,7 @@ import pytest
 from mitmproxy.exceptions import Kill, ControlException
 from mitmproxy import controller
 from mitmproxy.test import taddons
+from mitmproxy.test import tflow
 import mitmproxy.ctx
 
 
@@ -26,6 +27,24 @@ async def test_master():
         assert ctx.master.should_exit.is_set()
 
 
+class TestChannel:
+    def test_ask_without_handlers(self):
+        class tAddon:
+            def response(self, f):
+                pass
+
+        with taddons.context(tAddon(), loadcore=False) as ctx:
+            # The event loop never runs, so this only returns if the
+            # round-trip to the master is skipped.
+            f = tflow.tflow()
+            assert ctx.master.channel.ask("request", f) is f
+            assert f.reply.state == "committed"
+            ctx.master.channel.tell("request", f)
+
+            assert ctx.master.addons.handles_lifecycle("response", f)
+            assert not ctx.master.addons.handles_lifecycle("request", f)
+
+
 class TestReply:
     def test_simple(self):
         reply = controller.Reply(42)
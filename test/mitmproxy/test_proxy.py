@@ -63,6 +63,14 @@ class TestProxyServer:
         with pytest.raises(Exception, match="Error starting proxy server"):
             ProxyServer(conf)
 
+    def test_shutdown(self):
+        conf = ProxyConfig(options.Options(listen_port=0))
+        conf.connection_pool = mock.Mock()
+        s = ProxyServer(conf)
+        s.handle_shutdown()
+        assert conf.connection_pool.clear.called
+        s.socket.close()
+
 
 class TestDummyServer:
 